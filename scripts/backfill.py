@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Checkpointed, resumable backfill: classify and build journal entries for a
+date range, chunk by chunk.
+
+The range is split into calendar months (or --chunk-days windows). Each chunk
+is classified with the company's rule pack and AUTO_POST results get journal
+entries (multi_company.process_company). Results are appended to NDJSON files
+in the output directory, and after every chunk a checkpoint records the
+completed chunks and the byte size of each output file:
+
+    <out>/classifications.ndjson
+    <out>/entries.ndjson
+    <out>/checkpoint.json
+
+Re-running the same command resumes after the last completed chunk. Output
+written by a chunk that was interrupted before its checkpoint is truncated
+away first, so nothing is duplicated or lost.
+
+Transactions come from a Bill.com history file (NDJSON is indexed once by
+byte offset, so each chunk reads only its own lines) or from a
+history_store.py Parquet store. Every chunk is checked for near-duplicates
+of the transactions in the duplicate window before its first day, so a
+charge copied across a chunk boundary is flagged like one inside a chunk.
+The check also covers the --duplicate-history transactions when given.
+
+Usage:
+    python backfill.py --company WCLI --history transactions.ndjson --start 2022-01-01 --end 2024-12-31 --out backfill/
+    python backfill.py --company WCLI --store history/ --start 2022-01-01 --end 2024-12-31 --out backfill/ --chunk-days 7
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from classify_transaction import as_batch_item, resolve_rules_path
+from journal_entry_template import COMPANY_CONFIG
+from multi_company import process_company
+from near_duplicates import DEFAULT_WINDOW_HOURS, DuplicateIndex, load_index, transaction_time
+from rule_diff import iter_json_records
+
+CHECKPOINT_FILE = 'checkpoint.json'
+OUTPUT_FILES = ('classifications.ndjson', 'entries.ndjson')
+
+# Parameters that must match for a checkpoint to be resumed
+RUN_PARAMETERS = ('company', 'start', 'end', 'chunk_days', 'source', 'rules_path', 'duplicate_history')
+
+
+def iter_date_chunks(start: str, end: str, chunk_days: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (first, last) ISO date pairs covering start..end inclusive.
+
+    Chunks are calendar months, or windows of chunk_days days when given.
+    """
+    current, last = date.fromisoformat(start), date.fromisoformat(end)
+    while current <= last:
+        if chunk_days:
+            chunk_end = current + timedelta(days=chunk_days - 1)
+        else:
+            next_month = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+            chunk_end = next_month - timedelta(days=1)
+        chunk_end = min(chunk_end, last)
+        yield current.isoformat(), chunk_end.isoformat()
+        current = chunk_end + timedelta(days=1)
+
+
+def record_date(record: dict) -> str:
+    """Return the posting date (YYYY-MM-DD) of a bare transaction or batch item."""
+    txn = record.get('transaction', record)
+    return (txn.get('occurredTime') or txn.get('authorizedTime') or '')[:10]
+
+
+def _day_start(day: str) -> float:
+    """Epoch seconds of midnight UTC on an ISO date."""
+    return datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _since(items: List[dict], since: float) -> List[dict]:
+    """The items whose transaction time is at or after since (epoch seconds)."""
+    kept = []
+    for item in items:
+        moment = transaction_time(item.get('transaction', item))
+        if moment is not None and moment >= since:
+            kept.append(item)
+    return kept
+
+
+class FileSource:
+    """
+    Transactions from a JSON array or NDJSON history file.
+
+    NDJSON files are scanned once to index line offsets by chunk, then each
+    chunk seeks to and parses only its own lines. JSON arrays are streamed
+    once (rule_diff.iter_json_records) and only the records inside the
+    chunks are kept, bucketed by chunk.
+    """
+
+    def __init__(self, path: str, chunks: List[Tuple[str, str]]):
+        self.path = path
+        self.chunks = chunks
+        self.ndjson = path.endswith(('.ndjson', '.jsonl'))
+        self._buckets: Dict[Tuple[str, str], object] = {chunk: (array('q') if self.ndjson else []) for chunk in chunks}
+        self._index()
+
+    def _chunk_for(self, posting_date: str) -> Optional[Tuple[str, str]]:
+        # Chunks are sorted and contiguous, so a binary search is enough
+        low, high = 0, len(self.chunks) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            first, last = self.chunks[middle]
+            if posting_date < first:
+                high = middle - 1
+            elif posting_date > last:
+                low = middle + 1
+            else:
+                return self.chunks[middle]
+        return None
+
+    def _index(self):
+        if self.ndjson:
+            with open(self.path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if line.strip():
+                        chunk = self._chunk_for(record_date(json.loads(line)))
+                        if chunk is not None:
+                            self._buckets[chunk].append(offset)
+                    offset += len(line)
+        else:
+            for record in iter_json_records(self.path):
+                chunk = self._chunk_for(record_date(record))
+                if chunk is not None:
+                    self._buckets[chunk].append(record)
+
+    def count(self, chunk: Tuple[str, str]) -> int:
+        return len(self._buckets[chunk])
+
+    def total(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def items(self, chunk: Tuple[str, str]) -> List[dict]:
+        if not self.ndjson:
+            return [as_batch_item(record) for record in self._buckets[chunk]]
+        items = []
+        with open(self.path, 'rb') as f:
+            for offset in self._buckets[chunk]:
+                f.seek(offset)
+                items.append(as_batch_item(json.loads(f.readline())))
+        return items
+
+
+class StoreSource:
+    """Transactions from a history_store.HistoryStore, read with date pushdown."""
+
+    def __init__(self, root: str, company: str):
+        from history_store import HistoryStore
+
+        self.store = HistoryStore(root)
+        self.company = company
+
+    def count(self, chunk: Tuple[str, str]) -> Optional[int]:
+        return None
+
+    def total(self) -> Optional[int]:
+        return None
+
+    def items(self, chunk: Tuple[str, str]) -> List[dict]:
+        from history_store import row_to_batch_item
+
+        return [
+            row_to_batch_item(row)
+            for rows in self.store.scan('transactions', company=self.company, start=chunk[0], end=chunk[1])
+            for row in rows
+        ]
+
+
+def _write_json_atomic(path: Path, data: dict):
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class Backfill:
+    """Runs (or resumes) a chunked backfill into an output directory."""
+
+    def __init__(
+        self,
+        company: str,
+        start: str,
+        end: str,
+        out_dir: str,
+        source,
+        source_name: str,
+        chunk_days: Optional[int] = None,
+        rules_path: Optional[str] = None,
+        progress: Optional[Callable[[dict], None]] = None,
+        history: Optional[DuplicateIndex] = None,
+        history_name: Optional[str] = None,
+    ):
+        if company not in COMPANY_CONFIG:
+            raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+        if start > end:
+            raise ValueError(f"Start date {start} is after end date {end}")
+
+        self.company = company
+        self.chunks = list(iter_date_chunks(start, end, chunk_days))
+        self.out_dir = Path(out_dir)
+        self.source = source
+        self.progress = progress
+        self.history = history
+        self.parameters = {
+            'company': company,
+            'start': start,
+            'end': end,
+            'chunk_days': chunk_days,
+            'source': source_name,
+            'rules_path': rules_path or resolve_rules_path(company),
+            'duplicate_history': history_name,
+        }
+        self.checkpoint_path = self.out_dir / CHECKPOINT_FILE
+
+    def load_checkpoint(self) -> dict:
+        """Return the saved checkpoint, or a fresh one if there is none."""
+        if not self.checkpoint_path.exists():
+            return {
+                **self.parameters,
+                'completed': [],
+                'sizes': {name: 0 for name in OUTPUT_FILES},
+                'stats': {'transactions': 0, 'entries': 0, 'review': 0, 'errors': 0},
+            }
+
+        with open(self.checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+        mismatched = [key for key in RUN_PARAMETERS if checkpoint.get(key) != self.parameters[key]]
+        if mismatched:
+            raise ValueError(
+                f"Checkpoint in {self.out_dir} was written with different {', '.join(mismatched)}; "
+                "use a new --out directory or --restart"
+            )
+        return checkpoint
+
+    def _truncate_outputs(self, sizes: dict):
+        """Drop output written after the last checkpoint (an interrupted chunk)."""
+        for name in OUTPUT_FILES:
+            path = self.out_dir / name
+            with open(path, 'a+b') as f:
+                f.truncate(sizes.get(name, 0))
+
+    def _duplicate_index(self, first_pending: Tuple[str, str]) -> DuplicateIndex:
+        """
+        The near-duplicate index for a run starting at first_pending.
+
+        A copy of the history index (or an empty one) plus the transactions
+        of completed chunks that fall within one window before first_pending,
+        so a resumed run flags the same boundary copies as an uninterrupted one.
+        """
+        index = self.history.copy() if self.history is not None else DuplicateIndex(DEFAULT_WINDOW_HOURS)
+        since = _day_start(first_pending[0]) - index.window
+        for chunk in reversed(self.chunks[:self.chunks.index(first_pending)]):
+            if _day_start(chunk[1]) + 86400 <= since:
+                break
+            index.add(_since(self.source.items(chunk), since))
+        return index
+
+    def run(self, restart: bool = False) -> dict:
+        """
+        Process every chunk not yet in the checkpoint.
+
+        Each chunk's near-duplicate check includes the transactions from the
+        preceding chunks that are within one window of its first day.
+
+        Returns:
+            The final checkpoint (run parameters, completed chunks, stats)
+        """
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if restart and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+        checkpoint = self.load_checkpoint()
+        self._truncate_outputs(checkpoint['sizes'])
+
+        completed = set(checkpoint['completed'])
+        pending = [chunk for chunk in self.chunks if f"{chunk[0]}..{chunk[1]}" not in completed]
+        known_total = self.source.total()
+        remaining = sum(self.source.count(chunk) for chunk in pending) if known_total is not None else None
+
+        started = time.monotonic()
+        done_transactions = 0
+        index = self._duplicate_index(pending[0]) if pending else None
+
+        for position, chunk in enumerate(pending, 1):
+            items = self.source.items(chunk)
+            output = process_company(self.company, items, self.parameters['rules_path'], history=index) if items else None
+            following = self.chunks.index(chunk) + 1
+            if following < len(self.chunks):
+                index.add(_since(items, _day_start(self.chunks[following][0]) - index.window))
+
+            handles = {name: open(self.out_dir / name, 'a') for name in OUTPUT_FILES}
+            try:
+                if output is not None:
+                    for result in output['classifications']:
+                        handles['classifications.ndjson'].write(json.dumps(result) + '\n')
+                    for entry in output['entries']:
+                        handles['entries.ndjson'].write(json.dumps(entry) + '\n')
+                for handle in handles.values():
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            finally:
+                for handle in handles.values():
+                    handle.close()
+
+            stats = checkpoint['stats']
+            if output is not None:
+                stats['transactions'] += len(items)
+                stats['entries'] += sum('error' not in entry for entry in output['entries'])
+                stats['errors'] += sum('error' in entry for entry in output['entries'])
+                stats['review'] += len(output['review'])
+            checkpoint['completed'].append(f"{chunk[0]}..{chunk[1]}")
+            checkpoint['sizes'] = {name: (self.out_dir / name).stat().st_size for name in OUTPUT_FILES}
+            _write_json_atomic(self.checkpoint_path, checkpoint)
+
+            done_transactions += len(items)
+            elapsed = time.monotonic() - started
+            rate = done_transactions / elapsed if elapsed else 0.0
+            if remaining is not None and rate:
+                eta = (remaining - done_transactions) / rate
+            else:
+                eta = elapsed / position * (len(pending) - position)
+
+            if self.progress is not None:
+                self.progress({
+                    'chunk': f"{chunk[0]}..{chunk[1]}",
+                    'chunk_transactions': len(items),
+                    'chunks_done': len(checkpoint['completed']),
+                    'chunks_total': len(self.chunks),
+                    'transactions': stats['transactions'],
+                    'rate_per_second': rate,
+                    'eta_seconds': eta,
+                })
+
+        return checkpoint
+
+
+def print_progress(status: dict):
+    """Default progress reporter: one line per chunk on stderr."""
+    print(
+        f"[{status['chunks_done']}/{status['chunks_total']}] {status['chunk']}: "
+        f"{status['chunk_transactions']} txns, {status['transactions']} total, "
+        f"{status['rate_per_second']:.0f} txn/s, ETA {_format_duration(status['eta_seconds'])}",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checkpointed backfill of classifications and journal entries')
+    parser.add_argument('--company', type=str, required=True, choices=list(COMPANY_CONFIG.keys()), help='Company code')
+    parser.add_argument('--start', type=str, required=True, help='First posting date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, required=True, help='Last posting date (YYYY-MM-DD)')
+    parser.add_argument('--out', type=str, required=True, help='Output directory (results and checkpoint)')
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument('--history', type=str, help='Bill.com transactions (JSON array or NDJSON)')
+    source_group.add_argument('--store', type=str, help='history_store.py store root')
+    parser.add_argument('--chunk-days', type=int, help='Chunk size in days (default: calendar months)')
+    parser.add_argument('--jdm', type=str, help='Path to JDM rules file (default: company rule pack)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+    parser.add_argument('--duplicate-history', type=str, help='Earlier transactions to check near-duplicates against (JSON array or NDJSON)')
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS, help='Near-duplicate window in hours')
+
+    args = parser.parse_args()
+
+    try:
+        chunks = list(iter_date_chunks(args.start, args.end, args.chunk_days))
+        if args.history:
+            source, source_name = FileSource(args.history, chunks), os.path.abspath(args.history)
+        else:
+            source, source_name = StoreSource(args.store, args.company), os.path.abspath(args.store)
+        history, history_name = None, None
+        if args.duplicate_history:
+            history = load_index(args.duplicate_history, args.window_hours)
+            history_name = f"{os.path.abspath(args.duplicate_history)}@{args.window_hours}h"
+
+        backfill = Backfill(
+            company=args.company,
+            start=args.start,
+            end=args.end,
+            out_dir=args.out,
+            source=source,
+            source_name=source_name,
+            chunk_days=args.chunk_days,
+            rules_path=args.jdm,
+            progress=print_progress,
+            history=history,
+            history_name=history_name,
+        )
+        checkpoint = backfill.run(restart=args.restart)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps({'completed_chunks': len(checkpoint['completed']), **checkpoint['stats']}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Streaming ingestion of Bill.com Spend & Expense CSV exports.
+
+The export is memory-mapped and parsed one row at a time, so a
+multi-gigabyte file is processed with constant memory. Export columns are
+matched by header name (case- and punctuation-insensitive, see
+COLUMN_ALIASES) and mapped onto the fields the classifier reads:
+
+    Transaction ID      -> id
+    Transaction Date    -> occurredTime        Authorized Date -> authorizedTime
+                           (ISO 8601; MM/DD/YYYY exports are converted)
+    Merchant Name       -> merchantName        Raw Merchant    -> rawMerchantName
+    MCC                 -> merchantCategoryCode
+    Amount              -> amount (+ isCredit for refunds / negative amounts)
+    Budget              -> budgetName          User Email      -> userEmail
+    Team / Department   -> user_team
+    Merchant City / State / Country -> merchantCity / merchantState / merchantCountry
+
+Rows whose dates cannot be read are skipped and reported: the CLI prints
+each as {"error", "line"} on stderr and counts them in its summary.
+
+Rows are fed to classify_batch() in chunks and results are streamed out in
+any output_formats format, or the mapped transactions themselves can be
+written as NDJSON for history_store.py import or backfill.py. With
+--company, each chunk's state_match is filled from the merchant location
+first (merchant_location.py).
+
+Usage:
+    # Classify an export, streaming NDJSON results
+    python billcom_csv.py --file export.csv --format ndjson > results.ndjson
+
+    # Convert an export to transaction NDJSON
+    python billcom_csv.py --file export.csv --transactions-only > transactions.ndjson
+
+    # Export with non-standard headers
+    python billcom_csv.py --file export.csv --column-map '{"Vendor": "merchantName"}'
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import re
+import sys
+from datetime import date, datetime
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional
+
+from classify_transaction import as_batch_item, classify_batch, resolve_rules_path
+from merchant_location import fill_state_match
+from output_formats import STREAM_FORMATS, parse_fields, write_records
+from transaction_record import TransactionRecord
+
+DEFAULT_CHUNK_SIZE = 5_000
+
+# Normalized export header -> transaction field
+COLUMN_ALIASES = {
+    'transactionid': 'id',
+    'id': 'id',
+    'uuid': 'uuid',
+    'transactiondate': 'occurredTime',
+    'date': 'occurredTime',
+    'posteddate': 'occurredTime',
+    'settleddate': 'occurredTime',
+    'occurredtime': 'occurredTime',
+    'authorizeddate': 'authorizedTime',
+    'authorizationdate': 'authorizedTime',
+    'authorizedtime': 'authorizedTime',
+    'merchantname': 'merchantName',
+    'merchant': 'merchantName',
+    'rawmerchantname': 'rawMerchantName',
+    'rawmerchant': 'rawMerchantName',
+    'merchantdescriptor': 'rawMerchantName',
+    'mcc': 'merchantCategoryCode',
+    'merchantcategorycode': 'merchantCategoryCode',
+    'amount': 'amount',
+    'transactionamount': 'amount',
+    'budget': 'budgetName',
+    'budgetname': 'budgetName',
+    'useremail': 'userEmail',
+    'email': 'userEmail',
+    'cardholderemail': 'userEmail',
+    'team': 'user_team',
+    'department': 'user_team',
+    'merchantcity': 'merchantCity',
+    'city': 'merchantCity',
+    'merchantstate': 'merchantState',
+    'merchantcountry': 'merchantCountry',
+    'country': 'merchantCountry',
+    'transactiontype': 'transactionType',
+}
+
+DATE_FIELDS = ('occurredTime', 'authorizedTime')
+
+CREDIT_TYPES = ('refund', 'credit', 'return')
+
+_HEADER_NOISE = re.compile(r'[^a-z0-9]')
+_AMOUNT_NOISE = re.compile(r'[$,\s]')
+_US_DATE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?$')
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$')
+
+
+def normalize_header(name: str) -> str:
+    """Lower-case a header and drop everything but letters and digits."""
+    return _HEADER_NOISE.sub('', name.lower())
+
+
+def parse_amount(value: str) -> float:
+    """Parse '$1,234.56', '-12.00' or '(12.00)' into a float."""
+    text = _AMOUNT_NOISE.sub('', value or '')
+    if not text:
+        return 0.0
+    if text.startswith('(') and text.endswith(')'):
+        return -float(text[1:-1])
+    return float(text)
+
+
+def parse_date(value: str) -> str:
+    """
+    Return an export date as ISO 8601: '03/04/2025' -> '2025-03-04',
+    '03/04/2025 14:05' -> '2025-03-04T14:05:00'; ISO values pass through.
+
+    Raises:
+        ValueError: Not an MM/DD/YYYY or ISO date, or not a real calendar date
+    """
+    try:
+        match = _US_DATE.match(value)
+        if match:
+            month, day, year, hour, minute, second = match.groups()
+            parsed = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+            return parsed.strftime('%Y-%m-%dT%H:%M:%S' if hour else '%Y-%m-%d')
+        if _ISO_DATE.match(value):
+            date.fromisoformat(value[:10])
+            return value
+    except ValueError:
+        pass
+    raise ValueError(f"Unreadable date: {value!r}")
+
+
+def _iter_lines(mapped: mmap.mmap) -> Iterator[str]:
+    """Yield decoded lines from a memory-mapped file without reading it whole."""
+    for raw in iter(mapped.readline, b''):
+        yield raw.decode('utf-8-sig' if mapped.tell() == len(raw) else 'utf-8')
+
+
+def build_column_index(header: List[str], column_map: Optional[Dict[str, str]] = None) -> Dict[int, str]:
+    """
+    Map header positions to transaction fields.
+
+    Args:
+        header: The export's header row
+        column_map: Extra {export header: transaction field} mappings; they
+            take precedence over COLUMN_ALIASES
+
+    Returns:
+        {column index: transaction field} for every recognized column
+    """
+    overrides = {normalize_header(name): field for name, field in (column_map or {}).items()}
+    index = {}
+    for position, name in enumerate(header):
+        key = normalize_header(name)
+        field = overrides.get(key) or COLUMN_ALIASES.get(key)
+        if field and field not in index.values():
+            index[position] = field
+    if 'amount' not in index.values():
+        raise ValueError(f"Export has no recognizable amount column: {header}")
+    return index
+
+
+def row_to_transaction(row: List[str], index: Dict[int, str]) -> dict:
+    """
+    Build a Bill.com transaction dict from one export row.
+
+    Raises:
+        ValueError: A date column cannot be read (see parse_date)
+    """
+    txn = {field: row[position].strip() for position, field in index.items() if position < len(row)}
+    for field in DATE_FIELDS:
+        if txn.get(field):
+            try:
+                txn[field] = parse_date(txn[field])
+            except ValueError as e:
+                raise ValueError(f"{field}: {e}") from None
+        else:
+            txn.pop(field, None)
+
+    amount = parse_amount(txn.get('amount', ''))
+    transaction_type = txn.pop('transactionType', '').lower()
+    txn['amount'] = abs(amount)
+    txn['isCredit'] = amount < 0 or any(kind in transaction_type for kind in CREDIT_TYPES)
+
+    if not txn.get('rawMerchantName'):
+        txn['rawMerchantName'] = txn.get('merchantName', '')
+    if txn.get('merchantCategoryCode'):
+        txn['merchantCategoryCode'] = txn['merchantCategoryCode'].zfill(4)
+    return txn
+
+
+def iter_transactions(
+    path: str,
+    column_map: Optional[Dict[str, str]] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> Iterator[dict]:
+    """
+    Lazily yield transactions from a Bill.com CSV export via mmap.
+
+    Args:
+        path: Export file
+        column_map: Extra {export header: transaction field} mappings
+        on_error: Called with (line number, message) for each row that cannot
+            be converted, which is then skipped; by default the ValueError
+            is raised
+    """
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            reader = csv.reader(_iter_lines(mapped))
+            header = next(reader, None)
+            if header is None:
+                return
+            index = build_column_index(header, column_map)
+            for row in reader:
+                if not row or not any(cell.strip() for cell in row):
+                    continue
+                try:
+                    txn = row_to_transaction(row, index)
+                except ValueError as e:
+                    if on_error is None:
+                        raise ValueError(f"Line {reader.line_num}: {e}") from None
+                    on_error(reader.line_num, str(e))
+                    continue
+                yield txn
+
+
+def iter_chunks(
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    column_map: Optional[Dict[str, str]] = None,
+    records: bool = False,
+    company: Optional[str] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> Iterator[list]:
+    """
+    Yield classify_batch items (or TransactionRecords) from an export, chunk_size at a time.
+
+    With a company, each chunk's state_match is filled from the merchant
+    locations (LOCAL = the company's home state) before conversion.
+    """
+    transactions = iter_transactions(path, column_map, on_error)
+    convert = TransactionRecord.from_transaction if records else as_batch_item
+    while True:
+        chunk = list(islice(transactions, chunk_size))
+        if not chunk:
+            return
+        if company:
+            fill_state_match(chunk, company)
+        yield [convert(txn) for txn in chunk]
+
+
+def classify_export(
+    path: str,
+    jdm_path: Optional[str] = None,
+    company: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    column_map: Optional[Dict[str, str]] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> Iterator[dict]:
+    """Classify an export chunk by chunk, yielding results as they are produced."""
+    rules_path = jdm_path or resolve_rules_path(company)
+    for chunk in iter_chunks(path, chunk_size, column_map, records=True, company=company, on_error=on_error):
+        yield from classify_batch(chunk, rules_path, company=company)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify a Bill.com Spend & Expense CSV export')
+    parser.add_argument('--file', type=str, required=True, help='Bill.com CSV export')
+    parser.add_argument('--jdm', type=str, help='Path to JDM rules file')
+    parser.add_argument('--company', type=str, help='Company code; selects its rule pack if one exists')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Transactions per classify_batch call')
+    parser.add_argument('--column-map', type=str, help='JSON {export header: transaction field} overrides')
+    parser.add_argument('--transactions-only', action='store_true', help='Write mapped transactions instead of classifying')
+    parser.add_argument('--format', type=str, choices=STREAM_FORMATS, default='ndjson', help='Output format')
+    parser.add_argument('--fields', type=str, help='Comma-separated (dotted) fields to output')
+    parser.add_argument('--output', type=str, help='Output file (default stdout; required for parquet)')
+
+    args = parser.parse_args()
+
+    errors = []
+
+    def report_row(line: int, message: str):
+        errors.append(line)
+        print(json.dumps({"error": message, "line": line}), file=sys.stderr)
+
+    try:
+        column_map = json.loads(args.column_map) if args.column_map else None
+        if args.transactions_only:
+            records = iter_transactions(args.file, column_map, report_row)
+        else:
+            records = classify_export(args.file, args.jdm, args.company, args.chunk_size, column_map, report_row)
+        count = write_records(records, args.format, parse_fields(args.fields), args.output)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps({'records': count, 'errors': len(errors)}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,13 +13,30 @@ Returns JSON with classification result, confidence, and discrepancy info.
 
 import argparse
 import json
+import os
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from time import perf_counter
+from typing import Dict, NamedTuple, Optional
 
 import zen
 
+from convert_dmn_to_jdm import MERCHANT_FLAGS_FIELD, build_jdm, expense_accounts, get_rule_results, rule_result_record
+from decision_overlay import DecisionOverlay, overlay_result
+from merchant_flags import matcher_for
+from merchant_location import fill_state_match
+from merchant_normalizer import annotate
+from merchant_similarity import build_index
+from output_formats import FORMATS, parse_fields, write_output
+from profiling import STAGES, profile_session
+from trace_sampler import TraceSampler
+from transaction_record import TransactionRecord
+
 
 # Budget name to account mapping for discrepancy detection
 # NOTE: For COGS accounts without numbers, we use the account name as the identifier
@@ -107,8 +124,9 @@ BUDGET_TO_ACCOUNT = {
 }
 
 
+@lru_cache(maxsize=4096)
 def extract_account_from_budget(budget_name: str) -> Optional[str]:
-    """Extract GL account number from Bill.com budget name."""
+    """Extract GL account number from Bill.com budget name (memoized; batches repeat a few budgets)."""
     if not budget_name:
         return None
 
@@ -124,6 +142,173 @@ def extract_account_from_budget(budget_name: str) -> Optional[str]:
     return None
 
 
+CONFIG_DIR = Path(__file__).parent.parent / 'config'
+
+# Compiled decisions keyed by (path, mtime) so repeated calls reuse one engine
+_DECISION_CACHE = {}
+
+# Prebuilt per-rule results, keyed like _DECISION_CACHE
+_RULE_RESULTS_CACHE = {}
+
+# Items per task in threaded classify_batch
+THREAD_CHUNK_SIZE = 500
+
+# Per-thread reusable input_data dict for classify_batch
+_scratch = threading.local()
+
+
+def resolve_rules_path(company: Optional[str] = None) -> str:
+    """
+    Return the JDM rule pack for a company.
+
+    A company-specific pack (config/classification_rules.<COMPANY>.jdm.json,
+    compiled from config/dmn_rules.<COMPANY>.csv) takes precedence over the
+    shared config/classification_rules.jdm.json.
+    """
+    if company:
+        pack = CONFIG_DIR / f'classification_rules.{company}.jdm.json'
+        if pack.exists():
+            return str(pack)
+    return str(CONFIG_DIR / 'classification_rules.jdm.json')
+
+
+def load_jdm_content(rules_path: str) -> str:
+    """
+    Load JDM content from a rules file.
+
+    Accepts either a compiled JDM file or a DMN CSV, which is converted
+    in memory so two rule-set versions can be compared without regenerating
+    config/classification_rules.jdm.json.
+    """
+    if str(rules_path).endswith('.csv'):
+        return json.dumps(build_jdm(rules_path))
+
+    with open(rules_path, 'r') as f:
+        return f.read()
+
+
+class FlaggedDecision:
+    """
+    A compiled decision whose merchant rows test precomputed merchant_flags.
+
+    evaluate() computes the transaction's merchant pattern flags in one pass
+    and stores them in input_data (in place, so reused scratch inputs stay
+    allocation-free) before handing it to zen.
+    """
+
+    def __init__(self, decision, matcher):
+        self.decision = decision
+        self.matcher = matcher
+
+    def evaluate(self, input_data: dict, options: Optional[dict] = None) -> dict:
+        input_data[MERCHANT_FLAGS_FIELD] = self.matcher.flags(input_data.get('merchant', ''))
+        if options is None:
+            return self.decision.evaluate(input_data)
+        return self.decision.evaluate(input_data, options)
+
+
+class RuleResult(NamedTuple):
+    """
+    The result fields one decision-table row produces, built once per rule.
+
+    Fields are unquoted and ready for output (None for empty values).
+    matched_by is None unless the rule is attributed to its MCC; see
+    convert_dmn_to_jdm.rule_result_record. erpnext_accounts holds the full
+    ERPNext expense account per company for prebuilt rules, resolved when
+    the rules are loaded; it is empty for results built from raw outputs.
+    """
+    gl_account: Optional[str]
+    gl_account_name: Optional[str]
+    action: str
+    notes: Optional[str]
+    matched_by: Optional[str]
+    erpnext_accounts: Dict[str, str]
+
+    @classmethod
+    def from_outputs(cls, outputs: dict) -> 'RuleResult':
+        """Build a result from raw decision outputs (overlay entries, JDMs without ruleResults)."""
+        return cls(**rule_result_record(
+            outputs.get('gl_account', '').strip('"'),
+            outputs.get('gl_account_name', '').strip('"'),
+            outputs.get('action', 'REVIEW').strip('"'),
+            outputs.get('notes', '').strip('"'),
+        ), erpnext_accounts={})
+
+    def matched(self, merchant: str) -> str:
+        """What the match is attributed to for a transaction with this merchant input."""
+        if not self.gl_account:
+            return 'none'
+        return self.matched_by or ('merchant' if merchant else 'other')
+
+
+NO_MATCH = RuleResult.from_outputs({})
+
+
+def load_decision(rules_path: str):
+    """Return a compiled ZEN decision for a JDM or CSV rules file (cached)."""
+    key = (os.path.abspath(rules_path), os.path.getmtime(rules_path))
+    decision = _DECISION_CACHE.get(key)
+    if decision is None:
+        with STAGES.stage('load_rules'):
+            content = load_jdm_content(rules_path)
+            jdm = json.loads(content)
+            matcher = matcher_for(jdm)
+            _RULE_RESULTS_CACHE[key] = {
+                rule_id: RuleResult(**record, erpnext_accounts=expense_accounts(record['gl_account'], record['gl_account_name']))
+                for rule_id, record in get_rule_results(jdm).items()
+            }
+        with STAGES.stage('create_decision'):
+            engine = zen.ZenEngine()
+            decision = engine.create_decision(content)
+        if matcher is not None:
+            decision = FlaggedDecision(decision, matcher)
+        _DECISION_CACHE[key] = decision
+    return decision
+
+
+def load_rule_results(rules_path: str) -> Dict[str, RuleResult]:
+    """Return the prebuilt rule ID -> RuleResult table of a rules file ({} if it has none)."""
+    key = (os.path.abspath(rules_path), os.path.getmtime(rules_path))
+    if key not in _RULE_RESULTS_CACHE:
+        load_decision(rules_path)
+    return _RULE_RESULTS_CACHE[key]
+
+
+def rule_result_for(rule_results: Dict[str, RuleResult], outputs: dict) -> RuleResult:
+    """The RuleResult for a decision's outputs: the prebuilt one for its rule_id, else built from them."""
+    if not outputs:
+        return NO_MATCH
+    return rule_results.get(outputs.get('rule_id')) or RuleResult.from_outputs(outputs)
+
+
+def as_batch_item(record: dict) -> dict:
+    """
+    Normalize a stored record into the classify_batch item shape.
+
+    Records that already carry a 'transaction' key are returned unchanged.
+    Bare Bill.com transactions are wrapped, taking the budget from
+    'budgetName' and the team from an optional 'user_team' field.
+    """
+    if 'transaction' in record:
+        return record
+
+    return {
+        'transaction': record,
+        'employee': {'team': record.get('user_team', '')},
+        'billcom_budget': record.get('budgetName', ''),
+    }
+
+
+def fill_batch_input(input_data: dict, item: dict) -> dict:
+    """Fill (and return) a decision input dict in place for one classify_batch item or TransactionRecord."""
+    return TransactionRecord.from_item(item).fill_input(input_data)
+
+
+def build_batch_input(item: dict) -> dict:
+    """Build the decision input for one classify_batch item."""
+    return fill_batch_input({}, item)
+
+
 def determine_confidence(result: dict, matched_by: str, has_discrepancy: bool) -> str:
     """Determine confidence level based on match type and discrepancy."""
     action = result.get('action', 'REVIEW')
@@ -131,8 +316,8 @@ def determine_confidence(result: dict, matched_by: str, has_discrepancy: bool) -
     if action == 'REJECT':
         return 'REJECT'
 
-    # MCC matches are highest confidence
-    if matched_by == 'mcc':
+    # MCC matches and settled overlay decisions are highest confidence
+    if matched_by in ('mcc', 'overlay'):
         return 'HIGH'
     elif matched_by == 'merchant':
         return 'MEDIUM' if has_discrepancy else 'HIGH'
@@ -144,7 +329,9 @@ def classify_transaction(
     transaction: dict,
     employee: dict,
     billcom_budget: str,
-    jdm_path: str
+    jdm_path: str,
+    overlay=None,
+    tracer=None
 ) -> dict:
     """
     Classify a transaction using the JDM rules engine.
@@ -154,16 +341,19 @@ def classify_transaction(
         employee: Dict with keys: team, designation, company
         billcom_budget: The budget name assigned in Bill.com
         jdm_path: Path to the JDM rules file
+        overlay: Optional decision_overlay.DecisionOverlay checked before the rules
+        tracer: Optional trace_sampler.TraceSampler; sampled evaluations are
+            traced and add rule_id / trace_timings to the result
 
     Returns:
         Dict with classification result and metadata
     """
     # Load JDM rules
-    with open(jdm_path, 'r') as f:
-        jdm_content = f.read()
+    decision = load_decision(jdm_path)
+    rule_results = load_rule_results(jdm_path)
 
-    engine = zen.ZenEngine()
-    decision = engine.create_decision(jdm_content)
+    STAGES.count(1)
+    start = perf_counter()
 
     # Prepare input for decision engine
     input_data = {
@@ -175,24 +365,43 @@ def classify_transaction(
         'state_match': transaction.get('state_match', ''),
     }
 
-    # Evaluate rules
-    result = decision.evaluate(input_data)
-    rule_result = result.get('result', {})
+    # Learned decisions win over the rules and skip evaluation entirely
+    entry = overlay.lookup(transaction, employee) if overlay is not None else None
+
+    mark = perf_counter()
+    STAGES.add('build_input', mark - start)
+
+    traced = None
+    if entry is not None:
+        result = {'performance': ''}
+        rule_result = overlay_result(entry)
+    elif tracer is not None and tracer.should_sample():
+        # Traced evaluation reports the matched rule and node timings
+        result = decision.evaluate(input_data, {'trace': True})
+        rule_result = result.get('result', {})
+        STAGES.add('evaluate_traced', perf_counter() - mark)
+        traced = tracer.record(result, jdm_path, input_data, transaction.get('uuid') or transaction.get('id'))
+    else:
+        # Evaluate rules
+        result = decision.evaluate(input_data)
+        rule_result = result.get('result', {})
+        STAGES.add('evaluate', perf_counter() - mark)
 
     # Determine what matched
-    matched_by = 'none'
-    if rule_result.get('gl_account'):
-        notes = rule_result.get('notes', '').lower()
-        if 'mcc' in notes:
-            matched_by = 'mcc'
-        elif input_data['merchant']:
-            matched_by = 'merchant'
-        else:
-            matched_by = 'other'
+    rule = RuleResult.from_outputs(rule_result) if entry is not None else rule_result_for(rule_results, rule_result)
+    if entry is not None:
+        matched_by = 'overlay'
+    elif traced is not None:
+        matched_by = traced['matched_by']
+    else:
+        matched_by = rule.matched(input_data['merchant'])
 
     # Detect discrepancy with Bill.com classification
+    mark = perf_counter()
     billcom_account = extract_account_from_budget(billcom_budget)
-    our_account = rule_result.get('gl_account', '').strip('"')
+    STAGES.add('extract_budget', perf_counter() - mark)
+    mark = perf_counter()
+    our_account = rule.gl_account or ''
     has_discrepancy = False
     discrepancy_reason = None
 
@@ -205,12 +414,12 @@ def classify_transaction(
 
     # Build response
     response = {
-        'gl_account': our_account or None,
-        'gl_account_name': rule_result.get('gl_account_name', '').strip('"') or None,
-        'action': rule_result.get('action', 'REVIEW').strip('"'),
+        'gl_account': rule.gl_account,
+        'gl_account_name': rule.gl_account_name,
+        'action': rule.action,
         'confidence': confidence,
         'matched_by': matched_by,
-        'rule_notes': rule_result.get('notes', '').strip('"') or None,
+        'rule_notes': rule.notes,
         'has_discrepancy': has_discrepancy,
         'discrepancy': {
             'billcom_budget': billcom_budget,
@@ -221,63 +430,205 @@ def classify_transaction(
         'input_used': input_data,
         'performance': result.get('performance', '')
     }
+    if traced is not None:
+        response['rule_id'] = traced['rule_id']
+        response['trace_timings'] = traced['trace_timings']
+    STAGES.add('assemble', perf_counter() - mark)
 
     return response
 
 
-def classify_batch(transactions: list, jdm_path: str) -> list:
+def _classify_chunk(decision, rule_results, rules_path: str, items: list, company, overlay, tracer, lock) -> tuple:
     """
-    Classify multiple transactions efficiently.
+    Classify one contiguous chunk of classify_batch items.
 
-    Args:
-        transactions: List of dicts, each with 'transaction', 'employee', 'billcom_budget'
-        jdm_path: Path to the JDM rules file
+    Runs on the calling thread or a pool thread. The decision is shared;
+    the input dict is a per-thread scratch buffer that zen only reads during
+    evaluate(). Overlay and tracer calls are serialized with lock when one
+    is given. Matched rows take their fields from the prebuilt rule_results
+    record of the rule_id zen returns. Items may be dicts or TransactionRecords; dicts are reduced to
+    a record first so the loop reads resolved attributes only.
 
     Returns:
-        List of classification results
+        (results, {stage: (seconds, calls)})
     """
-    # Load JDM rules once
-    with open(jdm_path, 'r') as f:
-        jdm_content = f.read()
+    input_data = getattr(_scratch, 'input_data', None)
+    if input_data is None:
+        input_data = _scratch.input_data = {}
+    guard = lock or nullcontext()
+    get_rule = rule_results.get
 
-    engine = zen.ZenEngine()
-    decision = engine.create_decision(jdm_content)
+    # Stage times are summed locally and reported once per batch
+    build_time = evaluate_time = traced_time = budget_time = assemble_time = 0.0
+    evaluated = traced_count = 0
 
     results = []
-    for item in transactions:
-        txn = item.get('transaction', {})
-        emp = item.get('employee', {})
-        budget = item.get('billcom_budget', '')
-
-        # Prepare input
-        input_data = {
-            'mcc': txn.get('merchantCategoryCode') or txn.get('mcc', ''),
-            'merchant': (txn.get('rawMerchantName') or txn.get('merchantName') or '').upper(),
-            'amount': float(txn.get('amount', 0)),
-            'user_team': emp.get('team') or emp.get('department', ''),
-            'state_match': txn.get('state_match', ''),
-        }
-
-        result = decision.evaluate(input_data)
-        rule_result = result.get('result', {})
+    for item in items:
+        start = perf_counter()
+        record = item if type(item) is TransactionRecord else TransactionRecord.from_item(item)
+        budget = record.budget
+
+        traced = None
+        sample = False
+        entry = None
+        if overlay is not None or tracer is not None:
+            with guard:
+                entry = overlay.lookup(record, {'team': record.user_team}) if overlay is not None else None
+                sample = entry is None and tracer is not None and tracer.should_sample()
+
+        if entry is not None:
+            rule = RuleResult.from_outputs(overlay_result(entry))
+            mark = perf_counter()
+            build_time += mark - start
+        elif sample:
+            record.fill_input(input_data)
+            mark = perf_counter()
+            build_time += mark - start
+
+            result = decision.evaluate(input_data, {'trace': True})
+            outputs = result.get('result')
+            rule = get_rule(outputs.get('rule_id')) or RuleResult.from_outputs(outputs) if outputs else NO_MATCH
+            with guard:
+                traced = tracer.record(result, rules_path, dict(input_data), record.transaction_id)
+            traced_count += 1
+            start, mark = mark, perf_counter()
+            traced_time += mark - start
+        else:
+            # Prepare input
+            record.fill_input(input_data)
+            mark = perf_counter()
+            build_time += mark - start
+
+            result = decision.evaluate(input_data)
+            outputs = result.get('result')
+            rule = get_rule(outputs.get('rule_id')) or RuleResult.from_outputs(outputs) if outputs else NO_MATCH
+            evaluated += 1
+            start, mark = mark, perf_counter()
+            evaluate_time += mark - start
 
         # Quick classification
-        our_account = rule_result.get('gl_account', '').strip('"')
+        our_account = rule.gl_account
         billcom_account = extract_account_from_budget(budget)
-        has_discrepancy = billcom_account and our_account and billcom_account != our_account
+        start, mark = mark, perf_counter()
+        budget_time += mark - start
+        has_discrepancy = bool(billcom_account and our_account and billcom_account != our_account)
 
         results.append({
-            'transaction_id': txn.get('uuid') or txn.get('id'),
-            'gl_account': our_account or None,
-            'action': rule_result.get('action', 'REVIEW').strip('"'),
+            'transaction_id': record.transaction_id,
+            'gl_account': our_account,
+            'gl_account_name': rule.gl_account_name,
+            'action': rule.action,
             'has_discrepancy': has_discrepancy,
             'billcom_budget': budget,
-            'notes': rule_result.get('notes', '').strip('"') or None
+            'notes': rule.notes
         })
+        if company:
+            results[-1]['company'] = company
+            erpnext_account = rule.erpnext_accounts.get(company)
+            if erpnext_account:
+                results[-1]['erpnext_account'] = erpnext_account
+        if entry is not None:
+            results[-1]['matched_by'] = 'overlay'
+        elif traced is not None:
+            results[-1].update(traced)
+        assemble_time += perf_counter() - mark
+
+    count = len(items)
+    timings = {
+        'build_input': (build_time, count),
+        'evaluate': (evaluate_time, evaluated),
+        'evaluate_traced': (traced_time, traced_count),
+        'extract_budget': (budget_time, count),
+        'assemble': (assemble_time, count),
+    }
+    return results, timings
+
+
+def classify_batch(
+    transactions: list,
+    jdm_path: Optional[str] = None,
+    merchant_table=None,
+    company: Optional[str] = None,
+    overlay=None,
+    tracer=None,
+    workers: int = 1,
+    similarity_index=None,
+) -> list:
+    """
+    Classify multiple transactions efficiently.
+
+    Args:
+        transactions: List of dicts, each with 'transaction', 'employee', 'billcom_budget'
+        jdm_path: Path to the JDM rules file (default: the company's rule pack)
+        merchant_table: Optional merchant_normalizer.MerchantTable; when given,
+            results also carry 'merchant_id' (None for merchants the table has
+            no ID for yet) and 'merchant_canonical'
+        company: Company code; selects the rule pack when jdm_path is omitted
+            and is recorded on each result, with the company's full ERPNext
+            expense account ('erpnext_account') for rule matches
+        overlay: Optional decision_overlay.DecisionOverlay checked before the rules
+        tracer: Optional trace_sampler.TraceSampler; sampled results also
+            carry rule_id and trace_timings
+        workers: Threads sharing the one compiled decision. Chunks of
+            THREAD_CHUNK_SIZE items are classified concurrently and results
+            keep input order (see scripts/thread_scaling.py for the
+            thread-safety check and measured scaling).
+        similarity_index: Optional merchant_similarity.MerchantIndex; results
+            without a gl_account also carry 'suggestions' (nearest known
+            merchants and their accounts)
+
+    Returns:
+        List of classification results
+    """
+    # Load JDM rules once
+    rules_path = jdm_path or resolve_rules_path(company)
+    decision = load_decision(rules_path)
+    rule_results = load_rule_results(rules_path)
+
+    if workers > 1 and len(transactions) > THREAD_CHUNK_SIZE:
+        lock = threading.Lock() if overlay is not None or tracer is not None else None
+        chunks = [
+            transactions[offset:offset + THREAD_CHUNK_SIZE]
+            for offset in range(0, len(transactions), THREAD_CHUNK_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(
+                lambda chunk: _classify_chunk(decision, rule_results, rules_path, chunk, company, overlay, tracer, lock),
+                chunks,
+            ))
+    else:
+        parts = [_classify_chunk(decision, rule_results, rules_path, transactions, company, overlay, tracer, None)]
+
+    results = []
+    totals = {}
+    for chunk_results, timings in parts:
+        results.extend(chunk_results)
+        for stage, (seconds, calls) in timings.items():
+            previous = totals.get(stage, (0.0, 0))
+            totals[stage] = (previous[0] + seconds, previous[1] + calls)
+
+    STAGES.count(len(transactions))
+    for stage, (seconds, calls) in totals.items():
+        if calls:
+            STAGES.add(stage, seconds, calls)
+
+    if merchant_table is not None:
+        annotate(results, transactions, merchant_table)
+    if similarity_index is not None:
+        similarity_index.suggest(results, transactions)
 
     return results
 
 
+def _locate_or_exit(items: list, company: str):
+    """Fill state_match for the CLI, exiting with a JSON error for an unknown company."""
+    try:
+        fill_state_match(items, company)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Classify Bill.com transactions')
     parser.add_argument('--transaction', type=str, help='Transaction JSON')
@@ -285,34 +636,77 @@ def main():
     parser.add_argument('--billcom_budget', type=str, default='', help='Bill.com budget name')
     parser.add_argument('--batch', type=str, help='Batch of transactions JSON (array)')
     parser.add_argument('--jdm', type=str, help='Path to JDM rules file')
+    parser.add_argument('--company', type=str, help='Company code; selects its rule pack if one exists')
+    parser.add_argument('--overlay', type=str, help='Learned-decision overlay JSON checked before the rules')
+    parser.add_argument('--workers', type=int, default=1, help='Threads for batch mode (shared decision)')
+    parser.add_argument('--locate', action='store_true', help='Fill missing state_match from merchant locations (needs --company)')
+    parser.add_argument('--suggest', action='store_true', help='Batch mode: suggest accounts for unmatched merchants from similar known ones')
+    parser.add_argument('--history', type=str, help='With --suggest: transaction history (JSON array or NDJSON) whose merchants are indexed too')
+    parser.add_argument('--format', type=str, choices=FORMATS, default='json', help='Output format (default: indented JSON)')
+    parser.add_argument('--fields', type=str, help='Comma-separated (dotted) result fields to output, e.g. transaction_id,gl_account,action')
+    parser.add_argument('--output', type=str, help='Write results to this file instead of stdout (required for parquet)')
+    parser.add_argument('--trace-rate', type=float, default=0.0, help='Fraction of evaluations to trace (0-1)')
+    parser.add_argument('--trace-out', type=str, help='Append sampled traces to this NDJSON file')
+    parser.add_argument('--timings', action='store_true', help='Print per-stage timings to stderr')
+    parser.add_argument('--profile', type=str, metavar='PATH', help='Write a cProfile dump to PATH and collapsed stacks to PATH.collapsed')
 
     args = parser.parse_args()
 
-    # Determine JDM path
-    script_dir = Path(__file__).parent
-    config_dir = script_dir.parent / 'config'
-    jdm_path = args.jdm or str(config_dir / 'classification_rules.jdm.json')
-
-    if args.batch:
-        # Batch mode
-        transactions = json.loads(args.batch)
-        results = classify_batch(transactions, jdm_path)
-        print(json.dumps(results, indent=2))
-    elif args.transaction:
-        # Single transaction mode
-        transaction = json.loads(args.transaction)
-        employee = json.loads(args.employee)
-
-        result = classify_transaction(
-            transaction=transaction,
-            employee=employee,
-            billcom_budget=args.billcom_budget,
-            jdm_path=jdm_path
-        )
-        print(json.dumps(result, indent=2))
-    else:
+    if not (args.batch or args.transaction):
         parser.print_help()
         sys.exit(1)
+    if args.format == 'parquet' and not args.output:
+        parser.error('--format parquet requires --output')
+    if args.locate and not args.company:
+        parser.error('--locate requires --company')
+
+    # Determine JDM path
+    jdm_path = args.jdm or resolve_rules_path(args.company)
+    overlay = DecisionOverlay.load(args.overlay) if args.overlay else None
+    tracer = TraceSampler(args.trace_rate) if args.trace_rate or args.trace_out else None
+
+    with profile_session(args.profile, args.timings):
+        if args.batch:
+            # Batch mode
+            with STAGES.stage('parse_input'):
+                transactions = json.loads(args.batch)
+            if args.locate:
+                _locate_or_exit(transactions, args.company)
+            similarity_index = build_index(jdm_path, overlay, args.history) if args.suggest else None
+            output = classify_batch(
+                transactions, jdm_path, company=args.company, overlay=overlay, tracer=tracer,
+                workers=args.workers, similarity_index=similarity_index,
+            )
+        else:
+            # Single transaction mode
+            with STAGES.stage('parse_input'):
+                transaction = json.loads(args.transaction)
+                employee = json.loads(args.employee)
+            if args.locate:
+                _locate_or_exit([transaction], args.company)
+
+            output = classify_transaction(
+                transaction=transaction,
+                employee=employee,
+                billcom_budget=args.billcom_budget,
+                jdm_path=jdm_path,
+                overlay=overlay,
+                tracer=tracer
+            )
+
+        with STAGES.stage('serialize'):
+            try:
+                write_output(output, args.format, parse_fields(args.fields), args.output)
+            except (RuntimeError, ValueError) as e:
+                print(json.dumps({"error": str(e)}), file=sys.stderr)
+                sys.exit(1)
+
+    if tracer is not None and args.trace_out:
+        tracer.export(args.trace_out)
+
+    # Persist overlay hit counts
+    if overlay is not None and overlay.dirty:
+        overlay.save(args.overlay)
 
 
 if __name__ == '__main__':
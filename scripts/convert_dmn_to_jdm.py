@@ -4,12 +4,43 @@ Convert DMN CSV rules to GoRules JDM (JSON Decision Model) format.
 
 This script reads dmn_rules.csv and generates a JDM-compatible JSON file
 that can be executed by zen-engine for consistent transaction classification.
+
+Merchant patterns are compiled to flags: each distinct merchant wildcard
+gets a pattern ID (m1, m2, ...) listed in the decision table's
+"merchantPatterns", and its rows test `merchant_flags.mN` instead of
+running upper()/contains() inside zen. The classifier computes the flags
+for a transaction once (merchant_flags.py) before evaluation. Use
+--expressions to inline the string expressions instead, e.g. for a JDM
+evaluated without the classifier.
+
+Every row also outputs its rule_id, and the decision table carries
+"ruleResults": rule ID -> the classifier's result for that row, built once
+here (rule_result_record) instead of once per transaction: unquoted account,
+name, action and notes, and matched_by. The classifier maps the winning
+rule_id to its record and only adds the per-transaction fields. The full
+ERPNext expense accounts (expense_accounts) are not stored in the JDM: the
+classifier resolves them when it loads the rules, so edits to the account
+tables in journal_entry_template.py take effect without recompiling.
+
+Usage:
+    python convert_dmn_to_jdm.py
+    python convert_dmn_to_jdm.py --expressions
+    python convert_dmn_to_jdm.py --timings
+    python convert_dmn_to_jdm.py --profile /tmp/convert.prof
 """
 
+import argparse
 import csv
 import json
 import re
 from pathlib import Path
+from typing import Optional
+
+from journal_entry_template import COMPANY_CONFIG, resolve_expense_account
+from profiling import STAGES, profile_session
+
+# Input field holding the IDs of the merchant patterns a transaction matches
+MERCHANT_FLAGS_FIELD = "merchant_flags"
 
 
 def wildcard_to_zen_expression(pattern: str, field: str = "$") -> str:
@@ -63,11 +94,55 @@ def amount_to_zen_expression(min_val: str, max_val: str, field: str = "amount")
     return ""
 
 
-def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
-    """Convert DMN CSV to JDM JSON format."""
+def merchant_flag_expression(pattern_id: str) -> str:
+    """ZEN expression testing one precomputed merchant pattern flag."""
+    return f"{MERCHANT_FLAGS_FIELD}.{pattern_id}"
+
+
+def rule_result_record(gl_account: str, gl_account_name: str, action: str, notes: str) -> dict:
+    """
+    Build the classifier's result record for one rule's (unquoted) outputs.
+
+    matched_by is 'mcc' when the notes mention an MCC and None otherwise;
+    the classifier then reports 'merchant' or 'other' depending on whether
+    the transaction has a merchant.
+    """
+    return {
+        'gl_account': gl_account or None,
+        'gl_account_name': gl_account_name or None,
+        'action': action,
+        'notes': notes or None,
+        'matched_by': 'mcc' if 'mcc' in notes.lower() else None,
+    }
+
+
+def expense_accounts(gl_account: Optional[str], gl_account_name: Optional[str], companies=tuple(COMPANY_CONFIG)) -> dict:
+    """Map each company the account resolves for to its full ERPNext expense account."""
+    accounts = {}
+    if gl_account and gl_account != 'SKIP':
+        for company in companies:
+            try:
+                accounts[company] = resolve_expense_account(company, gl_account, gl_account_name or '')
+            except ValueError:
+                continue
+    return accounts
+
+
+def build_jdm(csv_path: str, merchant_flags: bool = True) -> dict:
+    """
+    Build the JDM structure for a DMN CSV without writing it to disk.
+
+    Args:
+        csv_path: DMN rules CSV
+        merchant_flags: Test precomputed merchant pattern flags (see module
+            docstring) instead of inline string expressions
+    """
 
     rules = []
     rule_id = 0
+    # merchant expression -> pattern ID, in first-use order
+    merchant_patterns = {}
+    rule_results = {}
 
     with open(csv_path, 'r') as f:
         reader = csv.DictReader(f)
@@ -101,10 +176,12 @@ def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
 
             # Merchant pattern (wildcard match)
             merchant_pattern = (row.get('merchant_pattern') or '').strip()
-            if merchant_pattern:
-                rule['merchant_expr'] = wildcard_to_zen_expression(merchant_pattern, 'merchant')
+            expression = wildcard_to_zen_expression(merchant_pattern, 'merchant') if merchant_pattern else ''
+            if expression and merchant_flags:
+                pattern_id = merchant_patterns.setdefault(expression, f"m{len(merchant_patterns) + 1}")
+                rule['merchant_expr'] = merchant_flag_expression(pattern_id)
             else:
-                rule['merchant_expr'] = ''
+                rule['merchant_expr'] = expression
 
             # Amount range
             amount_min = (row.get('amount_min') or '').strip()
@@ -161,6 +238,8 @@ def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
             rule['gl_account_name'] = f'"{gl_account_name.strip()}"'
             rule['action'] = f'"{action.strip()}"'
             rule['notes'] = f'"{notes.strip()}"'
+            rule['rule_id'] = f'"{rule["_id"]}"'
+            rule_results[rule['_id']] = rule_result_record(gl_account.strip(), gl_account_name.strip(), action.strip(), notes.strip())
 
             rules.append(rule)
 
@@ -201,9 +280,11 @@ def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
                         {"id": "gl_account", "name": "GL Account", "field": "gl_account"},
                         {"id": "gl_account_name", "name": "Account Name", "field": "gl_account_name"},
                         {"id": "action", "name": "Action", "field": "action"},
-                        {"id": "notes", "name": "Notes", "field": "notes"}
+                        {"id": "notes", "name": "Notes", "field": "notes"},
+                        {"id": "rule_id", "name": "Rule ID", "field": "rule_id"}
                     ],
-                    "rules": rules
+                    "rules": rules,
+                    "ruleResults": rule_results
                 }
             }
         ],
@@ -213,9 +294,48 @@ def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
         ]
     }
 
+    if merchant_patterns:
+        content = jdm["nodes"][2]["content"]
+        content["merchantPatterns"] = {pattern_id: expression for expression, pattern_id in merchant_patterns.items()}
+
+    return jdm
+
+
+def get_decision_rules(jdm: dict) -> list:
+    """Return the rules list of the decision table node in a JDM structure."""
+    for node in jdm.get("nodes", []):
+        if node.get("type") == "decisionTableNode":
+            return node["content"]["rules"]
+    raise ValueError("JDM has no decision table node")
+
+
+def get_merchant_patterns(jdm: dict) -> dict:
+    """Return the decision table's {pattern ID: merchant expression} table ({} when inlined)."""
+    for node in jdm.get("nodes", []):
+        if node.get("type") == "decisionTableNode":
+            return node["content"].get("merchantPatterns", {})
+    return {}
+
+
+def get_rule_results(jdm: dict) -> dict:
+    """Return the decision table's {rule ID: result record} table ({} for JDMs compiled without it)."""
+    for node in jdm.get("nodes", []):
+        if node.get("type") == "decisionTableNode":
+            return node["content"].get("ruleResults", {})
+    return {}
+
+
+def convert_dmn_to_jdm(csv_path: str, output_path: str, merchant_flags: bool = True) -> dict:
+    """Convert DMN CSV to JDM JSON format."""
+    with STAGES.stage('build_jdm'):
+        jdm = build_jdm(csv_path, merchant_flags)
+    rules = get_decision_rules(jdm)
+    STAGES.count(len(rules))
+
     # Write output
-    with open(output_path, 'w') as f:
-        json.dump(jdm, f, indent=2)
+    with STAGES.stage('write_jdm'):
+        with open(output_path, 'w') as f:
+            json.dump(jdm, f, indent=2)
 
     print(f"Converted {len(rules)} rules to JDM format")
     print(f"Output written to: {output_path}")
@@ -224,9 +344,21 @@ def convert_dmn_to_jdm(csv_path: str, output_path: str) -> dict:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile config/dmn_rules*.csv into JDM rule files")
+    parser.add_argument("--expressions", action="store_true", help="Inline merchant string expressions instead of merchant_flags tests")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings to stderr")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Write a cProfile dump to PATH and collapsed stacks to PATH.collapsed")
+    args = parser.parse_args()
+
     script_dir = Path(__file__).parent
     config_dir = script_dir.parent / "config"
     csv_path = config_dir / "dmn_rules.csv"
     output_path = config_dir / "classification_rules.jdm.json"
 
-    convert_dmn_to_jdm(str(csv_path), str(output_path))
+    with profile_session(args.profile, args.timings):
+        convert_dmn_to_jdm(str(csv_path), str(output_path), not args.expressions)
+
+        # Company rule packs: dmn_rules.<COMPANY>.csv -> classification_rules.<COMPANY>.jdm.json
+        for pack_csv in sorted(config_dir.glob("dmn_rules.*.csv")):
+            company = pack_csv.name[len("dmn_rules."):-len(".csv")]
+            convert_dmn_to_jdm(str(pack_csv), str(config_dir / f"classification_rules.{company}.jdm.json"), not args.expressions)
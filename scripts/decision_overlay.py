@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Learned-decision overlay consulted before the rules engine.
+
+When a human (SKILL.md step 7) or the LLM fallback settles how a merchant
+should be classified in a given context, the answer is stored here keyed on
+(canonical merchant, MCC, team). classify_transaction() and classify_batch()
+check the overlay with one dict lookup before evaluating the decision table,
+so repeat cases skip both rule evaluation and any remote fallback.
+
+Entries that keep getting hit can be promoted into config/dmn_rules.csv as
+regular rules. Promoted rows are inserted at the top of the table, matching
+the overlay's precedence over every existing rule. Each entry remembers the
+normalized (pre-alias) merchant names it was recorded or hit with, and
+promotion writes one row per name, so aliased variants keep matching.
+
+Usage:
+    # Record a confirmed decision
+    python decision_overlay.py record --merchant "SUNOCO 0004813209" --mcc 5541 --team Delivery \\
+        --gl-account "Gas and Tolls" --gl-account-name "Gas and Tolls" --source human
+
+    # List entries, most used first
+    python decision_overlay.py list
+
+    # Promote entries with at least 10 hits into dmn_rules.csv
+    python decision_overlay.py promote --min-hits 10
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from merchant_normalizer import DEFAULT_TABLE_PATH, MerchantTable, normalize_merchant, raw_merchant
+
+CONFIG_DIR = Path(__file__).parent.parent / 'config'
+DEFAULT_OVERLAY_PATH = CONFIG_DIR / 'decision_overlay.json'
+DEFAULT_CSV_PATH = CONFIG_DIR / 'dmn_rules.csv'
+
+PROMOTED_HEADER = '# --- Promoted overlay decisions (scripts/decision_overlay.py promote) ---'
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class DecisionOverlay:
+    """Persistent exact-match decisions keyed on (canonical merchant, MCC, team)."""
+
+    def __init__(self, entries: Optional[dict] = None, merchant_table: Optional[MerchantTable] = None):
+        self.entries = entries or {}
+        self.merchant_table = merchant_table
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str = str(DEFAULT_OVERLAY_PATH), merchant_table: Optional[MerchantTable] = None):
+        """Load an overlay, or start an empty one if the file does not exist yet."""
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        return cls(entries, merchant_table)
+
+    def save(self, path: str = str(DEFAULT_OVERLAY_PATH)):
+        with open(path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        self.dirty = False
+
+    def key(self, transaction: dict, employee: dict) -> str:
+        """Build the overlay key for a transaction and employee."""
+        raw = raw_merchant(transaction)
+        merchant = self.merchant_table.canonical(raw) if self.merchant_table else normalize_merchant(raw)
+        mcc = transaction.get('merchantCategoryCode') or transaction.get('mcc', '')
+        team = employee.get('team') or employee.get('department', '')
+        return f"{merchant}|{mcc}|{team}"
+
+    def lookup(self, transaction: dict, employee: dict) -> Optional[dict]:
+        """Return the stored decision for a transaction (and count the hit), or None."""
+        entry = self.entries.get(self.key(transaction, employee))
+        if entry is not None:
+            entry['hits'] = entry.get('hits', 0) + 1
+            entry['last_hit'] = _now()
+            merchant = normalize_merchant(raw_merchant(transaction))
+            merchants = entry.setdefault('merchants', [])
+            if merchant not in merchants:
+                merchants.append(merchant)
+            self.dirty = True
+        return entry
+
+    def record(
+        self,
+        transaction: dict,
+        employee: dict,
+        gl_account: str,
+        gl_account_name: Optional[str],
+        action: str = 'AUTO_POST',
+        source: str = 'human',
+    ) -> dict:
+        """Store (or replace) the decision for a transaction's key."""
+        key = self.key(transaction, employee)
+        previous = self.entries.get(key, {})
+        merchants = list(previous.get('merchants', []))
+        merchant = normalize_merchant(raw_merchant(transaction))
+        if merchant not in merchants:
+            merchants.append(merchant)
+        entry = {
+            'gl_account': gl_account,
+            'gl_account_name': gl_account_name,
+            'action': action,
+            'source': source,
+            'hits': previous.get('hits', 0),
+            'created': previous.get('created') or _now(),
+            'updated': _now(),
+            'promoted': False,
+            'merchants': merchants,
+        }
+        self.entries[key] = entry
+        self.dirty = True
+        return entry
+
+    def record_fallback(self, items: List[dict], results: List[dict], confidences=('HIGH',)) -> int:
+        """
+        Store LLM-fallback answers that came back with a settled confidence.
+
+        Args:
+            items: The classify_batch items the results belong to
+            results: Results updated by llm_fallback.FallbackQueue.resolve()
+            confidences: Confidence levels treated as settled
+
+        Returns:
+            Number of overlay entries written
+        """
+        written = set()
+        for item, result in zip(items, results):
+            if result.get('matched_by') != 'llm' or result.get('confidence') not in confidences:
+                continue
+            key = self.key(item.get('transaction', {}), item.get('employee', {}))
+            if key in written:
+                continue
+            self.record(
+                item.get('transaction', {}),
+                item.get('employee', {}),
+                result['gl_account'],
+                result.get('gl_account_name'),
+                result.get('action', 'AUTO_POST'),
+                source='llm',
+            )
+            written.add(key)
+        return len(written)
+
+    def promotable(self, min_hits: int) -> List[tuple]:
+        """
+        Return (key, entry) pairs with at least min_hits that are not yet promoted.
+
+        Entries without a merchant are never promotable: their rule would have
+        no merchant pattern and match every merchant.
+        """
+        return sorted(
+            (
+                (key, entry) for key, entry in self.entries.items()
+                if entry.get('hits', 0) >= min_hits and not entry.get('promoted') and key.split('|', 1)[0]
+            ),
+            key=lambda kv: kv[1].get('hits', 0),
+            reverse=True,
+        )
+
+    def promote(self, min_hits: int, csv_path: str = str(DEFAULT_CSV_PATH), dry_run: bool = False) -> List[dict]:
+        """
+        Insert frequently used entries as rules at the top of dmn_rules.csv.
+
+        Each entry becomes one row per normalized merchant name it covered.
+        Entries recorded before those names were tracked fall back to their
+        key's merchant, and are skipped when that is an alias target (the
+        canonical name need not occur in the raw descriptors).
+
+        Returns:
+            The CSV rows written (or that would be written with dry_run)
+        """
+        aliased = set(self.merchant_table.aliases.values()) if self.merchant_table else set()
+        candidates = []
+        for key, entry in self.promotable(min_hits):
+            merchant = key.split('|', 1)[0]
+            merchants = entry.get('merchants') or ([] if merchant in aliased else [merchant])
+            if merchants:
+                candidates.append((key, entry, merchants))
+        if not candidates:
+            return []
+
+        with open(csv_path, 'r', newline='') as f:
+            lines = f.read().splitlines(keepends=True)
+        fieldnames = next(csv.reader([lines[0]]))
+
+        rows = []
+        for key, entry, merchants in candidates:
+            _, mcc, team = key.split('|')
+            for merchant in merchants:
+                rows.append({
+                    'merchant_pattern': '*' + '*'.join(merchant.split()) + '*',
+                    'merchant_category': mcc,
+                    'user_team': team,
+                    'gl_account': entry['gl_account'],
+                    'gl_account_name': entry.get('gl_account_name') or entry['gl_account'],
+                    'action': entry.get('action', 'AUTO_POST'),
+                    'notes': f"Promoted overlay decision ({entry.get('source')}, {entry.get('hits', 0)} hits)",
+                })
+
+        if dry_run:
+            return rows
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, restval='', lineterminator='\n')
+        writer.writerows(rows)
+        block = f"{PROMOTED_HEADER}\n{buffer.getvalue()}\n"
+
+        if any(line.startswith(PROMOTED_HEADER) for line in lines):
+            # Append to the existing promoted block, right after its header
+            position = next(i for i, line in enumerate(lines) if line.startswith(PROMOTED_HEADER)) + 1
+            lines.insert(position, buffer.getvalue())
+        else:
+            lines.insert(1, block)
+
+        with open(csv_path, 'w', newline='') as f:
+            f.write(''.join(lines))
+
+        for key, entry, merchants in candidates:
+            entry['promoted'] = True
+        self.dirty = True
+        return rows
+
+
+def overlay_result(entry: dict) -> dict:
+    """Shape an overlay entry like a decision-table result."""
+    return {
+        'gl_account': entry['gl_account'],
+        'gl_account_name': entry.get('gl_account_name') or '',
+        'action': entry.get('action', 'AUTO_POST'),
+        'notes': f"Overlay decision ({entry.get('source', 'unknown')})",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the learned-decision overlay')
+    parser.add_argument('--overlay', type=str, default=str(DEFAULT_OVERLAY_PATH), help='Overlay JSON file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record a settled decision')
+    record_parser.add_argument('--merchant', type=str, required=True, help='Raw merchant name')
+    record_parser.add_argument('--mcc', type=str, default='', help='Merchant category code')
+    record_parser.add_argument('--team', type=str, default='', help='Employee team')
+    record_parser.add_argument('--gl-account', type=str, required=True, help='GL account number or COGS name')
+    record_parser.add_argument('--gl-account-name', type=str, help='GL account name')
+    record_parser.add_argument('--action', type=str, default='AUTO_POST', choices=['AUTO_POST', 'REVIEW', 'REJECT', 'SKIP'])
+    record_parser.add_argument('--source', type=str, default='human', help='Who settled it (human, llm)')
+
+    subparsers.add_parser('list', help='List entries, most used first')
+
+    promote_parser = subparsers.add_parser('promote', help='Promote frequently used entries into dmn_rules.csv')
+    promote_parser.add_argument('--min-hits', type=int, default=10, help='Minimum hits to promote')
+    promote_parser.add_argument('--csv', type=str, default=str(DEFAULT_CSV_PATH), help='DMN rules CSV')
+    promote_parser.add_argument('--merchant-table', type=str, default=str(DEFAULT_TABLE_PATH), help='Merchant table whose aliases the overlay keys use')
+    promote_parser.add_argument('--dry-run', action='store_true', help='Print rows without writing')
+
+    args = parser.parse_args()
+    # promote needs the aliases to recognize keys that are alias targets
+    merchant_table = MerchantTable.load(args.merchant_table) if args.command == 'promote' else None
+    overlay = DecisionOverlay.load(args.overlay, merchant_table)
+
+    try:
+        if args.command == 'record':
+            entry = overlay.record(
+                {'rawMerchantName': args.merchant, 'mcc': args.mcc},
+                {'team': args.team},
+                args.gl_account,
+                args.gl_account_name,
+                args.action,
+                args.source,
+            )
+            output = entry
+        elif args.command == 'list':
+            output = dict(sorted(overlay.entries.items(), key=lambda kv: kv[1].get('hits', 0), reverse=True))
+        else:
+            output = overlay.promote(args.min_hits, args.csv, args.dry_run)
+            if output and not args.dry_run:
+                print("Run scripts/convert_dmn_to_jdm.py to recompile the rules.", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    if overlay.dirty:
+        overlay.save(args.overlay)
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
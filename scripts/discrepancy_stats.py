@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Streaming discrepancy analytics with fixed-memory sketches.
+
+Aggregates Bill.com budget vs GL account discrepancies over arbitrarily
+long transaction streams. Each dimension (budget->account pair, cardholder,
+merchant) keeps a Count-Min sketch for frequency estimates and a
+Space-Saving table for the heavy hitters, so memory does not grow with the
+number of distinct keys or transactions.
+
+Usage:
+    # Classify a history file and print a summary every 100k transactions
+    python discrepancy_stats.py --history history.ndjson --report-every 100000
+
+    # Read classify_batch items from stdin
+    cat history.ndjson | python discrepancy_stats.py --report-every 50000
+
+History files are NDJSON or a JSON array; both are read record by record.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from classify_transaction import classify_batch, extract_account_from_budget
+from merchant_normalizer import MerchantTable, raw_merchant
+from rule_diff import iter_chunks, iter_history
+
+
+class CountMinSketch:
+    """Count-Min sketch: estimates never undercount, overcount is bounded by width."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.tables = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1):
+        for row, index in enumerate(self._indexes(key)):
+            self.tables[row][index] += count
+
+    def estimate(self, key: str) -> int:
+        return min(self.tables[row][index] for row, index in enumerate(self._indexes(key)))
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters: tracks at most `capacity` keys with error bounds."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, key: str, count: int = 1):
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            return
+
+        # Replace the smallest counter; its count becomes the new key's error bound
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        del self.errors[victim]
+        self.counts[key] = floor + count
+        self.errors[key] = floor
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+
+class DiscrepancyStream:
+    """
+    Streaming aggregation of discrepancies by budget->account pair, user and merchant.
+
+    Memory is fixed by the sketch width/depth and heavy-hitter capacity,
+    regardless of stream length. With a merchant_table, merchants are keyed
+    by their canonical name (read-only; the table is never changed).
+    """
+
+    DIMENSIONS = ('pair', 'user', 'merchant')
+
+    def __init__(
+        self,
+        width: int = 2048,
+        depth: int = 4,
+        capacity: int = 64,
+        report_every: int = 0,
+        on_report: Optional[Callable[[dict], None]] = None,
+        merchant_table: Optional[MerchantTable] = None,
+    ):
+        self.observed = 0
+        self.discrepancies = 0
+        self.report_every = report_every
+        self.on_report = on_report
+        self.merchant_table = merchant_table
+        # Discrepancy counts per dimension, plus all-transaction counts for rates
+        self.sketches = {dim: CountMinSketch(width, depth) for dim in self.DIMENSIONS}
+        self.totals = {dim: CountMinSketch(width, depth) for dim in ('user', 'merchant')}
+        self.heavy = {dim: SpaceSaving(capacity) for dim in self.DIMENSIONS}
+
+    def observe(self, item: dict, result: dict):
+        """Record one classify_batch item and its result."""
+        txn = item.get('transaction', {})
+        user = txn.get('userEmail') or 'unknown'
+        if self.merchant_table is not None:
+            merchant = self.merchant_table.canonical(raw_merchant(txn)) or 'unknown'
+        else:
+            merchant = result.get('merchant_canonical') or (raw_merchant(txn) or 'unknown').upper()
+
+        self.observed += 1
+        self.totals['user'].add(user)
+        self.totals['merchant'].add(merchant)
+
+        if result.get('has_discrepancy'):
+            self.discrepancies += 1
+            billcom_account = extract_account_from_budget(result.get('billcom_budget', ''))
+            keys = {
+                'pair': f"{billcom_account} -> {result.get('gl_account')}",
+                'user': user,
+                'merchant': merchant,
+            }
+            for dim, key in keys.items():
+                self.sketches[dim].add(key)
+                self.heavy[dim].add(key)
+
+        if self.report_every and self.on_report and self.observed % self.report_every == 0:
+            self.on_report(self.summary())
+
+    def summary(self, top_n: int = 10) -> dict:
+        """Return the current heavy hitters per dimension with estimated counts."""
+        report = {
+            'observed': self.observed,
+            'discrepancies': self.discrepancies,
+        }
+        for dim in self.DIMENSIONS:
+            rows = []
+            for key, count, error in self.heavy[dim].top(top_n):
+                estimate = min(count, self.sketches[dim].estimate(key))
+                row = {'key': key, 'count': estimate, 'max_error': error}
+                if dim in self.totals:
+                    total = self.totals[dim].estimate(key)
+                    row['discrepancy_rate'] = round(estimate / total, 3) if total else None
+                rows.append(row)
+            report[dim] = rows
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming discrepancy analytics for classified transactions')
+    parser.add_argument('--history', type=str, help='History file (JSON array or NDJSON); default stdin')
+    parser.add_argument('--jdm', type=str, help='Path to JDM rules file')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Transactions classified per batch')
+    parser.add_argument('--report-every', type=int, default=0, help='Emit a summary every N transactions')
+    parser.add_argument('--top', type=int, default=10, help='Heavy hitters per dimension in the summary')
+    parser.add_argument('--width', type=int, default=2048, help='Count-Min sketch width')
+    parser.add_argument('--depth', type=int, default=4, help='Count-Min sketch depth')
+    parser.add_argument('--capacity', type=int, default=64, help='Heavy-hitter counters per dimension')
+    parser.add_argument('--merchant-table', type=str, help='Merchant table JSON; aggregate by canonical merchant')
+
+    args = parser.parse_args()
+
+    config_dir = Path(__file__).parent.parent / 'config'
+    jdm_path = args.jdm or str(config_dir / 'classification_rules.jdm.json')
+
+    try:
+        stats = DiscrepancyStream(
+            width=args.width,
+            depth=args.depth,
+            capacity=args.capacity,
+            report_every=args.report_every,
+            on_report=lambda report: print(json.dumps(report), flush=True),
+            merchant_table=MerchantTable.load(args.merchant_table) if args.merchant_table else None,
+        )
+        for chunk in iter_chunks(iter_history(args.history or '-'), args.chunk_size):
+            for item, result in zip(chunk, classify_batch(chunk, jdm_path)):
+                stats.observe(item, result)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(stats.summary(args.top), indent=2))
+
+
+if __name__ == '__main__':
+    main()
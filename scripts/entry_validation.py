@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Pre-post validation of journal-entry batches.
+
+Checks a whole create_batch_entries() batch locally before anything is sent
+to ERPNext, and reports every violation at once instead of one rejected
+post at a time:
+
+    build_error          the template produced an error placeholder, or the
+                         entry or one of its account lines is malformed
+    bad_amount           a line's debit or credit is not a finite number
+    unknown_company      the entry's company is not in COMPANY_CONFIG
+    unknown_account      a line's account is not in the company's chart of
+                         accounts (journal_entry_template.load_account_registry)
+    unbalanced           total debits != total credits (compared in cents)
+    missing_cheque_no    no cheque_no, so the entry cannot be posted idempotently
+    duplicate_cheque_no  cheque_no already used earlier in the batch
+    bad_date             posting_date is missing or not YYYY-MM-DD
+    outside_period       posting_date is outside the open period
+
+The batch is first flattened into columns (one list per field, one row per
+entry or per account line). Each check then runs over a column once:
+accounts and dates are checked per distinct value (a batch uses a handful
+of accounts and dates however long it is), balances are summed per entry
+in integer cents, and duplicates come from one pass over cheque_no.
+
+Usage:
+    python entry_validation.py --file entries.json
+    python entry_validation.py --file entries.json --period-start 2025-10-01 --period-end 2025-10-31
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from journal_entry_template import COMPANY_CONFIG, load_account_registry
+
+CHECKS = (
+    'build_error', 'bad_amount', 'unknown_company', 'unknown_account', 'unbalanced',
+    'missing_cheque_no', 'duplicate_cheque_no', 'bad_date', 'outside_period',
+)
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# ERPNext company name -> company code
+_COMPANY_CODES = {config['company_name']: code for code, config in COMPANY_CONFIG.items()}
+
+
+def _is_date(value) -> bool:
+    """Whether a value is a real YYYY-MM-DD date."""
+    if not isinstance(value, str) or not _DATE_RE.match(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _cents(value) -> int:
+    """An amount in integer cents (None/'' count as 0); raises ValueError/TypeError/OverflowError."""
+    return round(float(value or 0) * 100)
+
+
+def entry_columns(entries: List[dict]) -> dict:
+    """
+    Flatten a batch into per-entry and per-line columns.
+
+    Returns:
+        Dict of equal-length lists: 'index', 'company', 'cheque_no' and
+        'posting_date' (one row per entry that is a document), plus 'line_row'
+        (position in those lists), 'account', 'debit' and 'credit' in cents
+        (one row per account line), and 'malformed': (entry index, check,
+        detail) for account lines that could not be read (they are left out
+        of the line columns)
+    """
+    columns = {name: [] for name in ('index', 'company', 'cheque_no', 'posting_date', 'line_row', 'account', 'debit', 'credit', 'malformed')}
+    add_index, add_company, add_cheque_no, add_posting_date, add_line_row, add_account, add_debit, add_credit, add_malformed = (
+        column.append for column in columns.values()
+    )
+    codes = _COMPANY_CODES
+    row = 0
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or 'error' in entry:
+            continue
+        company = entry.get('company')
+        add_index(i)
+        add_company(codes.get(company, company))
+        add_cheque_no(entry.get('cheque_no'))
+        add_posting_date(entry.get('posting_date'))
+        lines = entry.get('accounts') or []
+        if not isinstance(lines, list):
+            add_malformed((i, 'build_error', f"accounts is not a list: {type(lines).__name__}"))
+            lines = []
+        for n, line in enumerate(lines):
+            if not isinstance(line, dict):
+                add_malformed((i, 'build_error', f"Account line {n} is not an object"))
+                continue
+            amounts = []
+            for side in ('debit', 'credit'):
+                value = line.get(f'{side}_in_account_currency')
+                try:
+                    amounts.append(_cents(value))
+                except (TypeError, ValueError, OverflowError):
+                    add_malformed((i, 'bad_amount', f"Account line {n} {side} is not a number: {value!r}"))
+            if len(amounts) < 2:
+                continue
+            add_line_row(row)
+            add_account(line.get('account'))
+            add_debit(amounts[0])
+            add_credit(amounts[1])
+        row += 1
+    return columns
+
+
+def _registries(companies) -> Dict[str, frozenset]:
+    return {code: load_account_registry(code) for code in set(companies) if code in COMPANY_CONFIG}
+
+
+def validate_entries(
+    entries: List[dict],
+    period: Optional[Tuple[str, str]] = None,
+) -> List[dict]:
+    """
+    Check a batch of journal entries before posting.
+
+    Args:
+        entries: Output of create_batch_entries() (documents or error placeholders)
+        period: Optional (first, last) open posting dates, YYYY-MM-DD, inclusive
+
+    Returns:
+        Every violation, ordered by entry: {'index', 'cheque_no', 'check',
+        'detail'}; empty when the batch can be posted
+    """
+    violations = []
+
+    def report(i: int, check: str, detail: str):
+        entry = entries[i] if isinstance(entries[i], dict) else {}
+        cheque_no = entry.get('cheque_no') or entry.get('transaction_id')
+        violations.append({'index': i, 'cheque_no': cheque_no, 'check': check, 'detail': detail})
+
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            report(i, 'build_error', 'Entry is not an object')
+        elif 'error' in entry:
+            report(i, 'build_error', str(entry['error']))
+
+    columns = entry_columns(entries)
+    for i, check, detail in columns['malformed']:
+        report(i, check, detail)
+    # Entries with unreadable lines cannot be balanced meaningfully
+    malformed = {i for i, _, _ in columns['malformed']}
+    index = columns['index']
+    companies = columns['company']
+    registries = _registries(companies)
+
+    for row, company in enumerate(companies):
+        if company not in registries:
+            report(index[row], 'unknown_company', f"Unknown company: {company}")
+
+    # Accounts: one registry lookup per distinct (company, account)
+    line_companies = [companies[row] for row in columns['line_row']]
+    unknown = {
+        pair for pair in set(zip(line_companies, columns['account']))
+        if pair[0] in registries and pair[1] not in registries[pair[0]]
+    }
+    if unknown:
+        for row, company, account in zip(columns['line_row'], line_companies, columns['account']):
+            if (company, account) in unknown:
+                report(index[row], 'unknown_account', f"Account not in {company} chart of accounts: {account}")
+
+    # Balance: per-entry totals in cents
+    debits = [0] * len(index)
+    credits = [0] * len(index)
+    for row, debit, credit in zip(columns['line_row'], columns['debit'], columns['credit']):
+        debits[row] += debit
+        credits[row] += credit
+    line_counts = Counter(columns['line_row'])
+    for row, (debit, credit) in enumerate(zip(debits, credits)):
+        if index[row] in malformed:
+            continue
+        if debit != credit:
+            report(index[row], 'unbalanced', f"Debits {debit / 100:.2f} != credits {credit / 100:.2f}")
+        elif not line_counts[row]:
+            report(index[row], 'unbalanced', 'Entry has no account lines')
+
+    # cheque_no: present and unique within the batch
+    first_seen = {}
+    for row, cheque_no in enumerate(columns['cheque_no']):
+        if not cheque_no:
+            report(index[row], 'missing_cheque_no', 'Entry has no cheque_no')
+        elif cheque_no in first_seen:
+            report(index[row], 'duplicate_cheque_no', f"cheque_no also used by entry {first_seen[cheque_no]}")
+        else:
+            first_seen[cheque_no] = index[row]
+
+    # Dates: parse each distinct posting_date once
+    first, last = period or (None, None)
+    problems = {}
+    for value in set(columns['posting_date']):
+        if not _is_date(value):
+            problems[value] = ('bad_date', f"posting_date is not YYYY-MM-DD: {value!r}")
+        elif (first and value < first) or (last and value > last):
+            problems[value] = ('outside_period', f"posting_date {value} is outside the open period {first or '...'} to {last or '...'}")
+    if problems:
+        for row, value in enumerate(columns['posting_date']):
+            if value in problems:
+                report(index[row], *problems[value])
+
+    violations.sort(key=lambda violation: violation['index'])
+    return violations
+
+
+def summarize_violations(violations: List[dict]) -> Dict[str, int]:
+    """Count violations by check."""
+    return dict(Counter(violation['check'] for violation in violations))
+
+
+def parse_period(start: Optional[str], end: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Build the open period from optional first/last dates.
+
+    Raises:
+        ValueError: A bound is not a YYYY-MM-DD date
+    """
+    for value in (start, end):
+        if value and not _is_date(value):
+            raise ValueError(f"Period bound is not YYYY-MM-DD: {value}")
+    return (start, end) if start or end else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate a batch of journal entries before posting')
+    parser.add_argument('--file', type=str, required=True, help="Entries from journal_entry_template.py (JSON array or NDJSON, '-' for stdin)")
+    parser.add_argument('--period-start', type=str, help='First open posting date (YYYY-MM-DD)')
+    parser.add_argument('--period-end', type=str, help='Last open posting date (YYYY-MM-DD)')
+
+    args = parser.parse_args()
+
+    from rule_diff import iter_json_records
+
+    try:
+        period = parse_period(args.period_start, args.period_end)
+        entries = list(iter_json_records(args.file))
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    violations = validate_entries(entries, period)
+    print(json.dumps({
+        'entries': len(entries),
+        'valid': not violations,
+        'counts': summarize_violations(violations),
+        'violations': violations,
+    }, indent=2))
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Bulk posting of journal entries to ERPNext through the Frappe REST API.
+
+Takes the output of journal_entry_template.create_batch_entries() and posts
+it with:
+
+    - a pooled HTTP client: keep-alive connections are reused across
+      requests and threads instead of one connection per document
+    - bounded concurrency: at most `concurrency` requests in flight
+    - idempotent retries keyed on cheque_no (the Bill.com transaction ID):
+      entries that already exist are skipped up front, and before any
+      retry the entries of the failed request are looked up again, so a
+      request that landed but timed out is never posted twice. If that
+      lookup fails too, the entries are reported failed without a retry;
+      re-running the poster later skips whatever did land.
+    - bulk insert: `bulk` mode sends chunks through
+      frappe.client.insert_many; a chunk that keeps failing (e.g. one
+      entry fails validation) is re-posted entry by entry so only the bad
+      entries fail. insert_many returns names in no particular order, so
+      the names of a created chunk are looked up by cheque_no. `single`
+      mode posts one document per request.
+
+post() returns one outcome per input entry, in input order:
+
+    {"cheque_no": ..., "status": "created" | "exists" | "failed" | "invalid"
+     | "duplicate" | "would_create", "name": <ERPNext name>, "attempts": N,
+     "error": <message or None>}
+
+The CLI first validates the whole batch locally (entry_validation.py:
+accounts, balance, cheque_no, open period) and posts nothing if any entry
+fails.
+
+Usage:
+    python journal_entry_template.py --batch "$(cat items.json)" > entries.json
+    python erpnext_poster.py --file entries.json --url https://erp.example.com --concurrency 8 \
+        --period-start 2025-10-01 --period-end 2025-10-31
+
+    # Only check which entries already exist
+    python erpnext_poster.py --file entries.json --dry-run
+
+Credentials default to the FRAPPE_URL, FRAPPE_API_KEY and FRAPPE_API_SECRET
+environment variables.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlencode, urlsplit
+
+from entry_validation import parse_period, summarize_violations, validate_entries
+
+DOCTYPE = 'Journal Entry'
+MODES = ('bulk', 'single')
+
+# HTTP statuses worth retrying; anything else is a definite answer
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Statuses meaning the insert_many endpoint is not available to this user
+BULK_UNAVAILABLE_STATUS = {403, 404, 405}
+
+# cheque_no values per existence query (keeps the query string short)
+LOOKUP_CHUNK_SIZE = 50
+
+
+class FrappeError(Exception):
+    """A failed Frappe API request."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Connection errors and throttling/server errors can be retried."""
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+def _error_message(status: int, body: bytes) -> str:
+    """Pull the most useful message out of a Frappe error response."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}"
+    if not isinstance(payload, dict):
+        return f"HTTP {status}"
+    message = payload.get('exception') or payload.get('exc_type') or payload.get('message')
+    if not message and payload.get('_server_messages'):
+        message = payload['_server_messages']
+    return f"HTTP {status}: {message}" if message else f"HTTP {status}"
+
+
+class FrappeClient:
+    """Minimal Frappe REST client over a pool of keep-alive connections."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        pool_size: int = 4,
+        timeout: float = 30.0,
+    ):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Invalid Frappe URL: {base_url}")
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip('/')
+        self._timeout = timeout
+
+        self._headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        if api_key and api_secret:
+            self._headers['Authorization'] = f"token {api_key}:{api_secret}"
+
+        # None slots are opened lazily; the queue size bounds open connections
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(None)
+
+    def request(self, method: str, path: str, params: Optional[dict] = None, body=None):
+        """
+        Send one request on a pooled connection and return the decoded JSON.
+
+        Raises:
+            FrappeError: Non-2xx response or connection failure
+        """
+        url = self._prefix + path
+        if params:
+            url += '?' + urlencode(params)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = self._connection_class(self._host, self._port, timeout=self._timeout)
+            conn.request(method, url, body=payload, headers=self._headers)
+            response = conn.getresponse()
+            data = response.read()
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise FrappeError(f"{type(e).__name__}: {e}") from e
+        finally:
+            self._pool.put(conn)
+
+        if not 200 <= response.status < 300:
+            retry_after = response.getheader('Retry-After')
+            raise FrappeError(
+                _error_message(response.status, data),
+                status=response.status,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        return json.loads(data) if data else {}
+
+    def find_by_cheque_no(self, cheque_nos: List[str], doctype: str = DOCTYPE) -> Dict[str, str]:
+        """Return {cheque_no: document name} for the cheque_nos that already exist."""
+        found = {}
+        for offset in range(0, len(cheque_nos), LOOKUP_CHUNK_SIZE):
+            chunk = cheque_nos[offset:offset + LOOKUP_CHUNK_SIZE]
+            response = self.request('GET', f"/api/resource/{quote(doctype)}", {
+                'filters': json.dumps([['cheque_no', 'in', chunk]]),
+                'fields': json.dumps(['name', 'cheque_no']),
+                'limit_page_length': 0,
+            })
+            for row in response.get('data', []):
+                found.setdefault(row['cheque_no'], row['name'])
+        return found
+
+    def insert(self, doc: dict) -> str:
+        """Insert one document and return its name."""
+        response = self.request('POST', f"/api/resource/{quote(doc.get('doctype', DOCTYPE))}", body=doc)
+        return response['data']['name']
+
+    def insert_many(self, docs: List[dict]) -> List[str]:
+        """Insert documents in one request (all or nothing) and return their names, unordered."""
+        response = self.request('POST', '/api/method/frappe.client.insert_many', body={'docs': docs})
+        return list(response['message'])
+
+    def close(self):
+        """Close every idle pooled connection."""
+        for _ in range(self._pool.maxsize):
+            conn = self._pool.get()
+            if conn is not None:
+                conn.close()
+            self._pool.put(None)
+
+
+class BulkPoster:
+    """Posts journal entries with bounded concurrency and idempotent retries."""
+
+    def __init__(
+        self,
+        client: FrappeClient,
+        mode: str = 'bulk',
+        concurrency: int = 4,
+        bulk_size: int = 50,
+        retries: int = 3,
+        backoff: float = 0.5,
+        doctype: str = DOCTYPE,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}. Must be one of: {list(MODES)}")
+        self.client = client
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.bulk_size = max(1, bulk_size)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.doctype = doctype
+        self._bulk_available = True
+
+    def _wait(self, attempt: int, error: FrappeError):
+        """Sleep before retry number `attempt`, honoring Retry-After."""
+        if error.retry_after is not None:
+            delay = error.retry_after
+        else:
+            delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+        if delay > 0:
+            time.sleep(delay)
+
+    def _recover(self, entries: List[dict], outcomes: list, indices: List[int]) -> List[int]:
+        """
+        Mark entries a failed request actually created; return those still missing.
+
+        When the lookup itself fails nothing is confirmed absent, so the
+        entries are marked failed and none is returned for a retry.
+        """
+        try:
+            landed = self.client.find_by_cheque_no([entries[i]['cheque_no'] for i in indices], self.doctype)
+        except FrappeError as e:
+            for i in indices:
+                outcomes[i].update(status='failed', error=f"Existence check failed, not retried: {e}")
+            return []
+        missing = []
+        for i in indices:
+            name = landed.get(entries[i]['cheque_no'])
+            if name:
+                outcomes[i].update(status='created', name=name, error=None)
+            else:
+                missing.append(i)
+        return missing
+
+    def _post_one(self, entries: List[dict], outcomes: list, index: int):
+        """Post one entry, retrying only while it is confirmed absent."""
+        outcome = outcomes[index]
+        for attempt in range(self.retries + 1):
+            if attempt and not self._recover(entries, outcomes, [index]):
+                return
+            outcome['attempts'] += 1
+            try:
+                outcome.update(status='created', name=self.client.insert(entries[index]), error=None)
+                return
+            except FrappeError as e:
+                outcome.update(status='failed', error=str(e))
+                if not e.retryable or attempt == self.retries:
+                    return
+                self._wait(attempt + 1, e)
+
+    def _post_chunk(self, entries: List[dict], outcomes: list, indices: List[int]):
+        """Post a chunk with insert_many, falling back to one request per entry."""
+        remaining = indices
+        sent = False
+        for attempt in range(self.retries + 1):
+            if not self._bulk_available:
+                break
+            if attempt:
+                remaining = self._recover(entries, outcomes, remaining)
+                if not remaining:
+                    return
+            for i in remaining:
+                outcomes[i]['attempts'] += 1
+            sent = True
+            try:
+                self.client.insert_many([entries[i] for i in remaining])
+            except FrappeError as e:
+                if e.status in BULK_UNAVAILABLE_STATUS:
+                    self._bulk_available = False
+                if not e.retryable:
+                    break
+                if attempt < self.retries:
+                    self._wait(attempt + 1, e)
+                continue
+            # All or nothing: every entry was created, whatever the lookup finds
+            try:
+                landed = self.client.find_by_cheque_no([entries[i]['cheque_no'] for i in remaining], self.doctype)
+                error = None
+            except FrappeError as e:
+                landed, error = {}, f"Created, but the name lookup failed: {e}"
+            for i in remaining:
+                outcomes[i].update(status='created', name=landed.get(entries[i]['cheque_no']), error=error)
+            return
+
+        # The chunk as a whole keeps failing: isolate the entries that do
+        if sent:
+            remaining = self._recover(entries, outcomes, remaining)
+        for i in remaining:
+            self._post_one(entries, outcomes, i)
+
+    def post(self, entries: List[dict], dry_run: bool = False) -> List[dict]:
+        """
+        Post entries that do not exist yet.
+
+        Args:
+            entries: Output of create_batch_entries() (documents with cheque_no;
+                error placeholders are reported as invalid)
+            dry_run: Only check existence; new entries get status would_create
+
+        Returns:
+            One outcome dict per entry, in input order
+        """
+        outcomes = []
+        pending = []
+        seen = set()
+        for entry in entries:
+            cheque_no = entry.get('cheque_no') if isinstance(entry, dict) else None
+            outcome = {'cheque_no': cheque_no, 'status': 'invalid', 'name': None, 'attempts': 0, 'error': None}
+            if not isinstance(entry, dict) or 'error' in entry:
+                outcome['cheque_no'] = entry.get('transaction_id') if isinstance(entry, dict) else None
+                outcome['error'] = entry.get('error') if isinstance(entry, dict) else 'Entry is not an object'
+            elif not cheque_no:
+                outcome['error'] = 'Entry has no cheque_no; it cannot be posted idempotently'
+            elif cheque_no in seen:
+                outcome['status'] = 'duplicate'
+                outcome['error'] = 'cheque_no repeated earlier in this batch'
+            else:
+                seen.add(cheque_no)
+                outcome['status'] = 'pending'
+                pending.append(len(outcomes))
+            outcomes.append(outcome)
+
+        existing = self.client.find_by_cheque_no([entries[i]['cheque_no'] for i in pending], self.doctype)
+        to_post = []
+        for i in pending:
+            name = existing.get(entries[i]['cheque_no'])
+            if name:
+                outcomes[i].update(status='exists', name=name)
+            elif dry_run:
+                outcomes[i]['status'] = 'would_create'
+            else:
+                to_post.append(i)
+
+        if to_post:
+            if self.mode == 'bulk':
+                tasks = [to_post[offset:offset + self.bulk_size] for offset in range(0, len(to_post), self.bulk_size)]
+                work = lambda chunk: self._post_chunk(entries, outcomes, chunk)
+            else:
+                tasks = to_post
+                work = lambda index: self._post_one(entries, outcomes, index)
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                list(executor.map(work, tasks))
+
+        return outcomes
+
+
+def summarize(outcomes: List[dict]) -> Dict[str, int]:
+    """Count outcomes by status."""
+    return dict(Counter(outcome['status'] for outcome in outcomes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post journal entries to ERPNext in bulk')
+    parser.add_argument('--file', type=str, required=True, help="Entries from journal_entry_template.py (JSON array or NDJSON, '-' for stdin)")
+    parser.add_argument('--url', type=str, default=os.environ.get('FRAPPE_URL'), help='ERPNext base URL (default $FRAPPE_URL)')
+    parser.add_argument('--api-key', type=str, default=os.environ.get('FRAPPE_API_KEY'), help='API key (default $FRAPPE_API_KEY)')
+    parser.add_argument('--api-secret', type=str, default=os.environ.get('FRAPPE_API_SECRET'), help='API secret (default $FRAPPE_API_SECRET)')
+    parser.add_argument('--mode', type=str, choices=MODES, default='bulk', help='bulk (insert_many chunks) or single (one request per entry)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum requests in flight')
+    parser.add_argument('--bulk-size', type=int, default=50, help='Entries per insert_many request')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per request after a transient failure')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--dry-run', action='store_true', help='Only report which entries already exist')
+    parser.add_argument('--period-start', type=str, help='First open posting date (YYYY-MM-DD)')
+    parser.add_argument('--period-end', type=str, help='Last open posting date (YYYY-MM-DD)')
+    parser.add_argument('--no-validate', action='store_true', help='Skip local validation before posting')
+
+    args = parser.parse_args()
+    if not args.url:
+        parser.error('--url (or FRAPPE_URL) is required')
+
+    from rule_diff import iter_json_records
+
+    try:
+        entries = list(iter_json_records(args.file))
+        if not args.no_validate:
+            violations = validate_entries(entries, parse_period(args.period_start, args.period_end))
+            if violations:
+                print(json.dumps({'valid': False, 'counts': summarize_violations(violations), 'violations': violations}, indent=2))
+                sys.exit(1)
+        client = FrappeClient(args.url, args.api_key, args.api_secret, pool_size=args.concurrency, timeout=args.timeout)
+        poster = BulkPoster(client, args.mode, args.concurrency, args.bulk_size, args.retries)
+        start = time.perf_counter()
+        outcomes = poster.post(entries, dry_run=args.dry_run)
+        elapsed = time.perf_counter() - start
+        client.close()
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError, FrappeError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(outcomes, indent=2))
+    summary = summarize(outcomes)
+    summary['seconds'] = round(elapsed, 3)
+    print(json.dumps(summary), file=sys.stderr)
+    if any(outcome['status'] in ('failed', 'invalid') for outcome in outcomes):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
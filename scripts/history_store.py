@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Columnar history store for Bill.com transactions and classification results.
+
+Data is kept as Parquet files in hive-style partitions by company and
+posting month, so replays, rule diffs and reconciliation read only the
+partitions and columns they need:
+
+    <root>/transactions/company=WCLI/month=2025-11/part-<id>.parquet
+    <root>/classifications/company=WCLI/month=2025-11/part-<id>.parquet
+    <root>/entries/company=WCLI/month=2025-11/part-<id>.parquet
+
+Transaction imports merge on transaction_id, so re-importing overlapping
+exports replaces stored rows instead of duplicating them. Classification and
+journal-entry runs replace the partitions they cover, so re-running a month
+never duplicates results either.
+
+Transaction times are stored as UTC timestamps (microsecond precision), so
+replays hand the classifier and the near-duplicate check the original time
+of day. The posting date and month partition are the UTC date of the
+occurred time (else the authorized time).
+
+Requires pyarrow (pip install pyarrow).
+
+Usage:
+    # Import Bill.com transactions (JSON array or NDJSON)
+    python history_store.py --store history/ import --company WCLI --file transactions.ndjson
+
+    # Classify a date range in chunks and store the results
+    python history_store.py --store history/ classify --company WCLI --start 2025-01-01 --end 2025-06-30
+
+    # Build journal entries for classified AUTO_POST rows and store them
+    python history_store.py --store history/ entries --company WCLI --start 2025-01-01 --end 2025-06-30
+
+    # Read selected columns with predicate pushdown
+    python history_store.py --store history/ query --company WCLI --mcc 5541 --columns transaction_id,amount
+"""
+
+import argparse
+import calendar
+import json
+import shutil
+import sys
+import uuid
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    ds = None
+    pq = None
+
+from classify_transaction import classify_batch, resolve_rules_path
+from journal_entry_template import COMPANY_CONFIG, create_batch_entries
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Columns per table; company and month are partition keys, not stored in files
+TRANSACTION_FIELDS = [
+    ('transaction_id', 'string'),
+    ('uuid', 'string'),
+    ('posting_date', 'date32'),
+    ('occurred_time', 'timestamp'),
+    ('authorized_time', 'timestamp'),
+    ('mcc', 'string'),
+    ('raw_merchant_name', 'string'),
+    ('merchant_name', 'string'),
+    ('amount', 'float64'),
+    ('user_email', 'string'),
+    ('user_team', 'string'),
+    ('state_match', 'string'),
+    ('billcom_budget', 'string'),
+    ('is_credit', 'bool_'),
+]
+
+CLASSIFICATION_FIELDS = [
+    ('transaction_id', 'string'),
+    ('posting_date', 'date32'),
+    ('gl_account', 'string'),
+    ('gl_account_name', 'string'),
+    ('action', 'string'),
+    ('has_discrepancy', 'bool_'),
+    ('notes', 'string'),
+    ('classified_at', 'string'),
+]
+
+ENTRY_FIELDS = [
+    ('transaction_id', 'string'),
+    ('posting_date', 'date32'),
+    ('expense_account', 'string'),
+    ('amount', 'float64'),
+    ('error', 'string'),
+    ('entry_json', 'string'),
+]
+
+TABLES = {
+    'transactions': TRANSACTION_FIELDS,
+    'classifications': CLASSIFICATION_FIELDS,
+    'entries': ENTRY_FIELDS,
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the history store: pip install pyarrow")
+
+
+def _arrow_type(type_name: str):
+    if type_name == 'timestamp':
+        return pa.timestamp('us', tz='UTC')
+    return getattr(pa, type_name)()
+
+
+def _schema(fields: Sequence[tuple]):
+    return pa.schema([(name, _arrow_type(type_name)) for name, type_name in fields])
+
+
+def _to_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_timestamp(value) -> Optional[datetime]:
+    """Parse an ISO date or timestamp to an aware UTC datetime; values without an offset are UTC."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime(value.year, value.month, value.day)
+    else:
+        text = str(value)
+        # fromisoformat only accepts a trailing 'Z' from Python 3.11
+        moment = datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def _to_iso(moment: Optional[datetime]) -> str:
+    """Format a stored timestamp the way Bill.com does, e.g. '2025-03-04T10:00:00Z'."""
+    if moment is None:
+        return ''
+    return moment.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def _month_bounds(month: str) -> tuple:
+    """Return the first and last ISO dates of a 'YYYY-MM' partition."""
+    year, month_number = int(month[:4]), int(month[5:7])
+    last = calendar.monthrange(year, month_number)[1]
+    return f"{month}-01", f"{month}-{last:02d}"
+
+
+def transaction_to_row(txn: dict, team: str = '') -> dict:
+    """Flatten a Bill.com transaction into a transactions-table row."""
+    authorized_time = _to_timestamp(txn.get('authorizedTime'))
+    occurred_time = _to_timestamp(txn.get('occurredTime')) or authorized_time
+    return {
+        'transaction_id': txn.get('id') or txn.get('uuid'),
+        'uuid': txn.get('uuid'),
+        'posting_date': occurred_time.date() if occurred_time else None,
+        'occurred_time': occurred_time,
+        'authorized_time': authorized_time or occurred_time,
+        'mcc': txn.get('merchantCategoryCode') or txn.get('mcc', ''),
+        'raw_merchant_name': txn.get('rawMerchantName') or '',
+        'merchant_name': txn.get('merchantName') or '',
+        'amount': float(txn.get('amount', 0)),
+        'user_email': txn.get('userEmail') or '',
+        'user_team': team or txn.get('user_team', ''),
+        'state_match': txn.get('state_match', ''),
+        'billcom_budget': txn.get('budgetName', ''),
+        'is_credit': bool(txn.get('isCredit', False)),
+    }
+
+
+def row_to_transaction(row: dict) -> dict:
+    """Rebuild the Bill.com transaction fields the scripts read from a stored row."""
+    return {
+        'id': row.get('transaction_id'),
+        'uuid': row.get('uuid'),
+        'occurredTime': _to_iso(row.get('occurred_time')),
+        'authorizedTime': _to_iso(row.get('authorized_time')),
+        'merchantCategoryCode': row.get('mcc', ''),
+        'rawMerchantName': row.get('raw_merchant_name', ''),
+        'merchantName': row.get('merchant_name', ''),
+        'amount': row.get('amount', 0),
+        'userEmail': row.get('user_email') or None,
+        'state_match': row.get('state_match', ''),
+        'budgetName': row.get('billcom_budget', ''),
+        'isCredit': row.get('is_credit', False),
+    }
+
+
+def row_to_batch_item(row: dict) -> dict:
+    """Build a classify_batch item from a stored transaction row."""
+    return {
+        'transaction': row_to_transaction(row),
+        'employee': {'team': row.get('user_team', '')},
+        'billcom_budget': row.get('billcom_budget', ''),
+    }
+
+
+class HistoryStore:
+    """Partitioned Parquet store of transactions, classifications and entries."""
+
+    def __init__(self, root: str):
+        _require_pyarrow()
+        self.root = Path(root)
+
+    # -- layout -----------------------------------------------------------
+
+    def _table_dir(self, table: str) -> Path:
+        return self.root / table
+
+    def _partition_dir(self, table: str, company: str, month: str) -> Path:
+        return self._table_dir(table) / f"company={company}" / f"month={month}"
+
+    def partitions(
+        self,
+        table: str = 'transactions',
+        company: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> List[tuple]:
+        """List (company, month) partitions present for a table, pruned by range."""
+        found = []
+        table_dir = self._table_dir(table)
+        if not table_dir.exists():
+            return found
+
+        for company_dir in sorted(table_dir.glob('company=*')):
+            company_code = company_dir.name.split('=', 1)[1]
+            if company and company_code != company:
+                continue
+            for month_dir in sorted(company_dir.glob('month=*')):
+                month = month_dir.name.split('=', 1)[1]
+                if start and month < start[:7]:
+                    continue
+                if end and month > end[:7]:
+                    continue
+                found.append((company_code, month))
+        return found
+
+    def clear_partition(self, table: str, company: str, month: str):
+        """Delete one partition of a table (used before re-writing results)."""
+        shutil.rmtree(self._partition_dir(table, company, month), ignore_errors=True)
+
+    # -- writing ----------------------------------------------------------
+
+    def _write_rows(self, table: str, company: str, month: str, rows: List[dict]):
+        if not rows:
+            return
+        directory = self._partition_dir(table, company, month)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrow_table = pa.Table.from_pylist(rows, schema=_schema(TABLES[table]))
+        pq.write_table(arrow_table, directory / f"part-{uuid.uuid4().hex}.parquet")
+
+    def _merge_by_month(self, table: str, company: str, rows: Iterable[dict]) -> int:
+        by_month = {}
+        for row in rows:
+            posting_date = row.get('posting_date')
+            if posting_date is None:
+                raise ValueError(f"Transaction {row.get('transaction_id')} has no occurredTime/authorizedTime")
+            month = posting_date.isoformat()[:7]
+            by_month.setdefault(month, []).append(row)
+        for month, month_rows in by_month.items():
+            self._merge_rows(table, company, month, month_rows)
+        return sum(len(month_rows) for month_rows in by_month.values())
+
+    def _merge_rows(self, table: str, company: str, month: str, rows: List[dict]):
+        """Rewrite one partition, replacing existing rows with the same transaction_id (last one wins)."""
+        rows = list({row['transaction_id']: row for row in rows}.values())
+        replaced = {row['transaction_id'] for row in rows}
+        kept = []
+        if self._partition_dir(table, company, month).exists():
+            existing = self._dataset(table).to_table(
+                filter=(ds.field('company') == company) & (ds.field('month') == month),
+                columns=[name for name, _ in TABLES[table]],
+            )
+            kept = [row for row in existing.to_pylist() if row['transaction_id'] not in replaced]
+        self.clear_partition(table, company, month)
+        self._write_rows(table, company, month, kept + rows)
+
+    def write_transactions(
+        self,
+        transactions: Iterable[dict],
+        company: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> int:
+        """
+        Merge Bill.com transactions for one company into the store, in chunks.
+
+        A transaction already stored (same transaction_id and posting month)
+        is replaced, so overlapping imports never duplicate rows.
+
+        Args:
+            transactions: Bill.com transaction dicts (optionally with 'user_team')
+            company: Company code ("WCLI" or "WCLC")
+            chunk_size: Rows buffered per Parquet file write
+
+        Returns:
+            Number of rows written
+        """
+        if company not in COMPANY_CONFIG:
+            raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+
+        written = 0
+        chunk = []
+        for txn in transactions:
+            chunk.append(transaction_to_row(txn))
+            if len(chunk) >= chunk_size:
+                written += self._merge_by_month('transactions', company, chunk)
+                chunk = []
+        written += self._merge_by_month('transactions', company, chunk)
+        return written
+
+    # -- reading ----------------------------------------------------------
+
+    def _dataset(self, table: str):
+        partitioning = ds.partitioning(
+            pa.schema([('company', pa.string()), ('month', pa.string())]),
+            flavor='hive',
+        )
+        return ds.dataset(
+            str(self._table_dir(table)),
+            format='parquet',
+            partitioning=partitioning,
+            schema=_schema(TABLES[table]).append(pa.field('company', pa.string())).append(
+                pa.field('month', pa.string())
+            ),
+        )
+
+    @staticmethod
+    def _filter(company=None, start=None, end=None, mcc=None, actions=None, month=None):
+        expression = None
+
+        def _and(condition):
+            nonlocal expression
+            expression = condition if expression is None else expression & condition
+
+        if company:
+            _and(ds.field('company') == company)
+        if month:
+            _and(ds.field('month') == month)
+        if start:
+            _and(ds.field('month') >= start[:7])
+            _and(ds.field('posting_date') >= pa.scalar(_to_date(start), pa.date32()))
+        if end:
+            _and(ds.field('month') <= end[:7])
+            _and(ds.field('posting_date') <= pa.scalar(_to_date(end), pa.date32()))
+        if mcc:
+            _and(ds.field('mcc').isin(list(mcc)))
+        if actions:
+            _and(ds.field('action').isin(list(actions)))
+        return expression
+
+    def scan(
+        self,
+        table: str = 'transactions',
+        columns: Optional[List[str]] = None,
+        company: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        mcc: Optional[Sequence[str]] = None,
+        batch_size: int = DEFAULT_CHUNK_SIZE,
+        month: Optional[str] = None,
+    ) -> Iterator[List[dict]]:
+        """
+        Yield rows of a table in chunks, reading only the requested columns.
+
+        Company, date range and MCC filters are pushed down to the Parquet
+        scan, so non-matching partitions and row groups are skipped.
+        """
+        if not self._table_dir(table).exists():
+            return
+        dataset = self._dataset(table)
+        scanner = dataset.scanner(
+            columns=columns,
+            filter=self._filter(company, start, end, mcc if table == 'transactions' else None, month=month),
+            batch_size=batch_size,
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield batch.to_pylist()
+
+    def read_classified(
+        self,
+        company: str,
+        month: str,
+        actions: Optional[Sequence[str]] = None,
+        batch_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[List[dict]]:
+        """
+        Yield transaction rows joined with their classification for one partition, in chunks.
+
+        Classifications are scanned batch_size rows at a time and each batch
+        reads only its own transactions, so memory stays bounded by the
+        chunk rather than the month.
+        """
+        if not self._partition_dir('classifications', company, month).exists():
+            return
+        partition = (ds.field('company') == company) & (ds.field('month') == month)
+        transactions = self._dataset('transactions')
+        scanner = self._dataset('classifications').scanner(
+            columns=['transaction_id', 'gl_account', 'gl_account_name', 'action', 'has_discrepancy', 'notes'],
+            filter=self._filter(company=company, actions=actions, month=month),
+            batch_size=batch_size,
+        )
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            classifications = pa.Table.from_batches([batch])
+            rows = transactions.to_table(
+                filter=partition & ds.field('transaction_id').isin(batch.column('transaction_id'))
+            )
+            yield rows.join(classifications, keys='transaction_id', join_type='inner').to_pylist()
+
+    # -- pipelines --------------------------------------------------------
+
+    def classify(
+        self,
+        jdm_path: Optional[str] = None,
+        company: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        mcc: Optional[Sequence[str]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> dict:
+        """
+        Classify stored transactions partition by partition and store the results.
+
+        Months fully covered by the run have their classifications partition
+        replaced chunk by chunk. Months only partly covered (range edges or an
+        MCC restriction) are merged: re-classified rows replace their previous
+        results and the rest of the month is kept.
+
+        Without jdm_path each company is classified with its own rule pack
+        (classify_transaction.resolve_rules_path).
+        """
+        stats = {'partitions': 0, 'classified': 0}
+        classified_at = datetime.now().isoformat(timespec='seconds')
+
+        for company_code, month in self.partitions('transactions', company, start, end):
+            stats['partitions'] += 1
+            rules_path = jdm_path or resolve_rules_path(company_code)
+            first_day, last_day = _month_bounds(month)
+            full_month = (
+                not mcc
+                and (not start or start[:10] <= first_day)
+                and (not end or end[:10] >= last_day)
+            )
+            if full_month:
+                self.clear_partition('classifications', company_code, month)
+            pending = []
+
+            chunks = self.scan(
+                'transactions',
+                company=company_code,
+                month=month,
+                start=start,
+                end=end,
+                mcc=mcc,
+                batch_size=chunk_size,
+            )
+            for rows in chunks:
+                results = classify_batch([row_to_batch_item(row) for row in rows], rules_path)
+                classified = [
+                    {
+                        'transaction_id': row['transaction_id'],
+                        'posting_date': row['posting_date'],
+                        'gl_account': result.get('gl_account'),
+                        'gl_account_name': result.get('gl_account_name'),
+                        'action': result.get('action'),
+                        'has_discrepancy': bool(result.get('has_discrepancy')),
+                        'notes': result.get('notes'),
+                        'classified_at': classified_at,
+                    }
+                    for row, result in zip(rows, results)
+                ]
+                if full_month:
+                    self._write_rows('classifications', company_code, month, classified)
+                else:
+                    pending.extend(classified)
+                stats['classified'] += len(rows)
+
+            if pending:
+                self._merge_rows('classifications', company_code, month, pending)
+
+        return stats
+
+    def build_entries(
+        self,
+        company: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        actions: Sequence[str] = ('AUTO_POST',),
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[List[dict]]:
+        """
+        Build journal entries for classified rows and store them, chunk by chunk.
+
+        Works on whole months: every month overlapping the range has its
+        entries partition rebuilt from the stored classifications. Yields each chunk of entries from create_batch_entries() as it is
+        written, so callers can post or export them incrementally.
+        """
+        for company_code, month in self.partitions('classifications', company, start, end):
+            self.clear_partition('entries', company_code, month)
+            for chunk in self.read_classified(company_code, month, actions, chunk_size):
+                items = [
+                    {
+                        'transaction': row_to_transaction(row),
+                        'classification': {
+                            'gl_account': row.get('gl_account') or '',
+                            'gl_account_name': row.get('gl_account_name') or '',
+                        },
+                        'company': company_code,
+                    }
+                    for row in chunk
+                ]
+                entries = create_batch_entries(items)
+                self._write_rows('entries', company_code, month, [
+                    {
+                        'transaction_id': row['transaction_id'],
+                        'posting_date': row['posting_date'],
+                        'expense_account': None if 'error' in entry else entry['accounts'][1]['account'],
+                        'amount': row['amount'],
+                        'error': entry.get('error'),
+                        'entry_json': json.dumps(entry),
+                    }
+                    for row, entry in zip(chunk, entries)
+                ])
+                yield entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar history store for Bill.com transactions')
+    parser.add_argument('--store', type=str, required=True, help='Store root directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_range(sub):
+        sub.add_argument('--company', type=str, choices=list(COMPANY_CONFIG.keys()), help='Company code')
+        sub.add_argument('--start', type=str, help='First posting date (YYYY-MM-DD)')
+        sub.add_argument('--end', type=str, help='Last posting date (YYYY-MM-DD)')
+
+    import_parser = subparsers.add_parser('import', help='Append Bill.com transactions')
+    import_parser.add_argument('--company', type=str, required=True, choices=list(COMPANY_CONFIG.keys()))
+    import_parser.add_argument('--file', type=str, required=True, help='Transactions (JSON array or NDJSON)')
+
+    classify_parser = subparsers.add_parser('classify', help='Classify stored transactions')
+    add_range(classify_parser)
+    classify_parser.add_argument('--mcc', type=str, help='Comma-separated MCC codes to restrict to')
+    classify_parser.add_argument('--jdm', type=str, help="Path to JDM rules file (default: each company's rule pack)")
+
+    entries_parser = subparsers.add_parser('entries', help='Build journal entries for classified rows')
+    add_range(entries_parser)
+    entries_parser.add_argument('--actions', type=str, default='AUTO_POST', help='Comma-separated actions')
+
+    query_parser = subparsers.add_parser('query', help='Read rows as NDJSON')
+    add_range(query_parser)
+    query_parser.add_argument('--table', type=str, default='transactions', choices=list(TABLES.keys()))
+    query_parser.add_argument('--mcc', type=str, help='Comma-separated MCC codes')
+    query_parser.add_argument('--columns', type=str, help='Comma-separated columns to read')
+
+    args = parser.parse_args()
+
+    from rule_diff import iter_json_records
+
+    try:
+        store = HistoryStore(args.store)
+
+        if args.command == 'import':
+            written = store.write_transactions(iter_json_records(args.file), args.company)
+            print(json.dumps({'written': written}))
+
+        elif args.command == 'classify':
+            stats = store.classify(
+                args.jdm,
+                company=args.company,
+                start=args.start,
+                end=args.end,
+                mcc=args.mcc.split(',') if args.mcc else None,
+            )
+            print(json.dumps(stats))
+
+        elif args.command == 'entries':
+            count = 0
+            for entries in store.build_entries(
+                company=args.company,
+                start=args.start,
+                end=args.end,
+                actions=args.actions.split(','),
+            ):
+                count += len(entries)
+            print(json.dumps({'entries': count}))
+
+        else:
+            for rows in store.scan(
+                args.table,
+                columns=args.columns.split(',') if args.columns else None,
+                company=args.company,
+                start=args.start,
+                end=args.end,
+                mcc=args.mcc.split(',') if args.mcc else None,
+            ):
+                for row in rows:
+                    print(json.dumps(row, default=str))
+
+    except (OSError, ValueError, RuntimeError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
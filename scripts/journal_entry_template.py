@@ -33,9 +33,18 @@ import argparse
 import json
 import sys
 from dataclasses import dataclass, asdict
-from typing import Optional, List
+from functools import lru_cache
+from pathlib import Path
+from time import perf_counter
+from typing import FrozenSet, Optional, List
 from datetime import date
 
+from output_formats import FORMATS, parse_fields, write_output
+from profiling import STAGES, profile_session
+from transaction_record import TransactionRecord
+
+CHART_OF_ACCOUNTS_PATH = Path(__file__).parent.parent / "config" / "chart_of_accounts.json"
+
 
 # Company configuration
 COMPANY_CONFIG = {
@@ -43,11 +52,13 @@ COMPANY_CONFIG = {
         "company_name": "Wash Cycle Laundry Inc.",
         "credit_card_account": "2151 - Divvy Credit Card - WCLI",
         "account_suffix": "WCLI",
+        "home_state": "PA",
     },
     "WCLC": {
         "company_name": "WCL Chelsea LLC",
         "credit_card_account": "2151 - Divvy Credit Card - WCLC",
         "account_suffix": "WCLC",
+        "home_state": "MA",
     },
 }
 
@@ -125,6 +136,38 @@ COGS_ACCOUNTS = [
 ]
 
 
+@lru_cache(maxsize=None)
+def load_account_registry(company: str, chart_path: str = str(CHART_OF_ACCOUNTS_PATH)) -> FrozenSet[str]:
+    """
+    Return the set of full ERPNext account names that exist for a company.
+
+    Built once per company from config/chart_of_accounts.json
+    (full_name_<company> of every account) plus the credit card account.
+
+    Args:
+        company: Company code ("WCLI" or "WCLC")
+        chart_path: Path to the chart of accounts JSON
+
+    Returns:
+        Frozen set of account names, e.g. "5216 - Travel Expenses - WCLI"
+    """
+    if company not in COMPANY_CONFIG:
+        raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+
+    with open(chart_path, 'r') as f:
+        chart = json.load(f)
+
+    key = f"full_name_{company.lower()}"
+    accounts = {
+        account[key]
+        for group in chart.get("accounts", {}).values()
+        for account in group
+        if account.get(key)
+    }
+    accounts.add(COMPANY_CONFIG[company]["credit_card_account"])
+    return frozenset(accounts)
+
+
 @dataclass
 class JournalEntryAccount:
     """Single account line in a Journal Entry."""
@@ -234,7 +277,8 @@ def create_journal_entry(
     amount: float,
     expense_account: str,
     expense_account_name: str,
-    is_credit: bool = False
+    is_credit: bool = False,
+    full_expense_account: Optional[str] = None
 ) -> dict:
     """
     Create a standardized Journal Entry from a classified Bill.com transaction.
@@ -250,6 +294,8 @@ def create_journal_entry(
         expense_account: GL account number (e.g., "5216")
         expense_account_name: GL account name (e.g., "Travel Expenses")
         is_credit: True if this is a refund/credit (reverses debit/credit)
+        full_expense_account: Already-resolved ERPNext expense account (e.g. a
+            classify_batch result's 'erpnext_account'); skips resolve_expense_account
 
     Returns:
         Dictionary ready for Frappe create_document API
@@ -273,7 +319,8 @@ def create_journal_entry(
     config = COMPANY_CONFIG[company]
 
     # Resolve the full expense account name (handles non-standard naming)
-    full_expense_account = resolve_expense_account(company, expense_account, expense_account_name)
+    if not full_expense_account:
+        full_expense_account = resolve_expense_account(company, expense_account, expense_account_name)
 
     # Format user_remark
     user_display = user_email if user_email else "None"
@@ -334,12 +381,32 @@ def create_journal_entry_from_classification(
 
     Args:
         transaction: Bill.com transaction dict (from list_transactions_enriched)
-        classification: Classification result dict (from classify_transaction.py)
+            or a transaction_record.TransactionRecord
+        classification: Classification result dict (from classify_transaction.py);
+            its 'erpnext_account' is used only when its 'company' is this company
         company: Company code ("WCLI" or "WCLC")
 
     Returns:
         Dictionary ready for Frappe create_document API
     """
+    # A batch result's account was resolved for the company it was classified for
+    full_expense_account = classification.get("erpnext_account") if classification.get("company") == company else None
+
+    if type(transaction) is TransactionRecord:
+        return create_journal_entry(
+            company=company,
+            posting_date=transaction.posting_date,
+            transaction_id=transaction.cheque_no,
+            transaction_date=transaction.transaction_date,
+            merchant_name=transaction.merchant_name,
+            user_email=transaction.user_email,
+            amount=transaction.amount,
+            expense_account=classification.get("gl_account", ""),
+            expense_account_name=classification.get("gl_account_name", ""),
+            is_credit=transaction.is_credit,
+            full_expense_account=full_expense_account
+        )
+
     # Extract posting date from occurredTime
     occurred_time = transaction.get("occurredTime", "")
     posting_date = occurred_time[:10] if occurred_time else ""
@@ -358,7 +425,8 @@ def create_journal_entry_from_classification(
         amount=float(transaction.get("amount", 0)),
         expense_account=classification.get("gl_account", ""),
         expense_account_name=classification.get("gl_account_name", ""),
-        is_credit=transaction.get("isCredit", False)
+        is_credit=transaction.get("isCredit", False),
+        full_expense_account=full_expense_account
     )
 
 
@@ -426,7 +494,7 @@ If no results:
 """
 
 
-def create_batch_entries(items: List[dict]) -> List[dict]:
+def create_batch_entries(items: List[dict], company: Optional[str] = None) -> List[dict]:
     """
     Create multiple journal entries from a batch of transactions and classifications.
 
@@ -434,7 +502,9 @@ def create_batch_entries(items: List[dict]) -> List[dict]:
         items: List of dicts, each containing:
             - transaction: Bill.com transaction dict
             - classification: Classification result dict
-            - company: Company code ("WCLI" or "WCLC")
+            - company: Company code ("WCLI" or "WCLC"); optional when the
+              batch-level `company` is given
+        company: Default company code for items without one
 
     Returns:
         List of journal entry dicts ready for Frappe API
@@ -450,13 +520,14 @@ def create_batch_entries(items: List[dict]) -> List[dict]:
         ]
         entries = create_batch_entries(items)
     """
+    start = perf_counter()
     results = []
     for item in items:
         try:
             entry = create_journal_entry_from_classification(
                 transaction=item["transaction"],
                 classification=item["classification"],
-                company=item["company"]
+                company=item.get("company") or company
             )
             results.append(entry)
         except Exception as e:
@@ -465,6 +536,9 @@ def create_batch_entries(items: List[dict]) -> List[dict]:
                 "error": str(e),
                 "transaction_id": item.get("transaction", {}).get("id", "unknown")
             })
+
+    STAGES.count(len(items))
+    STAGES.add('build_entries', perf_counter() - start, len(items))
     return results
 
 
@@ -499,42 +573,79 @@ Examples:
         '--company',
         type=str,
         choices=['WCLI', 'WCLC'],
-        help='Company code (required for single transaction mode)'
+        help='Company code (required for single transaction mode; default for batch items)'
     )
     parser.add_argument(
         '--batch',
         type=str,
         help='Batch JSON array of {transaction, classification, company} objects'
     )
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=FORMATS,
+        default='json',
+        help='Output format (default: indented JSON)'
+    )
+    parser.add_argument(
+        '--fields',
+        type=str,
+        help='Comma-separated (dotted) entry fields to output, e.g. cheque_no,posting_date,accounts.1.account'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write entries to this file instead of stdout (required for parquet)'
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Print per-stage timings to stderr'
+    )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        metavar='PATH',
+        help='Write a cProfile dump to PATH and collapsed stacks to PATH.collapsed'
+    )
 
     args = parser.parse_args()
 
+    if args.format == 'parquet' and not args.output:
+        parser.error('--format parquet requires --output')
+
     try:
-        if args.batch:
-            # Batch mode
-            items = json.loads(args.batch)
-            if not isinstance(items, list):
-                print(json.dumps({"error": "Batch input must be a JSON array"}), file=sys.stderr)
+        with profile_session(args.profile, args.timings):
+            if args.batch:
+                # Batch mode
+                with STAGES.stage('parse_input'):
+                    items = json.loads(args.batch)
+                if not isinstance(items, list):
+                    print(json.dumps({"error": "Batch input must be a JSON array"}), file=sys.stderr)
+                    sys.exit(1)
+
+                output = create_batch_entries(items, company=args.company)
+
+            elif args.transaction and args.classification and args.company:
+                # Single transaction mode
+                with STAGES.stage('parse_input'):
+                    transaction = json.loads(args.transaction)
+                    classification = json.loads(args.classification)
+
+                STAGES.count(1)
+                with STAGES.stage('build_entries'):
+                    output = create_journal_entry_from_classification(
+                        transaction=transaction,
+                        classification=classification,
+                        company=args.company
+                    )
+
+            else:
+                parser.print_help()
                 sys.exit(1)
 
-            entries = create_batch_entries(items)
-            print(json.dumps(entries, indent=2))
-
-        elif args.transaction and args.classification and args.company:
-            # Single transaction mode
-            transaction = json.loads(args.transaction)
-            classification = json.loads(args.classification)
-
-            entry = create_journal_entry_from_classification(
-                transaction=transaction,
-                classification=classification,
-                company=args.company
-            )
-            print(json.dumps(entry, indent=2))
-
-        else:
-            parser.print_help()
-            sys.exit(1)
+            with STAGES.stage('serialize'):
+                write_output(output, args.format, parse_fields(args.fields), args.output)
 
     except json.JSONDecodeError as e:
         print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
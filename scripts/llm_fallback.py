@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Batched, deduplicated LLM-fallback queue for REVIEW / no-match transactions.
+
+SKILL.md step 5D classifies every unmatched transaction with the LLM. Most
+of them repeat the same merchant, MCC and team, so this queue:
+
+1. collects results from classify_batch() that need a fallback
+   (action == 'REVIEW' or no gl_account),
+2. deduplicates them into cases keyed by (canonical merchant, MCC, team),
+3. packs cases into size-bounded multi-case prompts,
+4. sends each prompt to a pluggable backend, and
+5. fans each case's answer back out to every member transaction.
+
+With --similar-min-score, cases whose merchant closely matches a merchant
+the rules, overlay or --history transactions already know
+(merchant_similarity.py) are settled locally before step 3 and go to
+REVIEW with that merchant's account.
+
+Backends implement complete(prompt) -> str and must answer with a JSON
+array of {"case", "gl_account", "gl_account_name", "confidence", "reason"};
+malformed answers leave their cases unresolved.
+StubBackend answers deterministically from the Bill.com budget for tests;
+CommandBackend pipes the prompt to any external command.
+
+Usage:
+    python llm_fallback.py --batch-file items.json --backend stub
+    python llm_fallback.py --batch-file items.json --backend command --command "my-llm-cli --json"
+    python llm_fallback.py --batch-file items.json --similar-min-score 0.75 --backend command --command "my-llm-cli --json"
+    python llm_fallback.py --batch-file items.json --similar-min-score 0.75 --history transactions.ndjson
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from classify_transaction import classify_batch, extract_account_from_budget
+from decision_overlay import DecisionOverlay
+from merchant_normalizer import MerchantTable, normalize_merchant, raw_merchant
+from merchant_similarity import build_index
+
+# Confidence levels from SKILL.md 5D: only HIGH is posted without review
+CONFIDENCE_LEVELS = ('HIGH', 'MEDIUM', 'LOW')
+AUTO_POST_CONFIDENCE = ('HIGH',)
+
+# Minimum merchant_similarity score for settling a case without the backend
+SIMILAR_MIN_SCORE = 0.75
+
+PROMPT_HEADER = """You are classifying Bill.com credit card transactions to ERPNext GL accounts.
+Follow the classification philosophy in config/chart_of_accounts.json: MCC first,
+then merchant, then employee team; treat the Bill.com budget only as a hint.
+
+Each CASE below stands for one or more identical transactions. Answer with a JSON
+array, one object per case:
+  {"case": <case id>, "gl_account": "<account number or COGS account name>",
+   "gl_account_name": "<account name>", "confidence": "HIGH|MEDIUM|LOW",
+   "reason": "<one sentence>"}
+
+"""
+
+
+def _case_id(value) -> Optional[int]:
+    """Return an answer's case ID as an int (accepting "12"), or None if it is not one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def check_answer(answer) -> Optional[str]:
+    """Return why a backend answer cannot be applied, or None if it is usable."""
+    if not isinstance(answer, dict):
+        return f"answer is not an object: {answer!r}"
+    if _case_id(answer.get('case')) is None:
+        return f"invalid case ID: {answer.get('case')!r}"
+    if not isinstance(answer.get('gl_account'), str) or not answer['gl_account'].strip():
+        return f"invalid gl_account: {answer.get('gl_account')!r}"
+    if answer.get('confidence', 'LOW') not in CONFIDENCE_LEVELS:
+        return f"invalid confidence: {answer.get('confidence')!r}"
+    return None
+
+
+def needs_fallback(result: dict) -> bool:
+    """Return True if a classify_batch result should go to the fallback."""
+    return result.get('action') == 'REVIEW' or not result.get('gl_account')
+
+
+@dataclass
+class FallbackCase:
+    """One distinct (merchant, MCC, team) situation and its member results."""
+    case_id: int
+    merchant: str
+    mcc: str
+    team: str
+    budgets: Dict[str, int] = field(default_factory=dict)
+    amounts: List[float] = field(default_factory=list)
+    members: List[dict] = field(default_factory=list)
+
+    def describe(self) -> str:
+        budgets = ', '.join(f"{name} (x{count})" for name, count in sorted(self.budgets.items()))
+        low, high = min(self.amounts), max(self.amounts)
+        amount = f"${low:,.2f}" if low == high else f"${low:,.2f}-${high:,.2f}"
+        return (
+            f"CASE {self.case_id}: merchant={self.merchant!r} mcc={self.mcc or 'none'} "
+            f"team={self.team or 'unknown'} amount={amount} transactions={len(self.members)} "
+            f"billcom_budgets=[{budgets}]\n"
+        )
+
+
+class StubBackend:
+    """Deterministic local backend: trusts the Bill.com budget at LOW confidence."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, prompt: str) -> str:
+        self.calls += 1
+        answers = []
+        for line in prompt.splitlines():
+            if not line.startswith('CASE '):
+                continue
+            case_id = int(line[5:line.index(':')])
+            budgets = line[line.index('billcom_budgets=[') + len('billcom_budgets=['):-1]
+            budget = budgets.split(' (x')[0] if budgets else ''
+            account = extract_account_from_budget(budget)
+            answers.append({
+                'case': case_id,
+                'gl_account': account,
+                'gl_account_name': budget.split(' - ', 1)[-1] if account else None,
+                'confidence': 'LOW',
+                'reason': 'Stub backend: Bill.com budget used as-is',
+            })
+        return json.dumps(answers)
+
+
+class CommandBackend:
+    """Backend that pipes each prompt to an external command and reads JSON from stdout."""
+
+    def __init__(self, command: str, timeout: int = 300):
+        self.command = command
+        self.timeout = timeout
+        self.calls = 0
+
+    def complete(self, prompt: str) -> str:
+        self.calls += 1
+        completed = subprocess.run(
+            self.command,
+            input=prompt,
+            capture_output=True,
+            text=True,
+            shell=True,
+            timeout=self.timeout,
+            check=True,
+        )
+        return completed.stdout
+
+
+class FallbackQueue:
+    """Collects fallback results, deduplicates them and resolves them in batches."""
+
+    def __init__(
+        self,
+        merchant_table: Optional[MerchantTable] = None,
+        max_cases_per_prompt: int = 25,
+        max_prompt_chars: int = 8000,
+    ):
+        self.merchant_table = merchant_table
+        self.max_cases_per_prompt = max_cases_per_prompt
+        self.max_prompt_chars = max_prompt_chars
+        self.cases: Dict[Tuple[str, str, str], FallbackCase] = {}
+        self.queued = 0
+        self.settled = 0
+
+    def _canonical(self, transaction: dict) -> str:
+        raw = raw_merchant(transaction)
+        if self.merchant_table is not None:
+            return self.merchant_table.canonical(raw)
+        return normalize_merchant(raw)
+
+    def add(self, item: dict, result: dict) -> bool:
+        """Queue one classify_batch item/result pair if it needs a fallback."""
+        if not needs_fallback(result):
+            return False
+
+        txn = item.get('transaction', {})
+        emp = item.get('employee', {})
+        key = (
+            self._canonical(txn),
+            txn.get('merchantCategoryCode') or txn.get('mcc', ''),
+            emp.get('team') or emp.get('department', ''),
+        )
+        case = self.cases.get(key)
+        if case is None:
+            case = self.cases[key] = FallbackCase(len(self.cases) + 1, *key)
+
+        budget = item.get('billcom_budget', '')
+        case.budgets[budget] = case.budgets.get(budget, 0) + 1
+        case.amounts.append(float(txn.get('amount', 0)))
+        case.members.append(result)
+        self.queued += 1
+        return True
+
+    def add_batch(self, items: List[dict], results: List[dict]) -> int:
+        """Queue every result of a classify_batch() call that needs a fallback."""
+        return sum(self.add(item, result) for item, result in zip(items, results))
+
+    def build_prompts(self) -> List[Tuple[str, List[int]]]:
+        """Pack cases into prompts bounded by case count and character size."""
+        prompts = []
+        body, case_ids = '', []
+
+        for case in self.cases.values():
+            line = case.describe()
+            too_long = len(PROMPT_HEADER) + len(body) + len(line) > self.max_prompt_chars
+            if case_ids and (too_long or len(case_ids) >= self.max_cases_per_prompt):
+                prompts.append((PROMPT_HEADER + body, case_ids))
+                body, case_ids = '', []
+            body += line
+            case_ids.append(case.case_id)
+
+        if case_ids:
+            prompts.append((PROMPT_HEADER + body, case_ids))
+        return prompts
+
+    def settle_similar(self, index, min_score: float = SIMILAR_MIN_SCORE) -> int:
+        """
+        Settle cases whose merchant closely matches a known one, without the backend.
+
+        A case whose best merchant_similarity.MerchantIndex suggestion scores
+        at least min_score takes that suggestion's account; its members go
+        to REVIEW with confidence MEDIUM and matched_by='similar', and the
+        case is removed from the queue.
+
+        Returns:
+            Number of cases settled
+        """
+        settled = 0
+        for key, case in list(self.cases.items()):
+            suggestions = index.query(case.merchant, top_k=1, min_score=min_score)
+            if not suggestions:
+                continue
+            best = suggestions[0]
+            for member in case.members:
+                member['gl_account'] = best['gl_account']
+                member['gl_account_name'] = best['gl_account_name']
+                member['confidence'] = 'MEDIUM'
+                member['action'] = 'REVIEW'
+                member['matched_by'] = 'similar'
+                member['fallback_reason'] = f"Similar to {best['merchant']} ({best['source']}, score {best['score']})"
+            del self.cases[key]
+            settled += 1
+        self.settled += settled
+        return settled
+
+    def resolve(self, backend) -> dict:
+        """
+        Send every queued case to the backend and fan answers out to members.
+
+        Member results are updated in place with gl_account, gl_account_name,
+        confidence, action and matched_by='llm'. A reply that is not a JSON
+        array, and answers that are malformed (not an object, no usable case
+        ID, gl_account or confidence), leave their cases unresolved with a
+        'fallback_error' on the members.
+
+        Returns:
+            Stats dict with queued transactions, distinct cases, backend
+            calls, malformed answers and cases left unanswered
+        """
+        by_id = {case.case_id: case for case in self.cases.values()}
+        answered = set()
+        invalid = 0
+        prompts = self.build_prompts()
+
+        def fail(case_ids, error):
+            for case_id in case_ids:
+                for member in by_id[case_id].members:
+                    member['fallback_error'] = error
+
+        for prompt, case_ids in prompts:
+            try:
+                answers = json.loads(backend.complete(prompt))
+            except (json.JSONDecodeError, subprocess.SubprocessError) as e:
+                fail(case_ids, str(e))
+                continue
+            if not isinstance(answers, list):
+                fail(case_ids, f"Backend reply is not a JSON array: {type(answers).__name__}")
+                continue
+
+            for answer in answers:
+                error = check_answer(answer)
+                case_id = _case_id(answer.get('case')) if isinstance(answer, dict) else None
+                if case_id not in case_ids or error is not None:
+                    invalid += 1
+                    if case_id in case_ids and case_id not in answered:
+                        fail([case_id], f"Invalid backend answer: {error}")
+                    continue
+                case = by_id[case_id]
+                confidence = answer.get('confidence', 'LOW')
+                for member in case.members:
+                    member['gl_account'] = answer['gl_account']
+                    member['gl_account_name'] = answer.get('gl_account_name')
+                    member['confidence'] = confidence
+                    member['action'] = 'AUTO_POST' if confidence in AUTO_POST_CONFIDENCE else 'REVIEW'
+                    member['matched_by'] = 'llm'
+                    member['fallback_reason'] = answer.get('reason')
+                    member.pop('fallback_error', None)
+                answered.add(case.case_id)
+
+        return {
+            'queued': self.queued,
+            'cases': len(self.cases),
+            'settled_similar': self.settled,
+            'prompts': len(prompts),
+            'invalid_answers': invalid,
+            'unanswered': len(self.cases) - len(answered),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve REVIEW/no-match classifications through a batched LLM fallback')
+    parser.add_argument('--batch-file', type=str, required=True, help='classify_batch items (JSON array)')
+    parser.add_argument('--jdm', type=str, help='Path to JDM rules file')
+    parser.add_argument('--backend', type=str, choices=['stub', 'command'], default='stub', help='Fallback backend')
+    parser.add_argument('--command', type=str, help='Command for the command backend (prompt on stdin)')
+    parser.add_argument('--max-cases', type=int, default=25, help='Cases per prompt')
+    parser.add_argument('--max-chars', type=int, default=8000, help='Characters per prompt')
+    parser.add_argument('--merchant-table', type=str, help='Merchant table JSON for canonical merchant keys')
+    parser.add_argument('--overlay', type=str, help='Decision overlay JSON: consulted first, HIGH answers recorded')
+    parser.add_argument('--similar-min-score', type=float, help=f'Settle cases whose merchant is this similar (0-1, e.g. {SIMILAR_MIN_SCORE}) to a known one without the backend')
+    parser.add_argument('--history', type=str, help='With --similar-min-score: transaction history (JSON array or NDJSON) whose merchants are known too')
+
+    args = parser.parse_args()
+
+    if args.backend == 'command' and not args.command:
+        parser.error('--command is required with --backend command')
+
+    config_dir = Path(__file__).parent.parent / 'config'
+    jdm_path = args.jdm or str(config_dir / 'classification_rules.jdm.json')
+
+    try:
+        with open(args.batch_file, 'r') as f:
+            items = json.load(f)
+
+        merchant_table = MerchantTable.load(args.merchant_table) if args.merchant_table else None
+        overlay = DecisionOverlay.load(args.overlay, merchant_table) if args.overlay else None
+
+        results = classify_batch(items, jdm_path, overlay=overlay)
+        queue = FallbackQueue(
+            merchant_table=merchant_table,
+            max_cases_per_prompt=args.max_cases,
+            max_prompt_chars=args.max_chars,
+        )
+        queue.add_batch(items, results)
+        if args.similar_min_score is not None:
+            queue.settle_similar(build_index(jdm_path, overlay, args.history), args.similar_min_score)
+        backend = CommandBackend(args.command) if args.backend == 'command' else StubBackend()
+        stats = queue.resolve(backend)
+
+        if overlay is not None:
+            stats['overlay_recorded'] = overlay.record_fallback(items, results)
+            overlay.save(args.overlay)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps({'stats': stats, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
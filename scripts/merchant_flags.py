@@ -0,0 +1,60 @@
+"""
+Precomputed merchant pattern flags for flag-mode JDM rules.
+
+convert_dmn_to_jdm.py gives every distinct merchant wildcard a pattern ID and
+lists them in the decision table's "merchantPatterns"; rows then test
+`merchant_flags.mN` instead of calling upper()/contains() in zen for every
+rule. MerchantFlagMatcher computes those flags for a transaction in one pass:
+
+    - every pattern text must occur in the merchant whatever its operator
+      (contains, startsWith, endsWith, equality), so each pattern is
+      anchored on its longest text
+    - one Aho-Corasick scan (rule_tree.TokenAutomaton) finds the anchors
+      that occur, and only those patterns' tests are checked
+
+flags() returns {pattern ID: True} for the matched patterns only; a missing
+ID reads as null in zen, which fails the row like a false test.
+"""
+
+from typing import Dict, Optional
+
+from convert_dmn_to_jdm import get_merchant_patterns
+from rule_model import _match_pattern, parse_rule
+from rule_tree import TokenAutomaton
+
+
+class MerchantFlagMatcher:
+    """Evaluates a table's merchant patterns against a merchant in one pass."""
+
+    def __init__(self, patterns: Dict[str, str]):
+        """
+        Args:
+            patterns: {pattern ID: merchant expression} from the JDM
+        """
+        self.tests = {}
+        anchors = {}
+        for pattern_id, expression in patterns.items():
+            tests = parse_rule({'merchant_expr': expression}, 0).field_patterns('merchant')
+            self.tests[pattern_id] = tests
+            anchor = max((text for _, text in tests), key=len, default='')
+            if anchor:
+                anchors.setdefault(anchor, []).append(pattern_id)
+
+        self.automaton = TokenAutomaton(list(anchors))
+        self.by_anchor = [tuple(anchors[token]) for token in self.automaton.tokens]
+
+    def flags(self, merchant: str) -> Dict[str, bool]:
+        """Return {pattern ID: True} for every pattern the merchant matches."""
+        text = (merchant or '').upper()
+        matched = {}
+        for token_id in self.automaton.find(text):
+            for pattern_id in self.by_anchor[token_id]:
+                if all(_match_pattern(op, pattern_text, text) for op, pattern_text in self.tests[pattern_id]):
+                    matched[pattern_id] = True
+        return matched
+
+
+def matcher_for(jdm: dict) -> Optional[MerchantFlagMatcher]:
+    """Build the matcher for a flag-mode JDM (None when patterns are inlined)."""
+    patterns = get_merchant_patterns(jdm)
+    return MerchantFlagMatcher(patterns) if patterns else None
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Merchant location lookup that fills state_match before classification.
+
+Rules keyed on state_match (LOCAL vs OUT_OF_STATE) compare where the
+merchant is to the company's home state (COMPANY_CONFIG "home_state":
+WCLI = PA, WCLC = MA). The merchant's place is taken from, in order:
+
+    1. merchantLocation {"city", "state", "country"} (Bill.com API)
+    2. flat merchantCity / merchantState / merchantCountry fields (exports)
+    3. a trailing "CITY ST" in the card descriptor (rawMerchantName), e.g.
+       "WAWA 8115 PHILADELPHIA PA" or "SUNOCO 0363 KING OF PRUSS PA 19406";
+       accepted only when the city is known in that state, so words like
+       "IN" or "OK" at the end of a name are not taken for states
+
+States may be codes or names. A city without a state is resolved through
+the city index when one state clearly dominates (Philadelphia -> PA,
+Lynn -> MA); names shared by comparable places (Springfield, Chelsea) stay
+unresolved. A non-US country is OUT_OF_STATE. Unresolved transactions keep
+an empty state_match, exactly as if the caller had not supplied one.
+
+The bundled tables (config/us_states.csv, config/us_cities.csv) are loaded
+once into dicts keyed by normalized name; city keys are also indexed by
+their first 13 characters, the width of the descriptor city field. Batches
+look each distinct location up once.
+
+Usage:
+    python merchant_location.py --company WCLI --batch '[{"transaction": {...}, "employee": {...}}]'
+    python merchant_location.py --company WCLC --batch-file items.json --output located.json
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from journal_entry_template import COMPANY_CONFIG
+from profiling import STAGES
+
+CONFIG_DIR = Path(__file__).parent.parent / 'config'
+STATES_PATH = CONFIG_DIR / 'us_states.csv'
+CITIES_PATH = CONFIG_DIR / 'us_cities.csv'
+
+# Card descriptor city field width (ISO 8583 field 43)
+DESCRIPTOR_CITY_WIDTH = 13
+
+# A city resolves without a state when its largest place is this many times
+# the next largest of the same name
+DOMINANCE = 10
+
+US_COUNTRIES = ('', 'US', 'USA', '840', 'UNITED STATES')
+
+# Territories reported as their own country; located by their postal code
+TERRITORIES = ('PR', 'GU', 'VI', 'AS', 'MP')
+
+_ABBREVIATIONS = {'ST': 'SAINT', 'FT': 'FORT', 'MT': 'MOUNT'}
+_TOKEN_RE = re.compile(r'[A-Z0-9]+')
+_ZIP_RE = re.compile(r'^\d{5}(\d{4})?$')
+
+
+def _words(text: str) -> List[str]:
+    """Uppercase ASCII words of a name or descriptor."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().upper()
+    return _TOKEN_RE.findall(text.replace("'", ''))
+
+
+def normalize_place(name: str) -> str:
+    """Uppercase ASCII words with abbreviations expanded ("St. Louis" -> "SAINT LOUIS")."""
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in _words(name))
+
+
+def _read_csv(path: Path) -> List[dict]:
+    with open(path, newline='') as f:
+        return list(csv.DictReader(line for line in f if not line.startswith('#')))
+
+
+class Place(NamedTuple):
+    """Where a merchant is: a state code (None if unknown), country, and which field said so."""
+    state: Optional[str]
+    country: str
+    source: str
+
+
+UNKNOWN = Place(None, 'US', 'unresolved')
+
+
+class PlaceIndex:
+    """Hashed lookups over the bundled state and city tables."""
+
+    def __init__(self, states_path: Path = STATES_PATH, cities_path: Path = CITIES_PATH):
+        self.states = {}
+        for row in _read_csv(states_path):
+            self.states[row['code']] = row['code']
+            self.states[normalize_place(row['name'])] = row['code']
+
+        populations = {}
+        for row in _read_csv(cities_path):
+            name = normalize_place(row['city'])
+            for key in {name, name[:DESCRIPTOR_CITY_WIDTH].rstrip()}:
+                by_state = populations.setdefault(key, {})
+                by_state[row['state']] = max(by_state.get(row['state'], 0), int(row['population']))
+
+        # City -> ((state, population), ...), largest first
+        self.cities: Dict[str, Tuple[Tuple[str, int], ...]] = {
+            key: tuple(sorted(by_state.items(), key=lambda pair: -pair[1]))
+            for key, by_state in populations.items()
+        }
+
+    def state_code(self, value: str) -> Optional[str]:
+        """Resolve a state code or name ("pa", "Pennsylvania") to its code."""
+        if not value:
+            return None
+        return self.states.get(value.strip().upper()) or self.states.get(normalize_place(value))
+
+    def city_in_state(self, city: str, state: str) -> bool:
+        """Whether the index has a place with this (normalized) name in the state."""
+        return any(code == state for code, _ in self.cities.get(city, ()))
+
+    def city_state(self, city: str) -> Optional[str]:
+        """The state of a city name, if one place clearly dominates the name."""
+        candidates = self.cities.get(normalize_place(city))
+        if not candidates:
+            return None
+        if len(candidates) == 1 or candidates[0][1] >= DOMINANCE * candidates[1][1]:
+            return candidates[0][0]
+        return None
+
+    def parse_descriptor(self, descriptor: str) -> Optional[str]:
+        """
+        Find a trailing "CITY ST [ZIP] [US]" in a card descriptor.
+
+        Returns:
+            The state code, or None when the descriptor does not end in a
+            city known in that state
+        """
+        words = _words(descriptor)
+        if words and words[-1] in ('US', 'USA'):
+            words.pop()
+        if words and _ZIP_RE.match(words[-1]):
+            words.pop()
+        if len(words) < 3 or words[-1] not in self.states:
+            return None
+        state = self.states[words[-1]]
+        # City names in descriptors run up to four words ("KING OF PRUSS")
+        for count in range(1, min(4, len(words) - 2) + 1):
+            if self.city_in_state(normalize_place(' '.join(words[-1 - count:-1])), state):
+                return state
+        return None
+
+    def locate(self, txn: dict) -> Place:
+        """Resolve a Bill.com transaction's merchant place."""
+        location = txn.get('merchantLocation') or {}
+        city = location.get('city') or txn.get('merchantCity') or ''
+        state = location.get('state') or txn.get('merchantState') or ''
+        country = normalize_place(location.get('country') or txn.get('merchantCountry') or '')
+
+        if country in TERRITORIES:
+            return Place(country, 'US', 'country')
+        if country not in US_COUNTRIES:
+            return Place(None, country, 'country')
+
+        code = self.state_code(state)
+        if code:
+            return Place(code, 'US', 'state')
+        code = self.city_state(city) if city else None
+        if code:
+            return Place(code, 'US', 'city')
+        code = self.parse_descriptor(txn.get('rawMerchantName') or txn.get('merchantName') or '')
+        if code:
+            return Place(code, 'US', 'descriptor')
+        return UNKNOWN
+
+
+@lru_cache(maxsize=None)
+def load_place_index() -> PlaceIndex:
+    """Load (once per process) the index over the bundled tables."""
+    return PlaceIndex()
+
+
+def state_match(place: Place, home_state: str) -> str:
+    """LOCAL / OUT_OF_STATE for a place relative to a home state ('' if unknown)."""
+    if place.country not in US_COUNTRIES:
+        return 'OUT_OF_STATE'
+    if place.state is None:
+        return ''
+    return 'LOCAL' if place.state == home_state else 'OUT_OF_STATE'
+
+
+def _location_key(txn: dict) -> tuple:
+    location = txn.get('merchantLocation') or {}
+    return (
+        location.get('city'), location.get('state'), location.get('country'),
+        txn.get('merchantCity'), txn.get('merchantState'), txn.get('merchantCountry'),
+        txn.get('rawMerchantName') or txn.get('merchantName'),
+    )
+
+
+def fill_state_match(
+    items: List[dict],
+    company: str,
+    overwrite: bool = False,
+    index: Optional[PlaceIndex] = None,
+) -> Dict[str, int]:
+    """
+    Set state_match on a batch's transactions from their merchant locations.
+
+    Transactions are updated in place; ones that already carry a
+    state_match are left alone unless overwrite is set.
+
+    Args:
+        items: classify_batch items or bare transaction dicts
+        company: Company code whose home state counts as LOCAL
+        overwrite: Recompute state_match even when the caller supplied one
+        index: PlaceIndex to use (default: the bundled tables)
+
+    Returns:
+        Counts of transactions by outcome: 'LOCAL', 'OUT_OF_STATE',
+        'unresolved' and 'supplied' (kept the value they already had)
+    """
+    if company not in COMPANY_CONFIG:
+        raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+    home_state = COMPANY_CONFIG[company]['home_state']
+    index = index or load_place_index()
+
+    counts = {'LOCAL': 0, 'OUT_OF_STATE': 0, 'unresolved': 0, 'supplied': 0}
+    seen = {}
+    with STAGES.stage('locate', len(items)):
+        for item in items:
+            txn = item.get('transaction', item)
+            # TransactionRecords carry no location; they keep what they were built with
+            if not isinstance(txn, dict) or (txn.get('state_match') and not overwrite):
+                counts['supplied'] += 1
+                continue
+            key = _location_key(txn)
+            value = seen.get(key)
+            if value is None:
+                value = seen[key] = state_match(index.locate(txn), home_state)
+            txn['state_match'] = value
+            counts[value or 'unresolved'] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill state_match from merchant locations before classification')
+    parser.add_argument('--company', type=str, required=True, choices=list(COMPANY_CONFIG), help='Company whose home state is LOCAL')
+    parser.add_argument('--batch', type=str, help='classify_batch items JSON (array)')
+    parser.add_argument('--batch-file', type=str, help='File containing the same JSON as --batch')
+    parser.add_argument('--overwrite', action='store_true', help='Recompute state_match even when already set')
+    parser.add_argument('--output', type=str, help='Write the located items here instead of stdout')
+
+    args = parser.parse_args()
+    if not (args.batch or args.batch_file):
+        parser.error('--batch or --batch-file is required')
+
+    try:
+        if args.batch_file:
+            with open(args.batch_file) as f:
+                items = json.load(f)
+        else:
+            items = json.loads(args.batch)
+        counts = fill_state_match(items, args.company, args.overwrite)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(items, f, indent=2)
+    else:
+        print(json.dumps(items, indent=2))
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
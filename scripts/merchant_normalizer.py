@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Canonical merchant-name normalization with an interned lookup table.
+
+Raw Bill.com merchant strings carry store numbers, booking references and
+payment-processor prefixes, so nearly every string is unique:
+
+    SUNOCO 0004813209      -> SUNOCO
+    JETBLUE 2792196311296  -> JETBLUE
+    Amazon.com*B833B1GI0   -> AMAZON.COM
+    GOOGLE*CLOUD ZPC8VJ    -> GOOGLE CLOUD
+    PADDLE.NET* N8N CLOUD1 -> N8N
+    7ELEVEN 12345          -> 7ELEVEN     (the first word is kept even if it has digits)
+
+normalize_merchant() strips that noise with precompiled rules, and
+MerchantTable maps the result to a small, stable integer ID persisted in
+config/merchant_table.json, so caches, dedup and analytics can key on the
+merchant rather than the raw string. The table's "aliases" section maps
+known variants (e.g. "AMZN MKTP US") onto one canonical name.
+
+IDs are only assigned by the `build` command, which saves the table, so an
+ID is never handed out without being persisted. Everywhere else lookups are
+read-only and merchants not yet in the table get merchant_id null.
+
+Rule evaluation still uses the raw merchant string; the canonical name is
+only an additional key carried on results.
+
+Usage:
+    python merchant_normalizer.py normalize "SUNOCO 0004813209" "Amazon.com*B833B1GI0"
+    python merchant_normalizer.py build --history history.ndjson
+"""
+
+import argparse
+import json
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_TABLE_PATH = Path(__file__).parent.parent / 'config' / 'merchant_table.json'
+
+# Payment processors / marketplaces that prefix the real merchant name
+_PROCESSOR_PREFIX = re.compile(
+    r'^(?:SQ|TST|PAYPAL|PP|SP|PY|FS|IC|BT|WPY|SMK|EB|DD|PADDLE\.NET|2CO\.COM|FASTSPRING)\s?\*\s*'
+)
+# "*B833B1GI0" style references after an asterisk
+_STAR_REFERENCE = re.compile(r'\*\s*[A-Z0-9]*\d[A-Z0-9]*\b')
+# Reference tokens: "#1234" anywhere; "ZPC8VJ", "TJJTX7FHSLQC42B9" only after the
+# first word, which may itself be a brand like "1PASSWORD" or "7ELEVEN"
+_HASH_TOKEN = re.compile(r'^#[A-Z0-9]+$')
+_MIXED_TOKEN = re.compile(r'^(?=[A-Z0-9]{5,}$)(?=.*\d)(?=.*[A-Z])[A-Z0-9]+$')
+_SEPARATORS = re.compile(r'[*,;]+')
+_WHITESPACE = re.compile(r'\s+')
+_LEGAL_SUFFIX = re.compile(r'(?:\s+(?:INC|LLC|LTD|CORP|CO)\.?)+$')
+_TRAILING_PUNCTUATION = re.compile(r'[\s\-.#/]+$')
+
+
+def _is_id_token(token: str, position: int) -> bool:
+    """Whether a word is a store number or reference rather than part of the name."""
+    digits = sum(char.isdigit() for char in token)
+    if digits >= 3 and digits * 2 > len(token.lstrip('#')):
+        return True  # mostly digits: "0004813209", "#1234", "T0042"
+    return bool(_HASH_TOKEN.match(token)) or (position > 0 and bool(_MIXED_TOKEN.match(token)))
+
+
+@lru_cache(maxsize=65536)
+def normalize_merchant(raw: Optional[str]) -> str:
+    """Return the canonical form of a raw merchant string (interned)."""
+    if not raw:
+        return ''
+
+    name = raw.upper().strip()
+    name = _PROCESSOR_PREFIX.sub('', name)
+    name = _STAR_REFERENCE.sub(' ', name)
+    name = _SEPARATORS.sub(' ', name)
+
+    words = [token for token in _WHITESPACE.split(name) if token]
+    tokens = [token for position, token in enumerate(words) if not _is_id_token(token, position)]
+    name = ' '.join(tokens or words[:1])
+    name = _LEGAL_SUFFIX.sub('', name)
+    name = _TRAILING_PUNCTUATION.sub('', name)
+
+    return sys.intern(name or _WHITESPACE.sub(' ', raw.upper().strip()))
+
+
+class MerchantTable:
+    """Persistent canonical merchant -> integer ID table with alias overrides."""
+
+    def __init__(self, merchants: Optional[Dict[str, int]] = None, aliases: Optional[Dict[str, str]] = None):
+        self.merchants: Dict[str, int] = {sys.intern(k): v for k, v in (merchants or {}).items()}
+        self.aliases: Dict[str, str] = dict(aliases or {})
+        self.names: Dict[int, str] = {v: k for k, v in self.merchants.items()}
+        self._next_id = max(self.names, default=0) + 1
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str = str(DEFAULT_TABLE_PATH)) -> 'MerchantTable':
+        """Load a table, or start an empty one if the file does not exist yet."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        return cls(data.get('merchants'), data.get('aliases'))
+
+    def save(self, path: str = str(DEFAULT_TABLE_PATH)):
+        with open(path, 'w') as f:
+            json.dump({'aliases': self.aliases, 'merchants': self.merchants}, f, indent=2, sort_keys=True)
+        self.dirty = False
+
+    def canonical(self, raw: Optional[str]) -> str:
+        """Return the canonical merchant name, applying aliases."""
+        name = normalize_merchant(raw)
+        return self.aliases.get(name, name)
+
+    def lookup(self, raw: Optional[str]) -> Tuple[Optional[int], str]:
+        """Return (merchant_id, canonical name); merchant_id is None if the merchant has no ID yet."""
+        name = self.canonical(raw)
+        return self.merchants.get(name), name
+
+    def assign(self, raw: Optional[str]) -> Tuple[int, str]:
+        """
+        Return (merchant_id, canonical name), assigning the next unused ID on first sight.
+
+        New IDs are above every ID in the table, so they never collide with
+        one that was removed by hand. Save the table afterwards.
+        """
+        name = self.canonical(raw)
+        merchant_id = self.merchants.get(name)
+        if merchant_id is None:
+            merchant_id = self._next_id
+            self._next_id += 1
+            name = sys.intern(name)
+            self.merchants[name] = merchant_id
+            self.names[merchant_id] = name
+            self.dirty = True
+        return merchant_id, name
+
+    def name(self, merchant_id: int) -> Optional[str]:
+        return self.names.get(merchant_id)
+
+
+def raw_merchant(transaction: dict) -> str:
+    """Return the raw merchant string the classifier reads from a transaction."""
+    return transaction.get('rawMerchantName') or transaction.get('merchantName') or transaction.get('merchant', '')
+
+
+def annotate(results: Iterable[dict], items: Iterable[dict], table: MerchantTable):
+    """Add merchant_id / merchant_canonical to classify_batch results in place (the table is not changed)."""
+    for result, item in zip(results, items):
+        merchant_id, name = table.lookup(raw_merchant(item.get('transaction', {})))
+        result['merchant_id'] = merchant_id
+        result['merchant_canonical'] = name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalize merchant names to canonical IDs')
+    parser.add_argument('--table', type=str, default=str(DEFAULT_TABLE_PATH), help='Merchant table JSON')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    normalize_parser = subparsers.add_parser('normalize', help='Print canonical names for raw merchants')
+    normalize_parser.add_argument('merchants', nargs='+', help='Raw merchant strings')
+
+    build_parser = subparsers.add_parser('build', help='Assign IDs for every merchant in a history file')
+    build_parser.add_argument('--history', type=str, required=True, help='History file (JSON array or NDJSON)')
+
+    args = parser.parse_args()
+    table = MerchantTable.load(args.table)
+
+    if args.command == 'normalize':
+        output = [
+            {'raw': raw, 'canonical': table.canonical(raw), 'merchant_id': table.merchants.get(table.canonical(raw))}
+            for raw in args.merchants
+        ]
+        print(json.dumps(output, indent=2))
+        return
+
+    from rule_diff import iter_history
+
+    raw_count = 0
+    distinct_raw = set()
+    try:
+        for item in iter_history(args.history):
+            raw = raw_merchant(item.get('transaction', {}))
+            raw_count += 1
+            distinct_raw.add(raw)
+            table.assign(raw)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    table.save(args.table)
+    print(json.dumps({
+        'transactions': raw_count,
+        'distinct_raw_merchants': len(distinct_raw),
+        'canonical_merchants': len(table.merchants),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Character n-gram similarity index suggesting accounts for unmatched merchants.
+
+A transaction that matches no rule usually goes to manual or LLM review,
+even when its merchant is a near-variant of one the rules or past decisions
+already know ("REVOLUTON LAUNDRY", "AMTRAK MOBLE", "HOMEDEPOT.COM"). The
+index holds known merchants with their accounts from:
+
+    - the decision table's merchant patterns (rule_model; SKIP rows excluded)
+    - decision-overlay entries (human and LLM decisions)
+    - optionally, classified history (the most frequent account per
+      canonical merchant): a Bill.com transaction file (JSON array or
+      NDJSON) classified with the same rules, chunk by chunk
+
+Every merchant is reduced to the set of character trigrams of its
+canonical name (merchant_normalizer.normalize_merchant, padded with
+spaces) and stored in an inverted index trigram -> entries. A query counts
+shared trigrams only over the posting lists of its own trigrams, scores
+candidates with the Dice coefficient 2|A∩B| / (|A| + |B|) and keeps the
+top k. classify_batch(similarity_index=...) attaches the result to every
+result without a gl_account:
+
+    "suggestions": [{"merchant", "gl_account", "gl_account_name", "score", "source"}, ...]
+
+Suggestions never change the classification itself; llm_fallback.py can
+settle cases whose best suggestion scores above a threshold without a
+backend call.
+
+Usage:
+    python merchant_similarity.py query "REVOLUTON LAUNDRY" "AMTRAK MOBLE"
+    python merchant_similarity.py query --overlay config/decision_overlay.json --top-k 5 "HOMEDEPOT.COM"
+    python merchant_similarity.py query --history transactions.ndjson "HOMEDEPOT.COM"
+"""
+
+import argparse
+import heapq
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from decision_overlay import DecisionOverlay
+from merchant_normalizer import normalize_merchant, raw_merchant
+from rule_model import _literal, load_rules
+
+DEFAULT_RULES = str(Path(__file__).parent.parent / 'config' / 'classification_rules.jdm.json')
+
+NGRAM = 3
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.3
+HISTORY_CHUNK_SIZE = 5000
+
+
+def merchant_ngrams(merchant: str) -> frozenset:
+    """Character trigrams of a merchant's canonical name, padded with spaces."""
+    name = normalize_merchant(merchant)
+    if not name:
+        return frozenset()
+    padded = f" {name} "
+    return frozenset(padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+
+
+class KnownMerchant(NamedTuple):
+    """A merchant with the account a rule or past decision gives it."""
+    merchant: str
+    gl_account: str
+    gl_account_name: Optional[str]
+    source: str
+
+
+class MerchantIndex:
+    """Inverted trigram index over known merchants."""
+
+    def __init__(self):
+        self.entries: List[KnownMerchant] = []
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, merchant: str, gl_account: str, gl_account_name: Optional[str], source: str) -> bool:
+        """Index a merchant/account pair (repeats of a pair are ignored)."""
+        name = normalize_merchant(merchant)
+        grams = merchant_ngrams(name)
+        if not grams or not gl_account or (name, gl_account) in self._keys:
+            return False
+        self._keys.add((name, gl_account))
+        entry_id = len(self.entries)
+        self.entries.append(KnownMerchant(name, gl_account, gl_account_name, source))
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(entry_id)
+        return True
+
+    def add_rules(self, rules_path: str) -> int:
+        """Index the merchant patterns of a JDM file or DMN CSV."""
+        added = 0
+        for rule in load_rules(rules_path):
+            gl_account = _literal(rule.outputs.get('gl_account', ''))
+            if gl_account == 'SKIP' or _literal(rule.outputs.get('action', '')) == 'SKIP':
+                continue
+            for _, text in rule.field_patterns('merchant'):
+                added += self.add(text, gl_account, _literal(rule.outputs.get('gl_account_name', '')) or None, rule.rule_id)
+        return added
+
+    def add_overlay(self, overlay: DecisionOverlay) -> int:
+        """Index decision_overlay.DecisionOverlay entries (keys are 'merchant|mcc|team')."""
+        added = 0
+        for key, entry in overlay.entries.items():
+            merchant = key.split('|', 1)[0]
+            added += self.add(merchant, entry.get('gl_account'), entry.get('gl_account_name'), f"overlay:{entry.get('source', '')}")
+        return added
+
+    def add_history(self, items: Iterable[dict], results: Iterable[dict]) -> int:
+        """Index classified history: each canonical merchant's most frequent account."""
+        return self.add_classified(zip(items, results))
+
+    def add_classified(self, pairs: Iterable[tuple]) -> int:
+        """add_history over (item, result) pairs, consumed lazily."""
+        counts = {}
+        for item, result in pairs:
+            if not result.get('gl_account') or result.get('action') == 'SKIP':
+                continue
+            name = normalize_merchant(raw_merchant(item.get('transaction', item)))
+            counts.setdefault(name, Counter())[(result['gl_account'], result.get('gl_account_name'))] += 1
+        added = 0
+        for name, accounts in counts.items():
+            (gl_account, gl_account_name), _ = accounts.most_common(1)[0]
+            added += self.add(name, gl_account, gl_account_name, 'history')
+        return added
+
+    def query(self, merchant: str, top_k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE) -> List[dict]:
+        """
+        Return the top_k known merchants most similar to a merchant string.
+
+        Returns:
+            [{'merchant', 'gl_account', 'gl_account_name', 'score', 'source'}],
+            best first, scores (Dice over trigrams) at least min_score
+        """
+        grams = merchant_ngrams(merchant)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting:
+                shared.update(posting)
+
+        size = len(grams)
+        sizes = self.sizes
+        # Ties go to the earlier entry (rules before overlay before history)
+        scored = (
+            (2 * count / (size + sizes[entry_id]), -entry_id)
+            for entry_id, count in shared.items()
+        )
+        best = heapq.nlargest(top_k, (pair for pair in scored if pair[0] >= min_score))
+        suggestions = []
+        for score, negative_id in best:
+            entry = self.entries[-negative_id]
+            suggestions.append({
+                'merchant': entry.merchant,
+                'gl_account': entry.gl_account,
+                'gl_account_name': entry.gl_account_name,
+                'score': round(score, 3),
+                'source': entry.source,
+            })
+        return suggestions
+
+    def suggest(self, results: List[dict], items: List[dict], top_k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE) -> int:
+        """
+        Attach 'suggestions' to classify_batch results that have no gl_account.
+
+        Each distinct merchant is queried once per call.
+
+        Returns:
+            Number of results that received at least one suggestion
+        """
+        cache = {}
+        suggested = 0
+        for result, item in zip(results, items):
+            if result.get('gl_account'):
+                continue
+            merchant = raw_merchant(item.get('transaction', item))
+            suggestions = cache.get(merchant)
+            if suggestions is None:
+                suggestions = cache[merchant] = self.query(merchant, top_k, min_score)
+            result['suggestions'] = suggestions
+            suggested += bool(suggestions)
+        return suggested
+
+
+def classified_history(history_path: str, rules_path: str = DEFAULT_RULES, chunk_size: int = HISTORY_CHUNK_SIZE) -> Iterator[tuple]:
+    """Yield (item, result) pairs for a history file, classified chunk by chunk."""
+    from classify_transaction import classify_batch
+    from rule_diff import iter_chunks, iter_history
+
+    for chunk in iter_chunks(iter_history(history_path), chunk_size):
+        yield from zip(chunk, classify_batch(chunk, rules_path))
+
+
+def build_index(
+    rules_path: str = DEFAULT_RULES,
+    overlay: Optional[DecisionOverlay] = None,
+    history: Optional[str] = None,
+) -> MerchantIndex:
+    """
+    Index a rules file's merchant patterns and, optionally, an overlay and history.
+
+    Args:
+        rules_path: JDM file or DMN CSV
+        overlay: Decision overlay whose entries are indexed after the rules
+        history: Bill.com transaction file (JSON array or NDJSON), classified
+            with rules_path; each merchant's most frequent account is indexed
+    """
+    index = MerchantIndex()
+    index.add_rules(rules_path)
+    if overlay is not None:
+        index.add_overlay(overlay)
+    if history:
+        index.add_classified(classified_history(history, rules_path))
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest accounts for merchants from similar known merchants')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help='Show the most similar known merchants')
+    query_parser.add_argument('merchants', nargs='+', help='Raw merchant strings')
+    query_parser.add_argument('--jdm', type=str, default=DEFAULT_RULES, help='JDM file or DMN CSV to index')
+    query_parser.add_argument('--overlay', type=str, help='Decision overlay JSON to index as well')
+    query_parser.add_argument('--history', type=str, help='Transaction history (JSON array or NDJSON) to classify and index as well')
+    query_parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Suggestions per merchant')
+    query_parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE, help='Minimum similarity (0-1)')
+
+    args = parser.parse_args()
+
+    try:
+        overlay = DecisionOverlay.load(args.overlay) if args.overlay else None
+        index = build_index(args.jdm, overlay, args.history)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    output = [
+        {'merchant': merchant, 'canonical': normalize_merchant(merchant), 'suggestions': index.query(merchant, args.top_k, args.min_score)}
+        for merchant in args.merchants
+    ]
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-company classification and journal-entry generation.
+
+Each company runs in its own worker process with its own compiled decision
+(the company rule pack, see classify_transaction.resolve_rules_path), its
+own account registry from config/chart_of_accounts.json, and its own caches.
+Company batches are processed concurrently, so adding an entity adds a
+worker rather than run time, and company-specific behavior lives in its
+rule pack instead of bloating the shared table.
+
+Usage:
+    # Items grouped by company
+    python multi_company.py --batch '{"WCLI": [{"transaction": {...}, "employee": {...}, "billcom_budget": "..."}], "WCLC": [...]}'
+
+    # Flat list where each item carries a "company" key
+    python multi_company.py --batch-file items.json
+
+    # Also flag near-duplicates of already-posted transactions
+    python multi_company.py --batch-file items.json --duplicate-history posted.ndjson
+"""
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from classify_transaction import classify_batch, resolve_rules_path
+from journal_entry_template import COMPANY_CONFIG, create_batch_entries, load_account_registry
+from merchant_location import fill_state_match
+from near_duplicates import DEFAULT_WINDOW_HOURS, DuplicateIndex, find_near_duplicates, load_index
+
+# Actions that get a journal entry without human confirmation
+POSTABLE_ACTIONS = ('AUTO_POST',)
+
+
+def group_by_company(items: List[dict]) -> Dict[str, List[dict]]:
+    """Group a flat list of items by their 'company' key."""
+    grouped = {}
+    for item in items:
+        company = item.get('company')
+        if company not in COMPANY_CONFIG:
+            raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+        grouped.setdefault(company, []).append(item)
+    return grouped
+
+
+def is_postable(result: dict, postable_actions: Sequence[str] = POSTABLE_ACTIONS) -> bool:
+    """Whether a classification result gets a journal entry without review."""
+    return result.get('action') in postable_actions and bool(result.get('gl_account'))
+
+
+def located_copies(items: List[dict], company: str) -> List[dict]:
+    """
+    Copy a batch and fill the copies' missing state_match values.
+
+    Items and their transaction dicts are copied one level deep, so
+    merchant_location.fill_state_match never writes into the caller's batch.
+    Items that are not dicts (e.g. TransactionRecords) are passed through.
+    """
+    copies = []
+    for item in items:
+        if isinstance(item, dict):
+            item = dict(item)
+            if isinstance(item.get('transaction'), dict):
+                item['transaction'] = dict(item['transaction'])
+        copies.append(item)
+    fill_state_match(copies, company)
+    return copies
+
+
+def process_company(
+    company: str,
+    items: List[dict],
+    rules_path: Optional[str] = None,
+    postable_actions: Sequence[str] = POSTABLE_ACTIONS,
+    locate: bool = True,
+    dedupe: bool = True,
+    history: Optional[DuplicateIndex] = None,
+) -> dict:
+    """
+    Classify one company's batch and build entries for postable results.
+
+    Runs inside a worker process, so the decision and registry caches it
+    fills belong to this company only. Unless locate is False, missing
+    state_match values are first filled from the merchant locations on
+    copies of the items (located_copies); the caller's items are not
+    changed. Unless dedupe is False,
+    likely double-posts (near_duplicates.find_near_duplicates) carry a
+    'near_duplicate' note and go to review instead of being posted; with a
+    history index (near_duplicates.DuplicateIndex) the batch is also checked
+    against earlier transactions, using the index's window.
+
+    Returns:
+        Dict with 'classifications', 'entries', 'review' (results without an
+        entry) and 'unknown_accounts' (expense accounts missing from the
+        company's chart of accounts)
+    """
+    rules_path = rules_path or resolve_rules_path(company)
+    registry = load_account_registry(company)
+    if locate:
+        items = located_copies(items, company)
+
+    classifications = classify_batch(items, rules_path, company=company)
+    if dedupe:
+        window_hours = history.window / 3600 if history is not None else DEFAULT_WINDOW_HOURS
+        for result, flag in zip(classifications, find_near_duplicates(items, history, window_hours)):
+            if flag:
+                result['near_duplicate'] = flag
+                if is_postable(result, postable_actions):
+                    result['action'] = 'REVIEW'
+
+    to_post = []
+    review = []
+    for item, result in zip(items, classifications):
+        if is_postable(result, postable_actions):
+            to_post.append({
+                'transaction': item.get('transaction', {}),
+                'classification': {
+                    'gl_account': result['gl_account'],
+                    'gl_account_name': result.get('gl_account_name') or '',
+                    'erpnext_account': result.get('erpnext_account'),
+                },
+            })
+        else:
+            review.append(result)
+
+    entries = create_batch_entries(to_post, company=company)
+    unknown_accounts = sorted({
+        line['account']
+        for entry in entries if 'accounts' in entry
+        for line in entry['accounts']
+        if line['account'] not in registry
+    })
+
+    return {
+        'company': company,
+        'rules_path': rules_path,
+        'classifications': classifications,
+        'entries': entries,
+        'review': review,
+        'unknown_accounts': unknown_accounts,
+    }
+
+
+def process_companies(
+    batches: Dict[str, List[dict]],
+    rules_paths: Optional[Dict[str, str]] = None,
+    max_workers: Optional[int] = None,
+    history: Optional[DuplicateIndex] = None,
+) -> Dict[str, dict]:
+    """
+    Process several companies' batches concurrently, one worker per company.
+
+    Args:
+        batches: Company code -> classify_batch items
+        rules_paths: Optional company code -> rules file overrides
+        max_workers: Worker processes (default: one per company)
+        history: Optional near_duplicates.DuplicateIndex of earlier transactions
+
+    Returns:
+        Company code -> process_company() output
+    """
+    for company in batches:
+        if company not in COMPANY_CONFIG:
+            raise ValueError(f"Unknown company: {company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+
+    rules_paths = rules_paths or {}
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers or max(len(batches), 1)) as executor:
+        futures = {
+            company: executor.submit(process_company, company, items, rules_paths.get(company), history=history)
+            for company, items in batches.items()
+        }
+        for company, future in futures.items():
+            results[company] = future.result()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify and build journal entries for several companies concurrently')
+    parser.add_argument('--batch', type=str, help='JSON: {company: [items]} or a list of items with "company"')
+    parser.add_argument('--batch-file', type=str, help='File containing the same JSON as --batch')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per company)')
+    parser.add_argument('--duplicate-history', type=str, help='Earlier transactions to check near-duplicates against (JSON array or NDJSON)')
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS, help='Near-duplicate window in hours')
+
+    args = parser.parse_args()
+
+    try:
+        if args.batch:
+            payload = json.loads(args.batch)
+        elif args.batch_file:
+            with open(args.batch_file, 'r') as f:
+                payload = json.load(f)
+        else:
+            parser.print_help()
+            sys.exit(1)
+
+        batches = group_by_company(payload) if isinstance(payload, list) else payload
+        history = load_index(args.duplicate_history, args.window_hours) if args.duplicate_history else None
+        results = process_companies(batches, max_workers=args.workers, history=history)
+        print(json.dumps(results, indent=2))
+
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
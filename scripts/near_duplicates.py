@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for transactions about to be posted.
+
+The same charge sometimes arrives twice with different transaction IDs, so
+the cheque_no checks (entry_validation.py, erpnext_poster.py) never see it.
+Two transactions are near-duplicates when they share a duplicate key
+
+    (canonical merchant, amount in cents, user, credit/debit)
+
+(merchant_normalizer.MerchantTable.canonical, so "AMTRAK MOBILE 1234" and
+"AMTRAK MOBILE 5678" share a key) and their times, authorizedTime falling
+back to occurredTime, are at most window_hours apart.
+
+Instead of comparing every pair, transactions are hashed by key and each
+key's times are sorted; only neighbours in that order can be within the
+window. A batch is checked in O(n log n), and each lookup against a
+DuplicateIndex built from history (a year or more) is a bisect in one key's
+sorted times.
+
+Within a batch the earliest transaction of a run is kept and every later
+one within the window of its predecessor is flagged. Transactions without
+a usable time are never flagged. multi_company.process_company sends
+flagged results to REVIEW instead of auto-posting them; it, backfill.py and
+shard_queue.py accept a history index (--duplicate-history) as well.
+
+Usage:
+    python near_duplicates.py --batch-file items.json
+    python near_duplicates.py --batch-file items.json --history history.ndjson --window-hours 48
+"""
+
+import argparse
+import json
+import sys
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from merchant_normalizer import MerchantTable, raw_merchant
+from rule_diff import iter_history
+
+DEFAULT_WINDOW_HOURS = 24
+
+
+def transaction_time(txn: dict) -> Optional[float]:
+    """Epoch seconds of authorizedTime (else occurredTime), or None."""
+    value = txn.get('authorizedTime') or txn.get('occurredTime')
+    if not value:
+        return None
+    try:
+        # fromisoformat only accepts a trailing 'Z' from Python 3.11
+        moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def duplicate_key(txn: dict, table: MerchantTable) -> tuple:
+    """(canonical merchant, amount in cents, user, is_credit) for a transaction."""
+    return (
+        table.canonical(raw_merchant(txn)),
+        round(float(txn.get('amount') or 0) * 100),
+        txn.get('userEmail') or txn.get('cardId') or '',
+        bool(txn.get('isCredit', False)),
+    )
+
+
+def _transaction_id(txn: dict) -> Optional[str]:
+    return txn.get('uuid') or txn.get('id')
+
+
+class DuplicateIndex:
+    """Per-key sorted times of reference transactions (e.g. already-posted history)."""
+
+    def __init__(self, window_hours: float = DEFAULT_WINDOW_HOURS, table: Optional[MerchantTable] = None):
+        self.window = window_hours * 3600
+        self.table = table or MerchantTable.load()
+        self._entries: Dict[tuple, List[Tuple[float, str]]] = {}
+        self._unsorted = set()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def copy(self) -> 'DuplicateIndex':
+        """An index with the same entries, window and table that can be added to independently."""
+        other = DuplicateIndex(self.window / 3600, self.table)
+        other._entries = {key: list(entries) for key, entries in self._entries.items()}
+        other._unsorted = set(self._unsorted)
+        return other
+
+    def add(self, items: Iterable[dict]):
+        """Index classify_batch items or bare transactions (untimed ones are skipped)."""
+        for item in items:
+            txn = item.get('transaction', item)
+            moment = transaction_time(txn)
+            if moment is None:
+                continue
+            key = duplicate_key(txn, self.table)
+            self._entries.setdefault(key, []).append((moment, _transaction_id(txn) or ''))
+            self._unsorted.add(key)
+
+    def nearest(self, txn: dict) -> Optional[dict]:
+        """
+        The closest indexed transaction with the same key inside the window.
+
+        Returns:
+            {'duplicate_of', 'seconds_apart', 'source': 'history'} or None;
+            an indexed transaction with the same ID is the transaction
+            itself, not a duplicate
+        """
+        moment = transaction_time(txn)
+        if moment is None:
+            return None
+        key = duplicate_key(txn, self.table)
+        entries = self._entries.get(key)
+        if not entries:
+            return None
+        if key in self._unsorted:
+            entries.sort()
+            self._unsorted.discard(key)
+
+        own_id = _transaction_id(txn)
+        best = None
+        position = bisect_left(entries, (moment - self.window, ''))
+        while position < len(entries) and entries[position][0] <= moment + self.window:
+            other_time, other_id = entries[position]
+            if other_id != own_id:
+                apart = abs(other_time - moment)
+                if best is None or apart < best[0]:
+                    best = (apart, other_id)
+            position += 1
+        if best is None:
+            return None
+        return {'duplicate_of': best[1], 'seconds_apart': round(best[0]), 'source': 'history'}
+
+
+def load_index(path: str, window_hours: float = DEFAULT_WINDOW_HOURS) -> DuplicateIndex:
+    """Build a DuplicateIndex from a history file (JSON array or NDJSON)."""
+    index = DuplicateIndex(window_hours)
+    index.add(iter_history(path))
+    return index
+
+
+def find_near_duplicates(
+    items: List[dict],
+    history: Optional[DuplicateIndex] = None,
+    window_hours: float = DEFAULT_WINDOW_HOURS,
+    table: Optional[MerchantTable] = None,
+) -> List[Optional[dict]]:
+    """
+    Flag likely double-posts in a batch.
+
+    Args:
+        items: classify_batch / create_batch_entries items or bare transactions
+        history: Optional index of earlier transactions to check against too
+        window_hours: Maximum time between two copies of one charge
+        table: Merchant table for canonical names (default: config/merchant_table.json)
+
+    Returns:
+        One entry per item: None, or {'duplicate_of': transaction ID,
+        'seconds_apart', 'source': 'batch' | 'history'}
+    """
+    table = table or (history.table if history is not None else MerchantTable.load())
+    window = window_hours * 3600
+    flags: List[Optional[dict]] = [None] * len(items)
+
+    groups = {}
+    for position, item in enumerate(items):
+        txn = item.get('transaction', item)
+        moment = transaction_time(txn)
+        if moment is not None:
+            groups.setdefault(duplicate_key(txn, table), []).append((moment, position))
+
+    for entries in groups.values():
+        if len(entries) < 2:
+            continue
+        entries.sort()
+        for (previous_time, previous), (moment, position) in zip(entries, entries[1:]):
+            if moment - previous_time <= window:
+                previous_txn = items[previous].get('transaction', items[previous])
+                flags[position] = {
+                    'duplicate_of': _transaction_id(previous_txn),
+                    'seconds_apart': round(moment - previous_time),
+                    'source': 'batch',
+                }
+
+    if history is not None:
+        for position, item in enumerate(items):
+            if flags[position] is None:
+                flags[position] = history.nearest(item.get('transaction', item))
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag likely double-posted transactions in a batch')
+    parser.add_argument('--batch-file', type=str, required=True, help='Items or transactions to check (JSON array or NDJSON)')
+    parser.add_argument('--history', type=str, help='Earlier transactions to check against (JSON array or NDJSON)')
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS, help='Maximum hours between two copies of a charge')
+
+    args = parser.parse_args()
+
+    try:
+        items = list(iter_history(args.batch_file))
+        history = load_index(args.history, args.window_hours) if args.history else None
+        flags = find_near_duplicates(items, history, args.window_hours)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    flagged = [
+        dict(flag, index=position, transaction_id=_transaction_id(items[position]['transaction']))
+        for position, flag in enumerate(flags) if flag
+    ]
+    print(json.dumps(flagged, indent=2))
+    print(json.dumps({'items': len(items), 'flagged': len(flagged)}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+Streaming output writers and field projection for the CLIs.
+
+classify_transaction.py and journal_entry_template.py print pretty JSON by
+default. For large batches, --format picks a compact, streamed encoding and
+--fields keeps only the columns the caller consumes:
+
+    json      one indented JSON document (the default, unchanged)
+    ndjson    one compact JSON object per line
+    csv       header plus one row per record; nested values are JSON-encoded
+    parquet   columnar file, written in row batches (requires pyarrow and --output)
+
+csv and parquet rows always stream. With --fields those are the columns.
+Without it the columns are every key of the first chunk of records, followed
+by the known columns of classify_batch results (RESULT_COLUMNS) or journal
+entries (ENTRY_COLUMNS) that the chunk did not use yet, since those records
+carry e.g. erpnext_account or suggestions only when they apply. A later
+record with any other key raises ValueError instead of being cut down.
+
+Parquet column types come from COLUMN_TYPES for the known fields (amounts are
+always float64) and are otherwise inferred from the first chunk, with every
+numeric column stored as float64. A value that does not fit its column
+raises ValueError; nothing is truncated or cast to bool.
+
+Fields are dotted paths into each record, with list indexes allowed:
+
+    --fields transaction_id,gl_account,action
+    --fields cheque_no,posting_date,accounts.1.account,accounts.1.debit_in_account_currency
+"""
+
+import csv
+import json
+import sys
+from typing import Any, Iterable, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+FORMATS = ('json', 'ndjson', 'csv', 'parquet')
+STREAM_FORMATS = FORMATS[1:]
+
+PARQUET_BATCH_SIZE = 10_000
+
+# Records buffered to pick the csv header when no fields are given
+HEADER_SAMPLE_SIZE = 1_000
+
+# Every key classify_batch / classify_transaction results can carry, in output order
+RESULT_COLUMNS = (
+    'transaction_id', 'gl_account', 'gl_account_name', 'action', 'confidence', 'matched_by',
+    'rule_notes', 'has_discrepancy', 'discrepancy', 'billcom_budget', 'notes', 'company',
+    'erpnext_account', 'merchant_id', 'merchant_canonical', 'suggestions', 'near_duplicate',
+    'fallback_reason', 'fallback_error', 'rule_id', 'trace_timings', 'input_used', 'performance',
+    'shard', 'worker',
+)
+
+# Every key of create_batch_entries() documents and error placeholders
+ENTRY_COLUMNS = (
+    'doctype', 'docstatus', 'title', 'voucher_type', 'company', 'posting_date', 'cheque_no',
+    'cheque_date', 'user_remark', 'accounts', 'error', 'transaction_id',
+)
+
+# Keys that mark a chunk as results or entries
+_COLUMN_SETS = ((('gl_account', 'action'), RESULT_COLUMNS), (('accounts', 'doctype', 'error'), ENTRY_COLUMNS))
+
+# Parquet types of known fields, by the last part of their dotted path
+COLUMN_TYPES = {
+    'amount': 'float64',
+    'debit_in_account_currency': 'float64',
+    'credit_in_account_currency': 'float64',
+    'score': 'float64',
+    'has_discrepancy': 'bool_',
+    'isCredit': 'bool_',
+    'merchant_id': 'int64',
+    'docstatus': 'int64',
+    'shard': 'int64',
+}
+
+_MISSING = object()
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Split a --fields argument into a list of dotted paths (None keeps everything)."""
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def get_path(record: Any, path: str) -> Any:
+    """Return the value at a dotted path (dict keys and list indexes), or None."""
+    value = record
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.lstrip('-').isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        else:
+            value = _MISSING
+        if value is _MISSING:
+            return None
+    return value
+
+
+def project(record: dict, fields: Optional[Sequence[str]]) -> dict:
+    """Keep only the given fields of a record, keyed by their dotted paths."""
+    if not fields:
+        return record
+    return {path: get_path(record, path) for path in fields}
+
+
+def _scalar(value: Any) -> Any:
+    """JSON-encode nested values so they fit in a CSV cell or string column."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class NdjsonWriter:
+    def __init__(self, stream, fields: Optional[Sequence[str]] = None):
+        self.stream = stream
+        self.fields = fields
+
+    def write(self, record: dict):
+        self.stream.write(json.dumps(project(record, self.fields)) + '\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+def default_columns(rows: List[dict]) -> List[str]:
+    """
+    Columns for records written without fields.
+
+    Every key of the sample rows in first-seen order, then the remaining
+    RESULT_COLUMNS or ENTRY_COLUMNS when the rows are results or entries.
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    for markers, known in _COLUMN_SETS:
+        if any(marker in columns for marker in markers):
+            columns += [name for name in known if name not in columns]
+    return columns
+
+
+def _check_columns(row: dict, columns: frozenset):
+    extra = [key for key in row if key not in columns]
+    if extra:
+        raise ValueError(
+            f"Record has fields outside the output columns: {', '.join(extra)}; pass --fields to choose the columns"
+        )
+
+
+class CsvWriter:
+    """
+    CSV rows, written as they arrive.
+
+    The header is fields, or else default_columns() of the first
+    sample_size records (only those are buffered).
+    """
+
+    def __init__(self, stream, fields: Optional[Sequence[str]] = None, sample_size: int = HEADER_SAMPLE_SIZE):
+        self.stream = stream
+        self.fields = fields
+        self.sample_size = sample_size
+        self._rows: List[dict] = []
+        self._columns = None
+        self._writer = None
+        if fields:
+            self._start(list(fields))
+
+    def _start(self, columns: List[str]):
+        self._columns = frozenset(columns)
+        self._writer = csv.DictWriter(self.stream, fieldnames=columns, lineterminator='\n')
+        self._writer.writeheader()
+
+    def write(self, record: dict):
+        row = {key: _scalar(value) for key, value in project(record, self.fields).items()}
+        if self._writer is None:
+            self._rows.append(row)
+            if len(self._rows) >= self.sample_size:
+                self._flush()
+            return
+        _check_columns(row, self._columns)
+        self._writer.writerow(row)
+
+    def _flush(self):
+        if self._rows:
+            self._start(default_columns(self._rows))
+            self._writer.writerows(self._rows)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self.stream.flush()
+
+
+def _arrow_type(name: str, values: List[Any]):
+    """Arrow type of a column: COLUMN_TYPES for known fields, else inferred (None and '' count as missing)."""
+    known = COLUMN_TYPES.get(name.rsplit('.', 1)[-1])
+    if known:
+        return getattr(pa, known)()
+    present = [value for value in values if value is not None and value != '']
+    if present and all(isinstance(value, bool) for value in present):
+        return pa.bool_()
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return pa.float64()
+    return pa.string()
+
+
+def _coerce(value: Any, arrow_type, name: str) -> Any:
+    """A value as stored in a column of arrow_type; raises ValueError if it does not fit."""
+    if value is None:
+        return None
+    if arrow_type == pa.string():
+        return value if isinstance(value, str) else str(_scalar(value))
+    if value == '':
+        return None
+    if arrow_type == pa.bool_():
+        fits = isinstance(value, bool)
+    elif arrow_type == pa.int64():
+        fits = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        fits = isinstance(value, (int, float)) and not isinstance(value, bool)
+        value = float(value) if fits else value
+    if not fits:
+        raise ValueError(f"Parquet column {name!r} is {arrow_type}; cannot store {value!r}")
+    return value
+
+
+class ParquetWriter:
+    """
+    Parquet file written in row batches of batch_size.
+
+    The columns are fields, or else default_columns() of the first batch;
+    their types come from _arrow_type() over the first batch. Missing and ''
+    values are null in non-string columns (e.g. has_discrepancy).
+    """
+
+    def __init__(self, path: str, fields: Optional[Sequence[str]] = None, batch_size: int = PARQUET_BATCH_SIZE):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for --format parquet: pip install pyarrow")
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        self.schema = None
+        self._columns = None
+        self._rows: List[dict] = []
+        self._writer = None
+
+    def write(self, record: dict):
+        row = project(record, self.fields)
+        if self._columns is not None:
+            _check_columns(row, self._columns)
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        rows = self._rows
+        self._rows = []
+        if self.schema is None:
+            names = list(self.fields) if self.fields else default_columns(rows)
+            self.schema = pa.schema([(name, _arrow_type(name, [row.get(name) for row in rows])) for name in names])
+            self._columns = frozenset(names)
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        columns = [
+            pa.array([_coerce(row.get(field.name), field.type, field.name) for row in rows], type=field.type)
+            for field in self.schema
+        ]
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def write_records(
+    records: Iterable[dict],
+    fmt: str = 'ndjson',
+    fields: Optional[Sequence[str]] = None,
+    output: Optional[str] = None,
+) -> int:
+    """
+    Write records in a streaming format, one at a time.
+
+    Pretty JSON (the CLIs' default) is a single document and is not handled
+    here; callers dump it with json.dumps(..., indent=2) as before.
+
+    Args:
+        records: Dicts to write (any iterable; consumed lazily)
+        fmt: One of STREAM_FORMATS
+        fields: Dotted paths to keep (None keeps whole records)
+        output: Output file path (default stdout; required for parquet)
+
+    Returns:
+        Number of records written
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unknown streaming format: {fmt}. Must be one of: {list(STREAM_FORMATS)}")
+    if fmt == 'parquet' and not output:
+        raise ValueError("--format parquet requires --output")
+
+    if fmt == 'parquet':
+        writer = ParquetWriter(output, fields)
+        handle = None
+    else:
+        handle = open(output, 'w', newline='') if output else sys.stdout
+        writer = (NdjsonWriter if fmt == 'ndjson' else CsvWriter)(handle, fields)
+
+    count = 0
+    try:
+        for record in records:
+            writer.write(record)
+            count += 1
+    finally:
+        writer.close()
+        if handle is not None and handle is not sys.stdout:
+            handle.close()
+    return count
+
+
+def _write_json_array(records: Iterable[dict], fields: Optional[Sequence[str]], stream) -> int:
+    """Stream records as the same text json.dumps(list(records), indent=2) would produce."""
+    count = 0
+    for record in records:
+        text = json.dumps(project(record, fields), indent=2).replace('\n', '\n  ')
+        stream.write(('[\n  ' if not count else ',\n  ') + text)
+        count += 1
+    stream.write('\n]\n' if count else '[]\n')
+    return count
+
+
+def write_output(output, fmt: str = 'json', fields: Optional[Sequence[str]] = None, path: Optional[str] = None) -> int:
+    """
+    Write a CLI result (one record or an iterable of records) in any of FORMATS.
+
+    Records are written as they are consumed, never copied into a second
+    list. 'json' keeps the original indented output: records become a JSON
+    array and a single record stays an object.
+
+    Returns:
+        Number of records written
+    """
+    single = isinstance(output, dict)
+    if fmt != 'json':
+        return write_records([output] if single else output, fmt, fields, path)
+
+    handle = open(path, 'w') if path else sys.stdout
+    try:
+        if single:
+            handle.write(json.dumps(project(output, fields), indent=2) + '\n')
+            return 1
+        return _write_json_array(output, fields, handle)
+    finally:
+        if handle is not sys.stdout:
+            handle.close()
@@ -0,0 +1,173 @@
+"""
+Per-stage timers and an opt-in profiler for the classification scripts.
+
+Slow sync runs spend their time in one of a handful of stages (JSON parsing,
+create_decision, decision.evaluate, budget extraction, response assembly,
+json.dumps). STAGES is a process-wide StageTimer the scripts always feed;
+hot loops accumulate locally and add one total per batch, so the timers
+cost a few perf_counter() calls per transaction.
+
+profile_session() is what the scripts' --profile / --timings options use:
+
+    --timings         print the stage summary table to stderr
+    --profile PATH    also write a cProfile dump to PATH (open with pstats or
+                      snakeviz) and sampled stacks to PATH.collapsed, ready
+                      for flamegraph.pl or speedscope
+
+Usage:
+    python classify_transaction.py --batch "$(cat items.json)" --profile /tmp/classify.prof
+    python -m pstats /tmp/classify.prof
+    flamegraph.pl /tmp/classify.prof.collapsed > classify.svg
+"""
+
+import cProfile
+import os
+import signal
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, List, Optional
+
+
+class StageTimer:
+    """Accumulates wall time and call counts per named stage."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.items = 0
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        """Add time spent in a stage (calls > 1 for a batch-aggregated total)."""
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def count(self, items: int):
+        """Record how many transactions (or rules) the timed work covered."""
+        self.items += items
+
+    @contextmanager
+    def stage(self, name: str, calls: int = 1):
+        """Time a block as one stage."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start, calls)
+
+    def reset(self):
+        self.totals.clear()
+        self.calls.clear()
+        self.items = 0
+
+    def summary(self) -> List[dict]:
+        """Return one row per stage, in first-seen order."""
+        grand_total = sum(self.totals.values()) or 1.0
+        return [
+            {
+                'stage': stage,
+                'calls': self.calls[stage],
+                'total_ms': total * 1000,
+                'per_call_us': total * 1e6 / self.calls[stage],
+                'per_item_us': total * 1e6 / self.items if self.items else None,
+                'percent': total * 100 / grand_total,
+            }
+            for stage, total in self.totals.items()
+        ]
+
+    def format_summary(self) -> str:
+        """Render summary() as a fixed-width table."""
+        lines = [f"{'stage':<18}{'calls':>9}{'total ms':>12}{'us/call':>11}{'us/item':>11}{'%':>7}"]
+        for row in self.summary():
+            per_item = f"{row['per_item_us']:.1f}" if row['per_item_us'] is not None else '-'
+            lines.append(
+                f"{row['stage']:<18}{row['calls']:>9}{row['total_ms']:>12.2f}"
+                f"{row['per_call_us']:>11.1f}{per_item:>11}{row['percent']:>6.1f}%"
+            )
+        lines.append(f"items: {self.items}   total: {sum(self.totals.values()) * 1000:.2f} ms")
+        return '\n'.join(lines)
+
+
+# Process-wide timers fed by classify_transaction, journal_entry_template
+# and convert_dmn_to_jdm
+STAGES = StageTimer()
+
+
+class StackSampler:
+    """
+    Samples the main thread's Python stack on SIGPROF and counts collapsed stacks.
+
+    Only available where signal.setitimer exists (not on Windows). Time spent
+    inside zen's native evaluate() is attributed to the Python line that
+    called it.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._previous_handler = None
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_session(profile_path: Optional[str] = None, timings: bool = False, stream=None):
+    """
+    Run a block under the profiler and/or report stage timings afterwards.
+
+    Args:
+        profile_path: Where to write the cProfile dump; sampled stacks go to
+            profile_path + '.collapsed'. None disables profiling.
+        timings: Print the stage summary even without profile_path
+        stream: Where to print the summary (default: stderr, so JSON on
+            stdout stays parseable)
+    """
+    profiler = sampler = None
+    if profile_path:
+        profiler = cProfile.Profile()
+        if StackSampler.available():
+            sampler = StackSampler()
+            sampler.start()
+        profiler.enable()
+
+    try:
+        yield STAGES
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            written = [profile_path]
+            if sampler is not None:
+                sampler.stop()
+                sampler.write(profile_path + '.collapsed')
+                written.append(profile_path + '.collapsed')
+
+        if profile_path or timings:
+            stream = stream or sys.stderr
+            print(STAGES.format_summary(), file=stream)
+            if profile_path:
+                print(f"Profile written to: {', '.join(written)}", file=stream)
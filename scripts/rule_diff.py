@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Shadow-evaluate two rule-set versions over a transaction history and diff them.
+
+Both versions (JDM or DMN CSV) are compiled once per worker process and the
+history is evaluated in parallel chunks. Only transactions whose gl_account
+or action changed are reported, together with old->new account counts and
+the rule IDs that fired on each side.
+
+Usage:
+    python rule_diff.py --old config/dmn_rules.csv.orig --new config/dmn_rules.csv \\
+        --history history.ndjson --changes changes.ndjson
+
+History files are a JSON array or NDJSON (.ndjson/.jsonl), one record per
+transaction, either in the classify_batch item shape
+({"transaction": ..., "employee": ..., "billcom_budget": ...}) or as bare
+Bill.com transactions.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from itertools import chain, islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Optional
+
+from classify_transaction import as_batch_item, build_batch_input, load_decision
+from trace_sampler import matched_rule_id
+
+# Input fields that determine the decision result (used as the memo key)
+INPUT_KEY_FIELDS = ('mcc', 'merchant', 'amount', 'user_team', 'state_match')
+
+# Characters read per refill when streaming a JSON array
+JSON_READ_SIZE = 1 << 16
+_ARRAY_DELIMITERS = (' ', '\t', '\r', '\n', ',', ']')
+
+# Per-process state, populated by _init_worker
+_worker = {}
+
+
+def iter_json_records(path: str) -> Iterator[dict]:
+    """
+    Yield the records of a JSON array or NDJSON file ('-' for stdin).
+
+    .ndjson/.jsonl files are read line by line; other files are NDJSON
+    unless their first non-blank character opens an array. Arrays are
+    decoded element by element, so neither format is held in memory whole.
+    """
+    with (nullcontext(sys.stdin) if path == '-' else open(path, 'r')) as f:
+        first = '' if path.endswith(('.ndjson', '.jsonl')) else f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == '[':
+            yield from _iter_json_array(f)
+            return
+        for line in chain([first + f.readline()], f) if first else f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_json_array(f, read_size: int = JSON_READ_SIZE) -> Iterator:
+    """Yield the elements of a JSON array whose '[' has already been read from f."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    expect = 'first'  # 'first' (value or ']'), 'value', or 'separator' (',' or ']')
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('Unterminated JSON array')
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer, pos = chunk, 0
+            continue
+
+        char = buffer[pos]
+        if expect == 'separator' or (expect == 'first' and char == ']'):
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+            pos += 1
+            expect = 'value'
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        # A value not followed by a separator may be cut short (e.g. '-3' of '-3.5')
+        if end is None or (not eof and buffer[end:end + 1] not in _ARRAY_DELIMITERS):
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield value
+        pos = end
+        expect = 'separator'
+
+
+def iter_history(path: str) -> Iterator[dict]:
+    """Yield classify_batch items from a JSON array or NDJSON history file."""
+    for record in iter_json_records(path):
+        yield as_batch_item(record)
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(old_path: str, new_path: str):
+    _worker['old'] = load_decision(old_path)
+    _worker['new'] = load_decision(new_path)
+    _worker['memo'] = {}
+
+
+def _outcome(result: dict) -> tuple:
+    return (result.get('gl_account') or None, result.get('action') or 'REVIEW')
+
+
+def _diff_chunk(chunk: List[dict]) -> tuple:
+    """Evaluate a chunk against both versions; return (count, changes)."""
+    old, new, memo = _worker['old'], _worker['new'], _worker['memo']
+    changes = []
+
+    for item in chunk:
+        input_data = build_batch_input(item)
+        key = tuple(input_data[field] for field in INPUT_KEY_FIELDS)
+
+        cached = memo.get(key)
+        if cached is None:
+            before = _outcome(old.evaluate(input_data).get('result', {}))
+            after = _outcome(new.evaluate(input_data).get('result', {}))
+            rules = None
+            if before != after:
+                # Only changed inputs pay for tracing, to recover the rule IDs
+                rules = (
+                    matched_rule_id(old.evaluate(input_data, {'trace': True}).get('trace')),
+                    matched_rule_id(new.evaluate(input_data, {'trace': True}).get('trace')),
+                )
+            cached = (before, after, rules)
+            if len(memo) < 500_000:
+                memo[key] = cached
+
+        before, after, rules = cached
+        if before == after:
+            continue
+
+        txn = item.get('transaction', {})
+        changes.append({
+            'transaction_id': txn.get('uuid') or txn.get('id'),
+            'merchant': input_data['merchant'],
+            'mcc': input_data['mcc'],
+            'amount': input_data['amount'],
+            'user_team': input_data['user_team'],
+            'old_account': before[0],
+            'old_action': before[1],
+            'old_rule': rules[0],
+            'new_account': after[0],
+            'new_action': after[1],
+            'new_rule': rules[1],
+        })
+
+    return len(chunk), changes
+
+
+def diff_rule_sets(
+    old_path: str,
+    new_path: str,
+    items: Iterable[dict],
+    workers: Optional[int] = None,
+    chunk_size: int = 5000,
+    on_change=None,
+) -> dict:
+    """
+    Evaluate two rule-set versions over `items` and summarize the differences.
+
+    Args:
+        old_path: Baseline rules (JDM JSON or DMN CSV)
+        new_path: Candidate rules (JDM JSON or DMN CSV)
+        items: classify_batch items to replay
+        workers: Worker processes (default: CPU count)
+        chunk_size: Items per work unit sent to a worker
+        on_change: Optional callback receiving each changed transaction;
+            when omitted, changes are collected into the report
+
+    Returns:
+        Report dict with totals, old->new transition counts and rule IDs
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    total = 0
+    changed = 0
+    collected = []
+    transitions = Counter()
+    transition_rules = defaultdict(Counter)
+
+    with Pool(workers, initializer=_init_worker, initargs=(old_path, new_path)) as pool:
+        for count, changes in pool.imap(_diff_chunk, iter_chunks(items, chunk_size)):
+            total += count
+            for change in changes:
+                changed += 1
+                pair = (change['old_account'], change['new_account'])
+                transitions[pair] += 1
+                transition_rules[pair][f"{change['old_rule']}->{change['new_rule']}"] += 1
+                if on_change:
+                    on_change(change)
+                else:
+                    collected.append(change)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'total': total,
+        'changed': changed,
+        'elapsed_seconds': round(elapsed, 3),
+        'transactions_per_second': round(total / elapsed, 1) if elapsed else None,
+        'transitions': [
+            {
+                'old_account': old_account,
+                'new_account': new_account,
+                'count': count,
+                'rules': dict(transition_rules[(old_account, new_account)]),
+            }
+            for (old_account, new_account), count in transitions.most_common()
+        ],
+    }
+    if not on_change:
+        report['changes'] = collected
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff two rule-set versions over a transaction history')
+    parser.add_argument('--old', type=str, required=True, help='Baseline rules (JDM JSON or DMN CSV)')
+    parser.add_argument('--new', type=str, required=True, help='Candidate rules (JDM JSON or DMN CSV)')
+    parser.add_argument('--history', type=str, required=True, help='History file (JSON array or NDJSON)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Transactions per work unit')
+    parser.add_argument('--changes', type=str, help='Write changed transactions as NDJSON to this file')
+
+    args = parser.parse_args()
+
+    changes_file = open(args.changes, 'w') if args.changes else None
+    try:
+        on_change = (lambda change: changes_file.write(json.dumps(change) + '\n')) if changes_file else None
+        report = diff_rule_sets(
+            args.old,
+            args.new,
+            iter_history(args.history),
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            on_change=on_change,
+        )
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if changes_file:
+            changes_file.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
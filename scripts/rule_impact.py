@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Rule-change impact index for selective re-classification.
+
+Stored transactions are grouped by their decision input (MCC, merchant,
+amount, team, state) and each group records every rule that can match it.
+When dmn_rules.csv changes, only groups where a removed/edited rule could
+have fired at or before the old winner, or where an added rule fires before
+the old winner, can classify differently. Only those are re-evaluated.
+
+Usage:
+    # Build the index for the current rules over a stored history
+    python rule_impact.py build --rules config/dmn_rules.csv --history history.ndjson --index impact.json
+
+    # Show which transactions a rule edit can affect
+    python rule_impact.py plan --index impact.json --new new_rules.csv
+
+    # Re-classify only the affected transactions and update the index
+    python rule_impact.py apply --index impact.json --new new_rules.csv --history history.ndjson
+"""
+
+import argparse
+import difflib
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from classify_transaction import build_batch_input, classify_batch
+from rule_diff import INPUT_KEY_FIELDS, iter_history
+from rule_model import Rule, load_rules
+
+
+def _rules_by_mcc(rules: List[Rule]) -> Dict[Optional[str], List[Rule]]:
+    """Bucket rules by their MCC literal (None = rule applies to any MCC)."""
+    buckets = defaultdict(list)
+    for rule in rules:
+        buckets[rule.exact_value('mcc')].append(rule)
+    return buckets
+
+
+def _candidates(buckets: Dict[Optional[str], List[Rule]], input_data: dict) -> List[int]:
+    """Return the indices of all rules matching input_data, in first-hit order."""
+    found = [
+        rule.index
+        for rule in buckets.get(input_data.get('mcc'), []) + buckets.get(None, [])
+        if rule.matches(input_data)
+    ]
+    return sorted(found)
+
+
+def _signature_key(signature: tuple) -> str:
+    return json.dumps(signature)
+
+
+class ImpactIndex:
+    """
+    Index from stored transactions to the rules that could apply to them.
+
+    groups maps an input key to {'input', 'transaction_ids', 'candidates'},
+    where candidates are rule indices into `signatures` (the rule set the
+    index was built against) and candidates[0] is the current winner.
+    """
+
+    def __init__(self, signatures: List[str], groups: Dict[str, dict]):
+        self.signatures = signatures
+        self.groups = groups
+
+    @classmethod
+    def build(cls, rules: List[Rule], items: Iterable[dict]) -> 'ImpactIndex':
+        """Build an index for `rules` over classify_batch items."""
+        buckets = _rules_by_mcc(rules)
+        groups = {}
+
+        for item in items:
+            input_data = build_batch_input(item)
+            key = json.dumps([input_data[name] for name in INPUT_KEY_FIELDS])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'input': input_data,
+                    'transaction_ids': [],
+                    'candidates': _candidates(buckets, input_data),
+                }
+            txn = item.get('transaction', {})
+            group['transaction_ids'].append(txn.get('uuid') or txn.get('id'))
+
+        return cls([_signature_key(rule.signature()) for rule in rules], groups)
+
+    @classmethod
+    def load(cls, path: str) -> 'ImpactIndex':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['signatures'], data['groups'])
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'signatures': self.signatures, 'groups': self.groups}, f)
+
+    def plan(self, new_rules: List[Rule]) -> dict:
+        """
+        Work out which groups a rule-set change can affect.
+
+        Rules are aligned by signature, so an edited row shows up as a
+        removal plus an addition and moved rows as both.
+
+        Returns:
+            Dict with 'affected' (group keys), 'remap' (old index -> new index
+            for unchanged rules), 'added' (new indices) and 'removed' (old indices)
+        """
+        new_signatures = [_signature_key(rule.signature()) for rule in new_rules]
+        matcher = difflib.SequenceMatcher(None, self.signatures, new_signatures, autojunk=False)
+
+        remap = {}
+        for block in matcher.get_matching_blocks():
+            for offset in range(block.size):
+                remap[block.a + offset] = block.b + offset
+
+        removed = {index for index in range(len(self.signatures)) if index not in remap}
+        kept_new = set(remap.values())
+        added = [rule for rule in new_rules if rule.index not in kept_new]
+        added_buckets = _rules_by_mcc(added)
+
+        affected = []
+        new_candidates = {}
+        for key, group in self.groups.items():
+            candidates = group['candidates']
+            winner = candidates[0] if candidates else None
+            added_hits = _candidates(added_buckets, group['input'])
+
+            changed = any(index in removed for index in candidates if winner is None or index <= winner)
+            if not changed and added_hits:
+                if winner is None:
+                    changed = True
+                else:
+                    changed = added_hits[0] < remap[winner]
+
+            if changed:
+                affected.append(key)
+            new_candidates[key] = sorted(
+                [remap[index] for index in candidates if index in remap] + added_hits
+            )
+
+        return {
+            'affected': affected,
+            'remap': remap,
+            'added': [rule.index for rule in added],
+            'removed': sorted(removed),
+            'new_signatures': new_signatures,
+            'new_candidates': new_candidates,
+        }
+
+    def affected_transaction_ids(self, plan: dict) -> set:
+        ids = set()
+        for key in plan['affected']:
+            ids.update(self.groups[key]['transaction_ids'])
+        return ids
+
+    def commit(self, plan: dict):
+        """Move the index onto the new rule set described by `plan`."""
+        self.signatures = plan['new_signatures']
+        for key, candidates in plan['new_candidates'].items():
+            self.groups[key]['candidates'] = candidates
+
+
+def reclassify_affected(
+    index: ImpactIndex,
+    new_rules_path: str,
+    items: Iterable[dict],
+) -> dict:
+    """
+    Re-classify only the stored transactions a rule change can affect.
+
+    Args:
+        index: Impact index built against the old rules
+        new_rules_path: New rules (JDM JSON or DMN CSV)
+        items: The stored history (classify_batch items)
+
+    Returns:
+        Dict with plan statistics and classify_batch results for affected rows
+    """
+    plan = index.plan(load_rules(new_rules_path))
+    affected_ids = index.affected_transaction_ids(plan)
+
+    subset = [
+        item for item in items
+        if (item.get('transaction', {}).get('uuid') or item.get('transaction', {}).get('id')) in affected_ids
+    ]
+    results = classify_batch(subset, new_rules_path) if subset else []
+    index.commit(plan)
+
+    return {
+        'rules_added': len(plan['added']),
+        'rules_removed': len(plan['removed']),
+        'groups_total': len(index.groups),
+        'groups_affected': len(plan['affected']),
+        'transactions_reclassified': len(results),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rule-change impact index for selective re-classification')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the index for the current rules')
+    build_parser.add_argument('--rules', type=str, required=True, help='Current rules (JDM JSON or DMN CSV)')
+    build_parser.add_argument('--history', type=str, required=True, help='History file (JSON array or NDJSON)')
+    build_parser.add_argument('--index', type=str, required=True, help='Index file to write')
+
+    plan_parser = subparsers.add_parser('plan', help='List transactions a rule change can affect')
+    plan_parser.add_argument('--index', type=str, required=True, help='Index file')
+    plan_parser.add_argument('--new', type=str, required=True, help='New rules (JDM JSON or DMN CSV)')
+
+    apply_parser = subparsers.add_parser('apply', help='Re-classify affected transactions and update the index')
+    apply_parser.add_argument('--index', type=str, required=True, help='Index file (updated in place)')
+    apply_parser.add_argument('--new', type=str, required=True, help='New rules (JDM JSON or DMN CSV)')
+    apply_parser.add_argument('--history', type=str, required=True, help='History file (JSON array or NDJSON)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            index = ImpactIndex.build(load_rules(args.rules), iter_history(args.history))
+            index.save(args.index)
+            output = {
+                'groups': len(index.groups),
+                'transactions': sum(len(g['transaction_ids']) for g in index.groups.values()),
+            }
+        elif args.command == 'plan':
+            index = ImpactIndex.load(args.index)
+            plan = index.plan(load_rules(args.new))
+            output = {
+                'rules_added': len(plan['added']),
+                'rules_removed': len(plan['removed']),
+                'groups_affected': len(plan['affected']),
+                'transaction_ids': sorted(index.affected_transaction_ids(plan)),
+            }
+        else:
+            index = ImpactIndex.load(args.index)
+            output = reclassify_affected(index, args.new, iter_history(args.history))
+            index.save(args.index)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Structured view of the first-hit classification rules.
+
+Parses the decision-table rows generated by convert_dmn_to_jdm.py back into
+plain conditions so tools can reason about rules (which inputs a rule can
+match, whether two versions differ) without going through zen.
+
+Rule.matches() mirrors the expressions the converter emits:
+    "5541"                               -> exact match on the column field
+    contains(upper(merchant), "SUNOCO")  -> case-insensitive substring
+    startsWith / endsWith / upper(x) ==  -> prefix / suffix / equality
+    amount >= 100.0, amount <= 500.0     -> inclusive amount bounds
+    merchant_flags.m12                   -> the merchant expression listed as
+                                            m12 in the table's merchantPatterns
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from convert_dmn_to_jdm import MERCHANT_FLAGS_FIELD, build_jdm, get_decision_rules, get_merchant_patterns
+
+# Decision-table columns that hold a literal compared to an input field
+EXACT_COLUMNS = ('mcc', 'user_team', 'user_email', 'state_match')
+
+# Decision-table columns that hold a full expression
+EXPRESSION_COLUMNS = ('merchant_expr', 'user_team_expr', 'user_email_expr')
+
+OUTPUT_COLUMNS = ('gl_account', 'gl_account_name', 'action', 'notes')
+
+_PATTERN_RE = re.compile(
+    r'(?:(contains|startsWith|endsWith)\(upper\((\w+)\), "([^"]*)"\)'
+    r'|upper\((\w+)\) == "([^"]*)")'
+)
+_AMOUNT_RE = re.compile(r'amount (>=|<=) (-?[\d.]+)')
+_FLAG_RE = re.compile(re.escape(MERCHANT_FLAGS_FIELD) + r'\.(\w+)')
+
+_PATTERN_OPS = {'contains': 'contains', 'startsWith': 'startswith', 'endsWith': 'endswith'}
+
+
+def _literal(value: str) -> str:
+    """Strip the quotes the converter wraps around literals."""
+    value = (value or '').strip()
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _match_pattern(op: str, text: str, value) -> bool:
+    if not isinstance(value, str):
+        return False
+    value = value.upper()
+    if op == 'contains':
+        return text in value
+    if op == 'startswith':
+        return value.startswith(text)
+    if op == 'endswith':
+        return value.endswith(text)
+    return value == text
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One decision-table row with its conditions parsed."""
+    rule_id: str
+    index: int
+    # (field, value) pairs compared with ==
+    exact: Tuple[Tuple[str, str], ...] = ()
+    # (field, op, TEXT) case-insensitive string tests, op in
+    # contains/startswith/endswith/equals
+    patterns: Tuple[Tuple[str, str, str], ...] = ()
+    amount_min: Optional[float] = None
+    amount_max: Optional[float] = None
+    outputs: dict = field(default_factory=dict, compare=False, hash=False)
+
+    def exact_value(self, name: str) -> Optional[str]:
+        """Return the exact-match value for an input field, if the rule has one."""
+        for field_name, value in self.exact:
+            if field_name == name:
+                return value
+        return None
+
+    def field_patterns(self, name: str) -> Tuple[Tuple[str, str], ...]:
+        """Return the (op, TEXT) string tests on an input field."""
+        return tuple((op, text) for field_name, op, text in self.patterns if field_name == name)
+
+    def signature(self) -> tuple:
+        """Hashable identity of the rule's conditions and outputs (ignores position)."""
+        return (
+            self.exact,
+            self.patterns,
+            self.amount_min,
+            self.amount_max,
+            tuple(self.outputs.get(name, '') for name in OUTPUT_COLUMNS),
+        )
+
+    def matches(self, input_data: dict) -> bool:
+        """Return True if every condition of the rule holds for input_data."""
+        for field_name, value in self.exact:
+            if input_data.get(field_name) != value:
+                return False
+
+        if self.amount_min is not None or self.amount_max is not None:
+            amount = input_data.get('amount')
+            if amount is None:
+                return False
+            if self.amount_min is not None and amount < self.amount_min:
+                return False
+            if self.amount_max is not None and amount > self.amount_max:
+                return False
+
+        for field_name, op, text in self.patterns:
+            if not _match_pattern(op, text, input_data.get(field_name)):
+                return False
+
+        return True
+
+
+def parse_rule(raw: dict, index: int, merchant_patterns: Optional[dict] = None) -> Rule:
+    """
+    Parse one JDM decision-table row produced by convert_dmn_to_jdm().
+
+    Args:
+        raw: The decision-table row
+        index: The row's position in the table
+        merchant_patterns: The table's {pattern ID: merchant expression},
+            used to resolve merchant_flags tests
+    """
+    exact = tuple(
+        (column, _literal(raw[column]))
+        for column in EXACT_COLUMNS
+        if _literal(raw.get(column, ''))
+    )
+
+    patterns = []
+    for column in EXPRESSION_COLUMNS:
+        expression = (raw.get(column) or '').strip()
+        if not expression:
+            continue
+        flag = _FLAG_RE.fullmatch(expression)
+        if flag:
+            if flag.group(1) not in (merchant_patterns or {}):
+                raise ValueError(f"{raw.get('_id')}: unknown merchant pattern {flag.group(1)}")
+            expression = merchant_patterns[flag.group(1)]
+        for clause in expression.split(' and '):
+            found = _PATTERN_RE.fullmatch(clause.strip())
+            if not found:
+                raise ValueError(f"{raw.get('_id')}: unsupported expression in {column}: {clause}")
+            if found.group(1):
+                patterns.append((found.group(2), _PATTERN_OPS[found.group(1)], found.group(3)))
+            else:
+                patterns.append((found.group(4), 'equals', found.group(5)))
+
+    amount_min = None
+    amount_max = None
+    for op, value in _AMOUNT_RE.findall(raw.get('amount_expr') or ''):
+        if op == '>=':
+            amount_min = float(value)
+        else:
+            amount_max = float(value)
+
+    return Rule(
+        rule_id=raw.get('_id', f'rule-{index + 1}'),
+        index=index,
+        exact=exact,
+        patterns=tuple(patterns),
+        amount_min=amount_min,
+        amount_max=amount_max,
+        outputs={name: _literal(raw.get(name, '')) for name in OUTPUT_COLUMNS},
+    )
+
+
+def parse_rules(jdm: dict) -> List[Rule]:
+    """Parse every rule of a JDM structure, in first-hit order."""
+    merchant_patterns = get_merchant_patterns(jdm)
+    return [parse_rule(raw, index, merchant_patterns) for index, raw in enumerate(get_decision_rules(jdm))]
+
+
+def load_rules(rules_path: str) -> List[Rule]:
+    """Load rules from a compiled JDM file or a DMN CSV."""
+    if str(rules_path).endswith('.csv'):
+        return parse_rules(build_jdm(rules_path))
+
+    with open(rules_path, 'r') as f:
+        return parse_rules(json.load(f))
+
+
+def first_match(rules: List[Rule], input_data: dict) -> Optional[Rule]:
+    """Return the first rule matching input_data (first-hit policy), or None."""
+    for rule in rules:
+        if rule.matches(input_data):
+            return rule
+    return None
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Hit-frequency rule reordering that preserves first-hit semantics.
+
+With a first-hit table every match costs a scan over the rows before it, so
+hot rules deep in the table (Revolution Laundry, gas stations) are paid for
+on every transaction. This tool:
+
+1. Counts per-rule hits by replaying a transaction history (or reads them
+   from trace_sampler NDJSON exports).
+2. Builds the conflict graph: an edge between two rules whose conditions
+   can both match some input. Rules are proven disjoint only when an exact
+   column differs, amount ranges do not intersect, or the string tests on a
+   field contradict each other (incompatible prefixes/suffixes, or an
+   equality the other tests reject); anything else counts as a conflict.
+3. Moves frequently hit rules forward as far as the graph allows and writes
+   the reordered JDM (rule `_id`s are kept, so traces still name the same
+   rules).
+
+Equivalence: every conflicting pair keeps its original relative order. For
+any input the rules that match it all pairwise conflict, so their relative
+order is unchanged and the first of them is the same rule in both tables.
+verify_order() checks that condition on the result, and the history is
+replayed through both orderings (and zen) as a second check.
+
+Rules examined per transaction is the matched rule's position (the table
+length for no match), averaged over the history.
+
+Usage:
+    python rule_reorder.py --history history.ndjson --output reordered.jdm.json
+    python rule_reorder.py --traces traces.ndjson --history history.ndjson --output reordered.jdm.json
+"""
+
+import argparse
+import heapq
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from classify_transaction import build_batch_input, load_decision
+from convert_dmn_to_jdm import build_jdm, get_decision_rules
+from rule_diff import iter_history
+from rule_model import Rule, _match_pattern, load_rules
+from rule_tree import CompiledRules
+from trace_sampler import matched_rule_id
+
+DEFAULT_RULES = str(Path(__file__).parent.parent / 'config' / 'classification_rules.jdm.json')
+
+
+def _text_compatible(tests: List[tuple], exact_values: Set[str]) -> bool:
+    """Whether one string can equal every exact value and pass every (op, TEXT) test."""
+    if len(exact_values) > 1:
+        return False
+    if exact_values:
+        value = next(iter(exact_values))
+        return all(_match_pattern(op, text, value) for op, text in tests)
+
+    equals = {text for op, text in tests if op == 'equals'}
+    if len(equals) > 1:
+        return False
+    if equals:
+        value = next(iter(equals))
+        return all(_match_pattern(op, text, value) for op, text in tests)
+
+    # Prefixes (and suffixes) must nest; then prefix + contains + suffix works
+    for op, method in (('startswith', str.startswith), ('endswith', str.endswith)):
+        texts = sorted((text for test_op, text in tests if test_op == op), key=len)
+        if any(not method(longer, shorter) for shorter, longer in zip(texts, texts[1:])):
+            return False
+    return True
+
+
+def rules_overlap(a: Rule, b: Rule) -> bool:
+    """
+    Whether some input can match both rules.
+
+    Returns True unless the rules are provably disjoint.
+    """
+    exact = {}
+    for field_name, value in a.exact + b.exact:
+        exact.setdefault(field_name, set()).add(value)
+    if any(len(values) > 1 for values in exact.values()):
+        return False
+
+    low = max((x for x in (a.amount_min, b.amount_min) if x is not None), default=None)
+    high = min((x for x in (a.amount_max, b.amount_max) if x is not None), default=None)
+    if low is not None and high is not None and low > high:
+        return False
+
+    tests = {}
+    for field_name, op, text in a.patterns + b.patterns:
+        tests.setdefault(field_name, []).append((op, text))
+    return all(_text_compatible(field_tests, exact.get(field_name, set())) for field_name, field_tests in tests.items())
+
+
+def conflict_graph(rules: List[Rule]) -> Dict[int, Set[int]]:
+    """Map each rule position to the positions of the rules it conflicts with."""
+    graph = {i: set() for i in range(len(rules))}
+    for i, a in enumerate(rules):
+        for j in range(i + 1, len(rules)):
+            if rules_overlap(a, rules[j]):
+                graph[i].add(j)
+                graph[j].add(i)
+    return graph
+
+
+def count_hits(rules: List[Rule], items: Iterable[dict]) -> tuple:
+    """
+    Replay classify_batch items through the rules.
+
+    Returns:
+        (Counter of rule_id hits, number of transactions no rule matched)
+    """
+    compiled = CompiledRules(rules)
+    hits = Counter()
+    misses = 0
+    for item in items:
+        rule = compiled.first_match(build_batch_input(item))
+        if rule is None:
+            misses += 1
+        else:
+            hits[rule.rule_id] += 1
+    return hits, misses
+
+
+def hits_from_traces(paths: List[str]) -> tuple:
+    """Read (hits, misses) from trace_sampler NDJSON exports."""
+    hits = Counter()
+    misses = 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rule_id = json.loads(line).get('rule_id')
+                if rule_id:
+                    hits[rule_id] += 1
+                else:
+                    misses += 1
+    return hits, misses
+
+
+def reorder(rules: List[Rule], hits: Dict[str, int], graph: Optional[Dict[int, Set[int]]] = None) -> List[int]:
+    """
+    Order rule positions so hot rules come early without reordering conflicts.
+
+    A conflicting earlier rule is a predecessor that must stay in front.
+    Each step schedules the unscheduled rule together with its unscheduled
+    predecessors that has the best hits per scheduled rule (a hot rule
+    behind a cold one pulls the cold one forward with it); inside that group,
+    the hottest available rule goes first. Rules without hits keep their
+    original order at the end.
+
+    Returns:
+        Original positions in the new order
+    """
+    graph = graph if graph is not None else conflict_graph(rules)
+    weight = [hits.get(rule.rule_id, 0) for rule in rules]
+    predecessors = [{j for j in graph[i] if j < i} for i in range(len(rules))]
+
+    # Transitive predecessors, built in original order (edges point forward)
+    ancestors = []
+    for i in range(len(rules)):
+        closure = set(predecessors[i])
+        for j in predecessors[i]:
+            closure |= ancestors[j]
+        ancestors.append(closure)
+
+    placed = set()
+    order = []
+
+    def place(group: Set[int]):
+        waiting = {i: len(predecessors[i] - placed) for i in group}
+        ready = [(-weight[i], i) for i, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        while ready:
+            _, i = heapq.heappop(ready)
+            placed.add(i)
+            order.append(i)
+            for j in graph[i]:
+                if j in waiting and j > i:
+                    waiting[j] -= 1
+                    if waiting[j] == 0:
+                        heapq.heappush(ready, (-weight[j], j))
+
+    while True:
+        best = None
+        for i in range(len(rules)):
+            if i in placed or not weight[i]:
+                continue
+            group = (ancestors[i] - placed) | {i}
+            ratio = sum(weight[j] for j in group) / len(group)
+            key = (ratio, weight[i], -i)
+            if best is None or key > best[0]:
+                best = (key, group)
+        if best is None:
+            break
+        place(best[1])
+
+    place(set(range(len(rules))) - placed)
+    return order
+
+
+def verify_order(rules: List[Rule], order: List[int], graph: Dict[int, Set[int]]):
+    """
+    Check that no conflicting pair changed relative order.
+
+    Raises:
+        ValueError: The order is not a permutation or swaps a conflicting pair
+    """
+    if sorted(order) != list(range(len(rules))):
+        raise ValueError("Reordering is not a permutation of the rules")
+    position = {rule_index: new_index for new_index, rule_index in enumerate(order)}
+    for i, conflicts in graph.items():
+        for j in conflicts:
+            if i < j and position[i] > position[j]:
+                raise ValueError(f"{rules[i].rule_id} and {rules[j].rule_id} can both match but were swapped")
+
+
+def rules_examined(rules: List[Rule], order: List[int], hits: Dict[str, int], misses: int) -> float:
+    """Average rules examined per transaction for a table in the given order."""
+    total = sum(hits.values()) + misses
+    if not total:
+        return 0.0
+    examined = sum(hits.get(rules[i].rule_id, 0) * (position + 1) for position, i in enumerate(order))
+    return (examined + misses * len(rules)) / total
+
+
+def load_jdm(rules_path: str) -> dict:
+    """Load a JDM file, or build one from a DMN CSV."""
+    if rules_path.endswith('.csv'):
+        return build_jdm(rules_path)
+    with open(rules_path) as f:
+        return json.load(f)
+
+
+def reordered_jdm(jdm: dict, order: List[int]) -> dict:
+    """Return a copy of the JDM with its decision-table rows in the new order."""
+    jdm = json.loads(json.dumps(jdm))
+    rows = get_decision_rules(jdm)
+    rows[:] = [rows[i] for i in order]
+    return jdm
+
+
+def replay_check(original_path: str, reordered_path: str, items: Iterable[dict], zen_limit: int = 2000) -> dict:
+    """
+    Replay items through both tables and compare the matched rules.
+
+    Every item is compared with the rule model; the first zen_limit items
+    are also evaluated by zen on both JDM files.
+    """
+    original = CompiledRules(load_rules(original_path))
+    reordered = CompiledRules(load_rules(reordered_path))
+    old_decision = load_decision(original_path)
+    new_decision = load_decision(reordered_path)
+
+    mismatched = zen_compared = 0
+    mismatches = []
+    for item in items:
+        input_data = build_batch_input(item)
+        old_rule = original.first_match(input_data)
+        new_rule = reordered.first_match(input_data)
+        old_id = old_rule.rule_id if old_rule else None
+        new_id = new_rule.rule_id if new_rule else None
+        if zen_compared < zen_limit:
+            zen_old = matched_rule_id(old_decision.evaluate(input_data, {'trace': True}).get('trace'))
+            zen_new = matched_rule_id(new_decision.evaluate(input_data, {'trace': True}).get('trace'))
+            zen_compared += 1
+            if zen_old != zen_new:
+                old_id, new_id = zen_old, zen_new
+        if old_id != new_id and len(mismatches) < 5:
+            mismatches.append({'input': input_data, 'original': old_id, 'reordered': new_id})
+        mismatched += old_id != new_id
+    return {'mismatches': mismatched, 'zen_compared': zen_compared, 'examples': mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reorder first-hit rules by hit frequency without changing results')
+    parser.add_argument('--jdm', type=str, default=DEFAULT_RULES, help='JDM file or DMN CSV to reorder')
+    parser.add_argument('--history', type=str, help='Transaction history to replay for hit counts (JSON array or NDJSON)')
+    parser.add_argument('--traces', type=str, nargs='+', help='trace_sampler NDJSON exports to take hit counts from')
+    parser.add_argument('--output', type=str, help='Write the reordered JDM here')
+    parser.add_argument('--zen-check', type=int, default=2000, help='History items also compared through zen')
+
+    args = parser.parse_args()
+    if not args.history and not args.traces:
+        parser.error('--history or --traces is required')
+
+    try:
+        rules = load_rules(args.jdm)
+        if args.traces:
+            hits, misses = hits_from_traces(args.traces)
+        else:
+            hits, misses = count_hits(rules, iter_history(args.history))
+
+        graph = conflict_graph(rules)
+        order = reorder(rules, hits, graph)
+        verify_order(rules, order, graph)
+
+        report = {
+            'rules': len(rules),
+            'conflicts': sum(len(conflicts) for conflicts in graph.values()) // 2,
+            'transactions': sum(hits.values()) + misses,
+            'rules_moved': sum(1 for position, i in enumerate(order) if position != i),
+            'avg_rules_examined_before': round(rules_examined(rules, list(range(len(rules))), hits, misses), 2),
+            'avg_rules_examined_after': round(rules_examined(rules, order, hits, misses), 2),
+            'top_rules': [
+                {'rule_id': rules[i].rule_id, 'hits': hits.get(rules[i].rule_id, 0), 'from': i + 1, 'to': position + 1}
+                for position, i in enumerate(order[:10])
+            ],
+        }
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(reordered_jdm(load_jdm(args.jdm), order), f, indent=2)
+            if args.history:
+                report['replay'] = replay_check(args.jdm, args.output, iter_history(args.history), args.zen_check)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(report, indent=2))
+    if report.get('replay', {}).get('mismatches'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Compiled decision-DAG evaluator for the first-hit classification rules.
+
+compile_rules() turns the rules produced by convert_dmn_to_jdm() (parsed with
+rule_model) into a DAG whose evaluation cost follows its depth instead of
+the number of rules:
+
+    ExactNode    one dict lookup per exact-match column (mcc, user_team,
+                 user_email, state_match); rules that leave the column empty
+                 are carried into every branch
+    AmountNode   one bisect over the sorted amount boundaries; each
+                 elementary interval holds the rules whose range covers it
+    Leaf         the remaining merchant / team / email patterns. "contains"
+                 tokens are found with one Aho-Corasick pass per field, and
+                 only rules anchored on a token that occurred are checked
+
+At every node, rules after the first one with no remaining conditions can
+never win under first-hit and are dropped. Identical sub-problems share one
+node, so the structure is a DAG rather than a tree.
+
+The compiled evaluator is checked against zen on a fuzzed corpus
+(tests/test_rule_tree.py and the --fuzz option below).
+
+Usage:
+    python rule_tree.py                         # compile and print DAG statistics
+    python rule_tree.py --fuzz 5000             # compare with zen on 5000 fuzzed inputs
+    python rule_tree.py --jdm rules.csv --fuzz 5000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from rule_model import EXACT_COLUMNS, Rule, _match_pattern, load_rules
+
+# Exact columns in branching order (most selective first)
+BRANCH_COLUMNS = EXACT_COLUMNS
+
+
+class TokenAutomaton:
+    """Aho-Corasick automaton reporting which tokens occur in a string."""
+
+    def __init__(self, tokens: Sequence[str]):
+        self.tokens = list(tokens)
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[FrozenSet[int]] = [frozenset()]
+
+        outputs = [set()]
+        for token_id, token in enumerate(self.tokens):
+            state = 0
+            for char in token:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append(set())
+                state = nxt
+            outputs[state].add(token_id)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                outputs[nxt] |= outputs[self.fail[nxt]]
+
+        self.output = [frozenset(ids) for ids in outputs]
+
+    def find(self, text: str) -> FrozenSet[int]:
+        """Return the IDs of all tokens occurring in text."""
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return frozenset(found)
+
+
+class Leaf:
+    """Remaining candidates, indexed by an anchor 'contains' token."""
+
+    __slots__ = ('rules', 'by_token', 'unanchored')
+
+    def __init__(self, rules: List[Rule], token_ids: Dict[Tuple[str, str], int]):
+        self.rules = rules
+        self.by_token: Dict[int, List[Rule]] = {}
+        self.unanchored: List[Rule] = []
+        for rule in rules:
+            anchor = next(
+                (token_ids[(field, text)] for field, op, text in rule.patterns if op == 'contains'),
+                None,
+            )
+            if anchor is None:
+                self.unanchored.append(rule)
+            else:
+                self.by_token.setdefault(anchor, []).append(rule)
+
+
+class ExactNode:
+    __slots__ = ('field', 'branches', 'default')
+
+    def __init__(self, field: str, branches: dict, default):
+        self.field = field
+        self.branches = branches
+        self.default = default
+
+
+class AmountNode:
+    __slots__ = ('bounds', 'segments', 'missing')
+
+    def __init__(self, bounds: List[float], segments: list, missing):
+        self.bounds = bounds
+        self.segments = segments
+        self.missing = missing
+
+
+class CompiledRules:
+    """First-hit rule table compiled into a decision DAG."""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        tokens = sorted({(field, text) for rule in rules for field, op, text in rule.patterns if op == 'contains'})
+        self.token_ids = {token: token_id for token_id, token in enumerate(tokens)}
+        self.token_fields = sorted({field for field, _ in tokens})
+        self.automata = {
+            field: TokenAutomaton([text for token_field, text in tokens if token_field == field])
+            for field in self.token_fields
+        }
+        # Automaton-local token IDs -> global token IDs, per field
+        self._global_ids = {
+            field: [self.token_ids[(field, text)] for token_field, text in tokens if token_field == field]
+            for field in self.token_fields
+        }
+        self._memo: Dict[tuple, object] = {}
+        self.nodes = 0
+        self.root = self._build(rules, frozenset())
+        self._memo = None
+
+    # -- compilation ------------------------------------------------------
+
+    @staticmethod
+    def _settled(rule: Rule, consumed: FrozenSet[str]) -> bool:
+        """True if the rule has no conditions left after the consumed columns."""
+        if rule.patterns:
+            return False
+        if (rule.amount_min is not None or rule.amount_max is not None) and 'amount' not in consumed:
+            return False
+        return all(field in consumed for field, _ in rule.exact)
+
+    def _build(self, rules: List[Rule], consumed: FrozenSet[str]):
+        # First-hit: nothing after an unconditional rule can win
+        for position, rule in enumerate(rules):
+            if self._settled(rule, consumed):
+                rules = rules[:position + 1]
+                break
+        if not rules:
+            return None
+
+        key = (tuple(rule.index for rule in rules), consumed)
+        node = self._memo.get(key)
+        if node is not None:
+            return node
+
+        field = next(
+            (
+                column for column in BRANCH_COLUMNS
+                if column not in consumed and any(rule.exact_value(column) is not None for rule in rules)
+            ),
+            None,
+        )
+        if field is not None:
+            node = self._build_exact(field, rules, consumed | {field})
+        elif 'amount' not in consumed and any(r.amount_min is not None or r.amount_max is not None for r in rules):
+            node = self._build_amount(rules, consumed | {'amount'})
+        else:
+            node = Leaf(rules, self.token_ids)
+
+        self.nodes += 1
+        self._memo[key] = node
+        return node
+
+    def _build_exact(self, field: str, rules: List[Rule], consumed: FrozenSet[str]) -> ExactNode:
+        values = {rule.exact_value(field) for rule in rules} - {None}
+        branches = {
+            value: self._build([r for r in rules if r.exact_value(field) in (None, value)], consumed)
+            for value in sorted(values)
+        }
+        default = self._build([r for r in rules if r.exact_value(field) is None], consumed)
+        return ExactNode(field, branches, default)
+
+    def _build_amount(self, rules: List[Rule], consumed: FrozenSet[str]) -> AmountNode:
+        bounds = sorted({b for r in rules for b in (r.amount_min, r.amount_max) if b is not None})
+
+        # Segment 2i+1 is the point bounds[i]; segment 2i is the open interval before it
+        representatives = []
+        for i, bound in enumerate(bounds):
+            previous = bounds[i - 1] if i else bound - 1.0
+            representatives.append((previous + bound) / 2)
+            representatives.append(bound)
+        representatives.append(bounds[-1] + 1.0)
+
+        def covers(rule: Rule, amount: float) -> bool:
+            return (
+                (rule.amount_min is None or amount >= rule.amount_min)
+                and (rule.amount_max is None or amount <= rule.amount_max)
+            )
+
+        segments = [self._build([r for r in rules if covers(r, amount)], consumed) for amount in representatives]
+        missing = self._build(
+            [r for r in rules if r.amount_min is None and r.amount_max is None], consumed
+        )
+        return AmountNode(bounds, segments, missing)
+
+    # -- evaluation -------------------------------------------------------
+
+    def _found_tokens(self, input_data: dict) -> FrozenSet[int]:
+        found = set()
+        for field in self.token_fields:
+            value = input_data.get(field)
+            if isinstance(value, str) and value:
+                global_ids = self._global_ids[field]
+                found.update(global_ids[token] for token in self.automata[field].find(value.upper()))
+        return frozenset(found)
+
+    def _leaf_match(self, leaf: Leaf, input_data: dict) -> Optional[Rule]:
+        found = self._found_tokens(input_data) if leaf.by_token else frozenset()
+        candidates = list(leaf.unanchored)
+        for token_id in found:
+            candidates.extend(leaf.by_token.get(token_id, ()))
+        candidates.sort(key=lambda rule: rule.index)
+
+        for rule in candidates:
+            for field, op, text in rule.patterns:
+                if op == 'contains':
+                    if self.token_ids[(field, text)] not in found:
+                        break
+                elif not _match_pattern(op, text, input_data.get(field)):
+                    break
+            else:
+                return rule
+        return None
+
+    def first_match(self, input_data: dict) -> Optional[Rule]:
+        """Return the first rule matching input_data (same as rule_model.first_match)."""
+        node = self.root
+        while node is not None:
+            if isinstance(node, ExactNode):
+                value = input_data.get(node.field)
+                node = node.branches.get(value, node.default) if isinstance(value, str) else node.default
+            elif isinstance(node, AmountNode):
+                amount = input_data.get('amount')
+                if amount is None:
+                    node = node.missing
+                else:
+                    position = bisect_left(node.bounds, amount)
+                    exact = position < len(node.bounds) and node.bounds[position] == amount
+                    node = node.segments[2 * position + 1 if exact else 2 * position]
+            else:
+                return self._leaf_match(node, input_data)
+        return None
+
+    def evaluate(self, input_data: dict) -> dict:
+        """Evaluate like zen's decision.evaluate(): {'result': outputs} ({} when nothing matches)."""
+        rule = self.first_match(input_data)
+        return {'result': dict(rule.outputs) if rule else {}, 'rule_id': rule.rule_id if rule else None}
+
+    def stats(self) -> dict:
+        """Return node counts and the maximum depth of the DAG."""
+        seen = {}
+
+        def depth(node) -> int:
+            if node is None or isinstance(node, Leaf):
+                return 0
+            if id(node) in seen:
+                return seen[id(node)]
+            children = list(node.branches.values()) + [node.default] if isinstance(node, ExactNode) \
+                else node.segments + [node.missing]
+            seen[id(node)] = 1 + max(depth(child) for child in children)
+            return seen[id(node)]
+
+        return {
+            'rules': len(self.rules),
+            'nodes': self.nodes,
+            'max_depth': depth(self.root),
+            'tokens': len(self.token_ids),
+        }
+
+
+def compile_rules(rules_path: str) -> CompiledRules:
+    """Compile a JDM file or DMN CSV into a CompiledRules DAG."""
+    return CompiledRules(load_rules(rules_path))
+
+
+def fuzz_inputs(rules: List[Rule], count: int, seed: int = 0) -> List[dict]:
+    """
+    Generate decision inputs that exercise the rules' values and boundaries.
+
+    Merchants are built from pattern texts with random noise around them,
+    amounts sit on and next to every boundary, and exact fields draw from
+    the rules' own values plus values no rule uses.
+    """
+    rng = random.Random(seed)
+    values = {column: sorted({v for r in rules for f, v in r.exact if f == column}) for column in EXACT_COLUMNS}
+    texts = sorted({(field, text) for r in rules for field, _, text in r.patterns})
+    bounds = sorted({b for r in rules for b in (r.amount_min, r.amount_max) if b is not None}) or [0.0]
+    noise = ['', ' ', '*', 'SQ *', ' #1234', ' 0004813209', 'XYZ ', ' LLC', 'ab']
+
+    def text_for(field: str) -> str:
+        choices = [text for f, text in texts if f == field]
+        if not choices or rng.random() < 0.15:
+            return rng.choice(['', 'UNKNOWN VENDOR', 'zz top'])
+        parts = rng.sample(choices, k=min(len(choices), rng.choice([1, 1, 1, 2])))
+        text = rng.choice(noise).join(parts) if len(parts) > 1 else parts[0]
+        if rng.random() < 0.5:
+            text = rng.choice(noise) + text + rng.choice(noise)
+        return text.lower() if rng.random() < 0.2 else text
+
+    def exact_for(column: str) -> str:
+        if values[column] and rng.random() < 0.75:
+            return rng.choice(values[column])
+        return rng.choice(['', '0000', 'Unknown'])
+
+    inputs = []
+    for _ in range(count):
+        bound = rng.choice(bounds)
+        input_data = {
+            'mcc': exact_for('mcc'),
+            'merchant': text_for('merchant'),
+            'amount': rng.choice([bound, bound - 0.01, bound + 0.01, rng.uniform(0, 2 * max(bounds) + 1)]),
+            'user_team': exact_for('user_team') if rng.random() < 0.7 else text_for('user_team'),
+            'state_match': exact_for('state_match'),
+        }
+        if rng.random() < 0.5:
+            input_data['user_email'] = exact_for('user_email') if rng.random() < 0.7 else text_for('user_email')
+        inputs.append(input_data)
+    return inputs
+
+
+def compare_with_zen(rules_path: str, inputs: List[dict]) -> dict:
+    """Evaluate inputs with zen (traced) and the compiled DAG and compare rule IDs."""
+    from classify_transaction import load_decision
+    from trace_sampler import matched_rule_id
+
+    decision = load_decision(rules_path)
+    compiled = compile_rules(rules_path)
+
+    start = time.perf_counter()
+    expected = [matched_rule_id(decision.evaluate(data, {'trace': True}).get('trace')) for data in inputs]
+    zen_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [compiled.evaluate(data)['rule_id'] for data in inputs]
+    tree_seconds = time.perf_counter() - start
+
+    mismatches = [
+        {'input': data, 'zen': want, 'tree': got}
+        for data, want, got in zip(inputs, expected, actual) if want != got
+    ]
+    return {
+        'inputs': len(inputs),
+        'matched': sum(rule_id is not None for rule_id in expected),
+        'mismatches': len(mismatches),
+        'examples': mismatches[:5],
+        'zen_us_per_input': zen_seconds * 1e6 / max(len(inputs), 1),
+        'tree_us_per_input': tree_seconds * 1e6 / max(len(inputs), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the rule table into a decision DAG')
+    parser.add_argument('--jdm', type=str, help='JDM file or DMN CSV (default: config/classification_rules.jdm.json)')
+    parser.add_argument('--fuzz', type=int, default=0, help='Compare with zen on this many fuzzed inputs')
+    parser.add_argument('--seed', type=int, default=0, help='Fuzz seed')
+
+    args = parser.parse_args()
+    rules_path = args.jdm or str(Path(__file__).parent.parent / 'config' / 'classification_rules.jdm.json')
+
+    try:
+        compiled = compile_rules(rules_path)
+        output = {'stats': compiled.stats()}
+        if args.fuzz:
+            output['fuzz'] = compare_with_zen(rules_path, fuzz_inputs(compiled.rules, args.fuzz, args.seed))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(output, indent=2))
+    if output.get('fuzz', {}).get('mismatches'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
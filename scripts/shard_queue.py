@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Sharded classification and journal-entry generation over a file-based work
+queue, for rebuilds too large for one host.
+
+A coordinator partitions the input by a stable hash of the near-duplicate
+key (merchant, amount, user; see near_duplicates.py) into shard files on a
+shared directory (NFS, SMB, or a local disk when the workers are local
+processes):
+
+    <queue>/manifest.json           shard count, lease length, rule packs,
+                                    near-duplicate history
+    <queue>/shards/shard-00007.ndjson   {"seq", "company", "item"} lines
+    <queue>/leases/shard-00007.lease    held while a worker processes it
+    <queue>/done/shard-00007.json       the shard's results
+
+Workers on any node claim a shard by creating its lease file exclusively
+(O_CREAT | O_EXCL), renew it with a heartbeat while they work and commit
+results with an atomic rename. A lease that has not been renewed for
+lease_seconds belongs to a lost worker and is reclaimed by the next worker
+that looks for work. Processing is deterministic (multi_company.process_company
+per company within the shard), so a shard that is occasionally processed
+twice after a reclaim produces the same file either way.
+
+merge() orders every row by its input position, so the merged output equals
+multi_company.process_companies() on the same input regardless of how many
+workers ran or which shard finished first.
+
+Usage:
+    # Coordinator: partition the input
+    python shard_queue.py init --queue /shared/rebuild --batch-file items.json --shards 64
+
+    # Each node (or several local processes to simulate nodes)
+    python shard_queue.py work --queue /shared/rebuild --processes 4
+
+    python shard_queue.py status --queue /shared/rebuild
+    python shard_queue.py merge --queue /shared/rebuild --output results.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from classify_transaction import as_batch_item
+from journal_entry_template import COMPANY_CONFIG, load_account_registry
+from merchant_normalizer import MerchantTable
+from multi_company import is_postable, process_company
+from near_duplicates import DEFAULT_WINDOW_HOURS, DuplicateIndex, duplicate_key, load_index
+from rule_diff import iter_json_records
+
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_SHARDS = 64
+DEFAULT_LEASE_SECONDS = 60
+
+
+def partition_key(item: dict, table: MerchantTable) -> str:
+    """
+    Stable partitioning key: the near-duplicate key.
+
+    Possible double-posts of one charge share it, so they land in the same
+    shard and are compared there exactly as in an unsharded run.
+    """
+    return json.dumps(duplicate_key(item.get('transaction', {}), table))
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Shard number for a key (CRC32, identical on every host and process)."""
+    return zlib.crc32(key.encode('utf-8')) % shards
+
+
+def _write_json_atomic(path: Path, data: dict):
+    # Unique temp name: workers on several hosts may commit the same shard
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Lease:
+    """A worker's claim on one shard."""
+
+    def __init__(self, queue: 'ShardQueue', shard: int, token: str):
+        self.queue = queue
+        self.shard = shard
+        self.token = token
+        self.path = queue.lease_path(shard)
+
+    def held(self) -> bool:
+        """Whether the lease file on disk is still ours."""
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('token') == self.token
+        except (OSError, ValueError):
+            return False
+
+    def renew(self) -> bool:
+        """Extend the lease; False if it was reclaimed by another worker."""
+        if not self.held():
+            return False
+        os.utime(self.path)
+        return True
+
+    def release(self):
+        """Drop the lease if it is still ours."""
+        if self.held():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a lease every third of its length until stopped."""
+
+    def __init__(self, lease: Lease, interval: float):
+        super().__init__(daemon=True)
+        self.lease = lease
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.lease.renew()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ShardQueue:
+    """A shard work queue rooted at a (shared) directory."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        manifest_path = self.root / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise ValueError(f"Not an initialized shard queue: {root}")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest['shards']
+        self.lease_seconds = self.manifest['lease_seconds']
+
+    @classmethod
+    def create(
+        cls,
+        root: str,
+        items: List[dict],
+        shards: int = DEFAULT_SHARDS,
+        company: Optional[str] = None,
+        rules_paths: Optional[Dict[str, str]] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        duplicate_history: Optional[str] = None,
+        window_hours: float = DEFAULT_WINDOW_HOURS,
+    ) -> 'ShardQueue':
+        """
+        Partition items into shard files and write the manifest.
+
+        Args:
+            root: Queue directory (must not hold a queue already)
+            items: classify_batch items or bare transactions, each with a
+                'company' key unless `company` is given
+            shards: Number of shards
+            company: Default company code for items without one
+            rules_paths: Optional company code -> rules file overrides
+            lease_seconds: How long a lease survives without a heartbeat
+            duplicate_history: Earlier transactions (JSON array or NDJSON on
+                the shared directory) every worker checks near-duplicates against
+            window_hours: Near-duplicate window
+        """
+        root_path = Path(root)
+        if (root_path / MANIFEST_FILE).exists():
+            raise ValueError(f"Shard queue already initialized: {root}")
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        for name in ('shards', 'leases', 'done'):
+            (root_path / name).mkdir(parents=True, exist_ok=True)
+
+        handles = {}
+        counts = [0] * shards
+        table = MerchantTable.load()
+        try:
+            for seq, record in enumerate(items):
+                item_company = record.get('company') or company
+                if item_company not in COMPANY_CONFIG:
+                    raise ValueError(f"Unknown company: {item_company}. Must be one of: {list(COMPANY_CONFIG.keys())}")
+                item = as_batch_item(record)
+                shard = shard_for(partition_key(item, table), shards)
+                handle = handles.get(shard)
+                if handle is None:
+                    handle = handles[shard] = open(root_path / 'shards' / f"shard-{shard:05d}.ndjson", 'w')
+                handle.write(json.dumps({'seq': seq, 'company': item_company, 'item': item}) + '\n')
+                counts[shard] += 1
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        # Written last: a queue is visible to workers only once complete
+        _write_json_atomic(root_path / MANIFEST_FILE, {
+            'shards': shards,
+            'lease_seconds': lease_seconds,
+            'rules_paths': rules_paths or {},
+            'duplicate_history': os.path.abspath(duplicate_history) if duplicate_history else None,
+            'window_hours': window_hours,
+            'counts': counts,
+            'items': sum(counts),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        return cls(root)
+
+    def shard_path(self, shard: int) -> Path:
+        return self.root / 'shards' / f"shard-{shard:05d}.ndjson"
+
+    def lease_path(self, shard: int) -> Path:
+        return self.root / 'leases' / f"shard-{shard:05d}.lease"
+
+    def done_path(self, shard: int) -> Path:
+        return self.root / 'done' / f"shard-{shard:05d}.json"
+
+    def is_done(self, shard: int) -> bool:
+        return self.done_path(shard).exists()
+
+    def pending(self) -> List[int]:
+        """Shards with input that have no committed results yet."""
+        return [
+            shard for shard, count in enumerate(self.manifest['counts'])
+            if count and not self.is_done(shard)
+        ]
+
+    def _lease_expired(self, shard: int) -> bool:
+        try:
+            return os.stat(self.lease_path(shard)).st_mtime + self.lease_seconds < time.time()
+        except FileNotFoundError:
+            return False
+
+    def _try_claim(self, shard: int, worker_id: str) -> Optional[Lease]:
+        token = f"{worker_id}:{uuid.uuid4().hex}"
+        try:
+            fd = os.open(self.lease_path(shard), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'worker': worker_id, 'token': token, 'claimed': time.time()}, f)
+        # Results may have been committed between the pending scan and the claim
+        if self.is_done(shard):
+            os.remove(self.lease_path(shard))
+            return None
+        return Lease(self, shard, token)
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        """
+        Claim a pending shard, reclaiming expired leases of lost workers.
+
+        Workers start scanning at different offsets so they rarely race for
+        the same lease file.
+
+        Returns:
+            The Lease, or None if every pending shard is leased to a live worker
+        """
+        pending = self.pending()
+        if not pending:
+            return None
+        offset = zlib.crc32(worker_id.encode('utf-8')) % len(pending)
+        ordered = pending[offset:] + pending[:offset]
+
+        for shard in ordered:
+            lease = self._try_claim(shard, worker_id)
+            if lease is not None:
+                return lease
+
+        for shard in ordered:
+            if not self._lease_expired(shard):
+                continue
+            # Renaming is atomic: exactly one worker moves the stale lease away
+            stale = self.lease_path(shard).with_name(f"{self.lease_path(shard).name}.{uuid.uuid4().hex}.expired")
+            try:
+                os.rename(self.lease_path(shard), stale)
+            except FileNotFoundError:
+                continue
+            os.remove(stale)
+            lease = self._try_claim(shard, worker_id)
+            if lease is not None:
+                return lease
+        return None
+
+    def read_shard(self, shard: int) -> List[dict]:
+        with open(self.shard_path(shard)) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def complete(self, lease: Lease, result: dict):
+        """Commit a shard's results atomically and drop the lease."""
+        _write_json_atomic(self.done_path(lease.shard), result)
+        lease.release()
+
+    def status(self) -> dict:
+        """Counts of done, leased, expired and waiting shards."""
+        now = time.time()
+        leases = []
+        for shard in self.pending():
+            try:
+                stat = os.stat(self.lease_path(shard))
+                with open(self.lease_path(shard)) as f:
+                    worker = json.load(f).get('worker')
+            except (OSError, ValueError):
+                continue
+            leases.append({
+                'shard': shard,
+                'worker': worker,
+                'age': round(now - stat.st_mtime, 1),
+                'expired': stat.st_mtime + self.lease_seconds < now,
+            })
+        pending = self.pending()
+        return {
+            'shards': sum(1 for count in self.manifest['counts'] if count),
+            'items': self.manifest['items'],
+            'done': sum(1 for count in self.manifest['counts'] if count) - len(pending),
+            'leased': leases,
+            'waiting': len(pending) - len(leases),
+        }
+
+    def merge(self) -> Dict[str, dict]:
+        """
+        Merge committed shard results in input order.
+
+        Returns:
+            Company code -> the same dict multi_company.process_company()
+            returns, identical to an unsharded run
+
+        Raises:
+            ValueError: Some shards have not been processed yet
+        """
+        pending = self.pending()
+        if pending:
+            raise ValueError(f"{len(pending)} shards not processed yet: {pending[:10]}")
+
+        rows = []
+        rules_paths = {}
+        for shard, count in enumerate(self.manifest['counts']):
+            if not count:
+                continue
+            with open(self.done_path(shard)) as f:
+                result = json.load(f)
+            rows.extend(result['rows'])
+            rules_paths.update(result['rules_paths'])
+        rows.sort(key=lambda row: row['seq'])
+
+        merged = {}
+        for row in rows:
+            company = row['company']
+            out = merged.get(company)
+            if out is None:
+                out = merged[company] = {
+                    'company': company,
+                    'rules_path': rules_paths[company],
+                    'classifications': [],
+                    'entries': [],
+                    'review': [],
+                    'unknown_accounts': [],
+                }
+            out['classifications'].append(row['classification'])
+            if row['entry'] is not None:
+                out['entries'].append(row['entry'])
+            else:
+                out['review'].append(row['classification'])
+
+        for company, out in merged.items():
+            registry = load_account_registry(company)
+            out['unknown_accounts'] = sorted({
+                line['account']
+                for entry in out['entries'] if 'accounts' in entry
+                for line in entry['accounts']
+                if line['account'] not in registry
+            })
+        return merged
+
+
+def process_shard(
+    records: List[dict],
+    rules_paths: Optional[Dict[str, str]] = None,
+    history: Optional[DuplicateIndex] = None,
+) -> dict:
+    """
+    Classify and build entries for one shard's records.
+
+    history is the near-duplicate index of earlier transactions, if any.
+
+    Returns:
+        {'rows': [{'seq', 'company', 'classification', 'entry'}], 'rules_paths'}
+        where entry is None for results that need review
+    """
+    rules_paths = rules_paths or {}
+    groups = {}
+    for record in records:
+        groups.setdefault(record['company'], []).append(record)
+
+    rows = []
+    used_rules = {}
+    for company, group in groups.items():
+        out = process_company(company, [record['item'] for record in group], rules_paths.get(company), history=history)
+        used_rules[company] = out['rules_path']
+        entries = iter(out['entries'])
+        for record, classification in zip(group, out['classifications']):
+            rows.append({
+                'seq': record['seq'],
+                'company': company,
+                'classification': classification,
+                'entry': next(entries) if is_postable(classification) else None,
+            })
+    rows.sort(key=lambda row: row['seq'])
+    return {'rows': rows, 'rules_paths': used_rules}
+
+
+def run_worker(
+    root: str,
+    worker_id: Optional[str] = None,
+    poll_seconds: float = 1.0,
+    max_shards: Optional[int] = None,
+) -> dict:
+    """
+    Claim and process shards until the queue is drained.
+
+    When every remaining shard is leased to another worker, the worker waits
+    and polls, so it takes over the shards of a worker that is lost.
+
+    Returns:
+        {'worker', 'shards', 'items', 'seconds'}
+    """
+    queue = ShardQueue(root)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    rules_paths = queue.manifest.get('rules_paths') or {}
+    history_path = queue.manifest.get('duplicate_history')
+    history = load_index(history_path, queue.manifest.get('window_hours', DEFAULT_WINDOW_HOURS)) if history_path else None
+    start = time.perf_counter()
+    processed = []
+    items = 0
+
+    while max_shards is None or len(processed) < max_shards:
+        lease = queue.claim(worker_id)
+        if lease is None:
+            if not queue.pending():
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        heartbeat = _Heartbeat(lease, queue.lease_seconds / 3)
+        heartbeat.start()
+        try:
+            records = queue.read_shard(lease.shard)
+            result = process_shard(records, rules_paths, history)
+            result['shard'] = lease.shard
+            result['worker'] = worker_id
+        finally:
+            heartbeat.stop()
+        queue.complete(lease, result)
+        processed.append(lease.shard)
+        items += len(records)
+
+    return {
+        'worker': worker_id,
+        'shards': processed,
+        'items': items,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_local_workers(root: str, processes: int, poll_seconds: float = 1.0) -> List[dict]:
+    """Run several worker processes on this host (simulating nodes)."""
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(run_worker, root, f"{socket.gethostname()}-local{i}", poll_seconds)
+            for i in range(processes)
+        ]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded classification over a file-based work queue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = subparsers.add_parser('init', help='Partition input into shards')
+    init_parser.add_argument('--queue', type=str, required=True, help='Queue directory (shared by all workers)')
+    init_parser.add_argument('--batch-file', type=str, required=True, help='Items (JSON array or NDJSON), each with "company"')
+    init_parser.add_argument('--company', type=str, choices=list(COMPANY_CONFIG.keys()), help='Company for items without one')
+    init_parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help='Number of shards')
+    init_parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS, help='Lease length without a heartbeat')
+    init_parser.add_argument('--rules', type=str, help='JSON {company: rules file} overrides')
+    init_parser.add_argument('--duplicate-history', type=str, help='Earlier transactions to check near-duplicates against (on the shared directory)')
+    init_parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS, help='Near-duplicate window in hours')
+
+    work_parser = subparsers.add_parser('work', help='Claim and process shards until the queue is drained')
+    work_parser.add_argument('--queue', type=str, required=True, help='Queue directory')
+    work_parser.add_argument('--processes', type=int, default=1, help='Local worker processes')
+    work_parser.add_argument('--worker-id', type=str, help='Worker name (default host-pid)')
+    work_parser.add_argument('--max-shards', type=int, help='Stop after this many shards')
+    work_parser.add_argument('--poll-seconds', type=float, default=1.0, help='Wait between claims when all shards are leased')
+
+    status_parser = subparsers.add_parser('status', help='Show shard progress')
+    status_parser.add_argument('--queue', type=str, required=True, help='Queue directory')
+
+    merge_parser = subparsers.add_parser('merge', help='Merge shard results in input order')
+    merge_parser.add_argument('--queue', type=str, required=True, help='Queue directory')
+    merge_parser.add_argument('--output', type=str, help='Output file (default stdout)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'init':
+            rules_paths = json.loads(args.rules) if args.rules else None
+            queue = ShardQueue.create(
+                args.queue, list(iter_json_records(args.batch_file)), args.shards, args.company, rules_paths, args.lease_seconds,
+                args.duplicate_history, args.window_hours,
+            )
+            print(json.dumps(queue.status(), indent=2))
+        elif args.command == 'work':
+            if args.processes > 1:
+                reports = run_local_workers(args.queue, args.processes, args.poll_seconds)
+            else:
+                reports = [run_worker(args.queue, args.worker_id, args.poll_seconds, args.max_shards)]
+            print(json.dumps(reports, indent=2))
+        elif args.command == 'status':
+            print(json.dumps(ShardQueue(args.queue).status(), indent=2))
+        elif args.command == 'merge':
+            merged = ShardQueue(args.queue).merge()
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(merged, f, indent=2)
+            else:
+                print(json.dumps(merged, indent=2))
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
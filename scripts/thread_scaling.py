@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Thread-safety check and throughput scaling for threaded classify_batch().
+
+classify_batch(..., workers=N) classifies contiguous chunks of a batch on a
+thread pool that shares one compiled ZEN decision:
+
+    - The decision (zen.ZenDecision) is only read after creation.
+      evaluate() copies its input into the engine before returning, so the
+      one decision can be evaluated from several threads at once.
+    - Each thread fills its own scratch input_data dict in place
+      (threading.local) instead of allocating one per item.
+    - Overlay lookups and trace sampling share mutable state and are
+      serialized with a lock; stage timings are summed per chunk and added
+      to profiling.STAGES by the calling thread.
+    - Chunks are mapped in order, so results keep input order.
+
+Whether threads add throughput depends on the host's cores and on
+evaluate() releasing the GIL while the engine runs; this script measures it
+rather than assuming it, and verifies the threaded results against a
+single-threaded run.
+
+Usage:
+    python thread_scaling.py --file items.json --workers 1,2,4,8
+    python thread_scaling.py --file transactions.ndjson --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+from typing import List, Optional
+
+from classify_transaction import classify_batch, load_decision, resolve_rules_path
+from rule_diff import iter_history
+
+
+def measure_scaling(
+    items: List[dict],
+    jdm_path: Optional[str] = None,
+    worker_counts=(1, 2, 4),
+    repeat: int = 3,
+) -> dict:
+    """
+    Time classify_batch() at each worker count and compare with one thread.
+
+    Args:
+        items: classify_batch items
+        jdm_path: Path to the JDM rules file (default: the shared rule pack)
+        worker_counts: Thread counts to measure; 1 is always included
+        repeat: Runs per worker count; the fastest is reported
+
+    Returns:
+        {'items', 'cpus', 'runs': [{'workers', 'seconds', 'items_per_sec',
+        'speedup', 'identical'}]} where identical says whether the threaded
+        results equal the single-threaded ones, in order
+    """
+    rules_path = jdm_path or resolve_rules_path()
+    load_decision(rules_path)
+
+    baseline = None
+    runs = []
+    for workers in sorted({1, *worker_counts}):
+        best = None
+        for _ in range(max(1, repeat)):
+            start = perf_counter()
+            results = classify_batch(items, rules_path, workers=workers)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        if baseline is None:
+            baseline = (best, results)
+        runs.append({
+            'workers': workers,
+            'seconds': round(best, 4),
+            'items_per_sec': round(len(items) / best, 1) if best else None,
+            'speedup': round(baseline[0] / best, 2) if best else None,
+            'identical': results == baseline[1],
+        })
+
+    return {'items': len(items), 'cpus': os.cpu_count(), 'runs': runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure threaded classify_batch scaling')
+    parser.add_argument('--file', type=str, required=True, help='classify_batch items (JSON array or NDJSON)')
+    parser.add_argument('--jdm', type=str, help='Path to JDM rules file')
+    parser.add_argument('--workers', type=str, default='1,2,4', help='Comma-separated thread counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per thread count (fastest is kept)')
+
+    args = parser.parse_args()
+
+    try:
+        items = list(iter_history(args.file))
+        worker_counts = [int(count) for count in args.workers.split(',') if count.strip()]
+        report = measure_scaling(items, args.jdm, worker_counts, args.repeat)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {e}"}), file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(report, indent=2))
+    if not all(run['identical'] for run in report['runs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
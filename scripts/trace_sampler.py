@@ -0,0 +1,164 @@
+"""
+Sampled zen tracing for rule telemetry.
+
+decision.evaluate(input, {'trace': True}) reports which decision-table row
+matched (traceData.rule._id, e.g. "rule-4") and how long each node took, but
+tracing every row of a large batch costs noticeably more than a plain
+evaluate. TraceSampler traces a configurable fraction of evaluations and
+keeps the samples in a bounded rolling buffer that can be exported as NDJSON.
+
+Sampled classify_transaction()/classify_batch() results carry:
+
+    rule_id        the matched rule ("rule-N"), None if no rule matched
+    matched_by     what the matched rule's conditions test (rule_attribution:
+                   mcc, merchant, other; none without a match)
+    trace_timings  per-node timings in microseconds
+
+Unsampled results attribute matched_by from the rule's notes (see
+convert_dmn_to_jdm.rule_result_record); a sampled result knows the rule
+that fired, so its matched_by (and, in classify_transaction(), the
+confidence derived from it) comes from that rule's conditions instead.
+Every other field is the same as for an unsampled evaluation.
+
+Usage:
+    python classify_transaction.py --batch "$(cat items.json)" --trace-rate 0.05 --trace-out traces.ndjson
+"""
+
+import json
+import os
+import random
+import re
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from rule_model import load_rules
+
+_DURATION_RE = re.compile(r'^\s*([\d.]+)\s*(ns|µs|us|ms|s)\s*$')
+_UNIT_TO_US = {'ns': 0.001, 'µs': 1.0, 'us': 1.0, 'ms': 1000.0, 's': 1_000_000.0}
+
+# rule_id -> matched_by, keyed by (path, mtime) like classify_transaction's decision cache
+_ATTRIBUTION_CACHE = {}
+
+
+def parse_duration_us(value: Optional[str]) -> Optional[float]:
+    """Convert a zen performance string ("418.8µs", "1.2ms") to microseconds."""
+    match = _DURATION_RE.match(value or '')
+    if not match:
+        return None
+    return float(match.group(1)) * _UNIT_TO_US[match.group(2)]
+
+
+def matched_rule_id(trace: Optional[dict]) -> Optional[str]:
+    """Return the _id of the decision-table row that matched, from a zen trace."""
+    for node in (trace or {}).values():
+        trace_data = node.get('traceData') or {}
+        rule = trace_data.get('rule') if isinstance(trace_data, dict) else None
+        if rule:
+            return rule.get('_id')
+    return None
+
+
+def node_timings(trace: Optional[dict]) -> Dict[str, Optional[float]]:
+    """Return {node name: microseconds} for every node in a zen trace, in order."""
+    nodes = sorted((trace or {}).values(), key=lambda node: node.get('order', 0))
+    return {node.get('name') or node.get('id'): parse_duration_us(node.get('performance')) for node in nodes}
+
+
+def rule_attribution(rules_path: str) -> Dict[str, str]:
+    """
+    Map each rule ID in a rules file to what it matches on.
+
+    A rule with an MCC condition is attributed to 'mcc', otherwise one with
+    a merchant pattern to 'merchant', otherwise 'other'.
+    """
+    key = (os.path.abspath(rules_path), os.path.getmtime(rules_path))
+    attribution = _ATTRIBUTION_CACHE.get(key)
+    if attribution is None:
+        attribution = {}
+        for rule in load_rules(rules_path):
+            if rule.exact_value('mcc'):
+                attribution[rule.rule_id] = 'mcc'
+            elif rule.field_patterns('merchant'):
+                attribution[rule.rule_id] = 'merchant'
+            else:
+                attribution[rule.rule_id] = 'other'
+        _ATTRIBUTION_CACHE[key] = attribution
+    return attribution
+
+
+class TraceSampler:
+    """Decides which evaluations to trace and keeps a rolling buffer of samples."""
+
+    def __init__(self, rate: float = 0.01, capacity: int = 1000, seed: Optional[int] = None):
+        """
+        Args:
+            rate: Fraction of evaluations to trace (0 disables, 1 traces all)
+            capacity: Samples kept in the rolling buffer (oldest dropped first)
+            seed: Seed for reproducible sampling
+        """
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Trace rate must be between 0 and 1, got {rate}")
+        self.rate = rate
+        self.samples = deque(maxlen=capacity)
+        self.rule_hits = Counter()
+        self.seen = 0
+        self.sampled = 0
+        self._random = random.Random(seed).random
+
+    def should_sample(self) -> bool:
+        """Return True if the next evaluation should be traced."""
+        self.seen += 1
+        if self.rate >= 1.0:
+            return True
+        return self.rate > 0.0 and self._random() < self.rate
+
+    def record(
+        self,
+        result: dict,
+        rules_path: str,
+        input_data: dict,
+        transaction_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Extract the matched rule and timings from a traced evaluate() result.
+
+        Returns:
+            Dict with rule_id, matched_by and trace_timings to merge into
+            the classification result
+        """
+        trace = result.get('trace')
+        rule_id = matched_rule_id(trace)
+        matches_on = rule_attribution(rules_path).get(rule_id, 'other') if rule_id else 'none'
+        timings = node_timings(trace)
+
+        self.sampled += 1
+        self.rule_hits[rule_id] += 1
+        self.samples.append({
+            'sampled_at': datetime.now().isoformat(timespec='seconds'),
+            'transaction_id': transaction_id,
+            'rule_id': rule_id,
+            'matched_by': matches_on,
+            'input': input_data,
+            'trace_timings': timings,
+            'total_us': parse_duration_us(result.get('performance')),
+        })
+
+        return {'rule_id': rule_id, 'matched_by': matches_on, 'trace_timings': timings}
+
+    def stats(self) -> dict:
+        """Return sampling counts and the matched-rule histogram of the samples."""
+        return {
+            'rate': self.rate,
+            'seen': self.seen,
+            'sampled': self.sampled,
+            'buffered': len(self.samples),
+            'rule_hits': dict(self.rule_hits.most_common()),
+        }
+
+    def export(self, path: str, append: bool = True) -> int:
+        """Write buffered samples as NDJSON and return how many were written."""
+        with open(path, 'a' if append else 'w') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample) + '\n')
+        return len(self.samples)
@@ -0,0 +1,160 @@
+"""
+Compact transaction record for batch classification and journal entries.
+
+A Bill.com transaction carries dozens of fields, but the classifier and the
+journal builder read about a dozen, each through chained fallbacks
+(`merchantCategoryCode or mcc`, `rawMerchantName or merchantName`). A
+TransactionRecord is built once per row with only those fields, the
+fallbacks already resolved, and no per-instance __dict__:
+
+    transaction_id   uuid or id (classification results)
+    cheque_no        id (journal entry cheque_no)
+    mcc              merchantCategoryCode or mcc
+    merchant         (rawMerchantName or merchantName).upper(), the decision input
+    raw_merchant     rawMerchantName or merchantName or merchant
+    merchant_name    merchantName or rawMerchantName or "Unknown" (entry titles)
+    amount, is_credit, user_email, user_team, state_match, budget
+    posting_date     occurredTime[:10]
+    transaction_date authorizedTime[:10], else posting_date
+
+classify_batch() and create_batch_entries() accept records anywhere they
+accept item dicts / transaction dicts. For code that still reads
+transactions as dicts (overlay keys, merchant annotation, LLM fallback),
+get() answers the original Bill.com keys from the record (the merchant
+keys all answer the resolved raw_merchant, so fallback chains over them
+give the same result as on the dict).
+
+Usage:
+    from transaction_record import iter_records
+    results = classify_batch(list(iter_records('transactions.ndjson')))
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+# Bill.com / classify_batch item keys answered by TransactionRecord.get()
+_ALIASES = {
+    'uuid': 'transaction_id',
+    'id': 'cheque_no',
+    'merchantCategoryCode': 'mcc',
+    'mcc': 'mcc',
+    'rawMerchantName': 'raw_merchant',
+    'merchantName': 'raw_merchant',
+    'merchant': 'raw_merchant',
+    'amount': 'amount',
+    'isCredit': 'is_credit',
+    'userEmail': 'user_email',
+    'user_team': 'user_team',
+    'state_match': 'state_match',
+    'budgetName': 'budget',
+    'billcom_budget': 'budget',
+    'occurredTime': 'posting_date',
+    'authorizedTime': 'transaction_date',
+}
+
+
+@dataclass(slots=True)
+class TransactionRecord:
+    """The fields of one transaction the classifier and journal builder use."""
+    transaction_id: Optional[str]
+    cheque_no: str
+    mcc: str
+    merchant: str
+    raw_merchant: str
+    merchant_name: str
+    amount: float
+    is_credit: bool
+    user_email: Optional[str]
+    user_team: str
+    state_match: str
+    budget: str
+    posting_date: str
+    transaction_date: str
+
+    @classmethod
+    def from_transaction(
+        cls,
+        txn: dict,
+        user_team: Optional[str] = None,
+        budget: Optional[str] = None,
+    ) -> 'TransactionRecord':
+        """
+        Build a record from a Bill.com transaction dict.
+
+        Args:
+            txn: Bill.com transaction
+            user_team: Employee team (default: the transaction's 'user_team')
+            budget: Bill.com budget name (default: the transaction's 'budgetName')
+        """
+        raw = txn.get('rawMerchantName') or txn.get('merchantName') or ''
+        occurred = txn.get('occurredTime') or ''
+        authorized = txn.get('authorizedTime') or ''
+        return cls(
+            transaction_id=txn.get('uuid') or txn.get('id'),
+            cheque_no=txn.get('id', ''),
+            mcc=txn.get('merchantCategoryCode') or txn.get('mcc', ''),
+            merchant=raw.upper(),
+            raw_merchant=raw or txn.get('merchant', ''),
+            merchant_name=txn.get('merchantName') or txn.get('rawMerchantName', 'Unknown'),
+            amount=float(txn.get('amount', 0)),
+            is_credit=bool(txn.get('isCredit', False)),
+            user_email=txn.get('userEmail'),
+            user_team=txn.get('user_team', '') if user_team is None else user_team,
+            state_match=txn.get('state_match', ''),
+            budget=txn.get('budgetName', '') if budget is None else budget,
+            posting_date=occurred[:10],
+            transaction_date=authorized[:10] or occurred[:10],
+        )
+
+    @classmethod
+    def from_item(cls, item: dict) -> 'TransactionRecord':
+        """Build a record from a classify_batch item or a bare transaction."""
+        if isinstance(item, TransactionRecord):
+            return item
+        if 'transaction' not in item:
+            return cls.from_transaction(item)
+        emp = item.get('employee', {})
+        return cls.from_transaction(
+            item['transaction'],
+            user_team=emp.get('team') or emp.get('department', ''),
+            budget=item.get('billcom_budget', ''),
+        )
+
+    def fill_input(self, input_data: dict) -> dict:
+        """Fill (and return) a decision input dict in place."""
+        input_data['mcc'] = self.mcc
+        input_data['merchant'] = self.merchant
+        input_data['amount'] = self.amount
+        input_data['user_team'] = self.user_team
+        input_data['state_match'] = self.state_match
+        return input_data
+
+    def get(self, key: str, default=None):
+        """Read a Bill.com transaction / classify_batch item key from the record."""
+        if key == 'transaction':
+            return self
+        if key == 'employee':
+            return {'team': self.user_team}
+        name = _ALIASES.get(key)
+        if name is None:
+            return default
+        value = getattr(self, name)
+        return default if value is None else value
+
+
+def decode_record(line: str) -> TransactionRecord:
+    """Decode one JSON transaction or classify_batch item into a record."""
+    return TransactionRecord.from_item(json.loads(line))
+
+
+def iter_records(path: str) -> Iterator[TransactionRecord]:
+    """Yield records from an NDJSON (streamed) or JSON array file."""
+    with open(path, 'r') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in f:
+                if line.strip():
+                    yield decode_record(line)
+        else:
+            for item in json.load(f):
+                yield TransactionRecord.from_item(item)
@@ -0,0 +1,65 @@
+"""
+Shared classify_batch item and rule-file fixtures for the tests.
+"""
+
+from pathlib import Path
+
+RULES_CSV = Path(__file__).parent.parent / "config" / "dmn_rules.csv"
+
+# An edited rule set: postal MCC 9402 moves to Office Expenses, a CHIPOTLE row shadows the
+# restaurant rules, and a new row catches UNKNOWN VENDOR
+RULE_EDITS = {
+    "replace": {
+        ",9402,,,,,,,,5210,Postal Expenses,AUTO_POST,Postal services (MCC)":
+            ",9402,,,,,,,,5239,Office Expenses,AUTO_POST,Postal services (MCC)",
+    },
+    "prepend": ["*CHIPOTLE*,,,,,,,,,5251,Meals and Entertainment,REVIEW,Chipotle"],
+    "append": ["*UNKNOWN*VENDOR*,,,,,,,,,5239,Office Expenses,REVIEW,Unknown vendor"],
+}
+
+# (MCC, raw merchant, base amount, Bill.com budget)
+MERCHANTS = [
+    ("5541", "SUNOCO 0004813209", 45.0, "Gas and Tolls"),
+    ("9402", "USPS PO 123", 12.0, "5210 - Postal Expenses"),
+    ("4112", "AMTRAK MOBILE", 146.0, "5216 - Travel Expenses"),
+    ("5812", "CHIPOTLE 1234", 18.5, ""),
+    ("5734", "GITHUB INC", 21.0, "5243 - Web Services"),
+    ("7399", "UNKNOWN VENDOR", 99.0, ""),
+]
+
+TEAMS = ("Admin", "Operations", "Sales")
+
+
+def make_item(uuid, merchant, mcc, amount, budget="", team="", **fields):
+    """A classify_batch item; extra keyword arguments become transaction fields."""
+    return {
+        "transaction": {
+            "uuid": uuid, "id": uuid, "rawMerchantName": merchant,
+            "merchantCategoryCode": mcc, "amount": amount, **fields,
+        },
+        "employee": {"team": team},
+        "billcom_budget": budget,
+    }
+
+
+def write_rules(path, replace=None, prepend=(), append=()):
+    """Write a copy of config/dmn_rules.csv with rows replaced, and rows added after the header and at the end."""
+    lines = RULES_CSV.read_text().splitlines()
+    for old, new in (replace or {}).items():
+        lines[lines.index(old)] = new
+    lines[1:1] = prepend
+    lines.extend(append)
+    Path(path).write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def make_items(count, **fields):
+    """count items with IDs t0, t1, ... cycling through MERCHANTS and TEAMS (distinct amounts); fields override the defaults."""
+    items = []
+    for i in range(count):
+        mcc, merchant, amount, budget = MERCHANTS[i % len(MERCHANTS)]
+        items.append(make_item(
+            f"t{i}", merchant, mcc, amount + i, budget, TEAMS[i % len(TEAMS)],
+            **{"merchantName": merchant, "occurredTime": "2025-03-04T10:00:00Z", **fields},
+        ))
+    return items
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the checkpointed backfill: an interrupted run resumes without
+duplicating or losing output.
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from backfill import Backfill, FileSource, iter_date_chunks
+
+START, END = "2025-01-01", "2025-06-30"
+
+
+def write_history(path):
+    merchants = [("SUNOCO 0004813209", "5541"), ("USPS PO 123", "9402"), ("ZZZ UNKNOWN", "0001")]
+    with open(path, "w") as f:
+        for i in range(120):
+            merchant, mcc = merchants[i % 3]
+            f.write(json.dumps({
+                "id": f"txn-{i}",
+                "rawMerchantName": merchant,
+                "merchantCategoryCode": mcc,
+                "amount": 10 + i,
+                "occurredTime": f"2025-{i % 6 + 1:02d}-{i % 28 + 1:02d}T12:00:00Z",
+                "user_team": "Delivery",
+            }) + "\n")
+
+
+def run(history, out_dir, progress=None, start=START, end=END):
+    chunks = list(iter_date_chunks(start, end))
+    backfill = Backfill("WCLI", start, end, out_dir, FileSource(history, chunks), history, progress=progress)
+    return backfill.run()
+
+
+def test_month_chunks_cover_range():
+    chunks = list(iter_date_chunks("2024-01-15", "2024-03-10"))
+    assert chunks == [("2024-01-15", "2024-01-31"), ("2024-02-01", "2024-02-29"), ("2024-03-01", "2024-03-10")]
+    assert list(iter_date_chunks("2024-01-01", "2024-01-10", chunk_days=4))[-1] == ("2024-01-09", "2024-01-10")
+
+
+def test_interrupted_run_resumes_exactly():
+    with tempfile.TemporaryDirectory() as tmp:
+        history = str(Path(tmp) / "history.ndjson")
+        write_history(history)
+
+        full = run(history, str(Path(tmp) / "full"))
+        assert full["stats"]["transactions"] == 120
+        assert len(full["completed"]) == 6
+
+        calls = []
+
+        def interrupt_after_two(status):
+            calls.append(status)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+
+        resumed_dir = Path(tmp) / "resumed"
+        try:
+            run(history, str(resumed_dir), progress=interrupt_after_two)
+        except KeyboardInterrupt:
+            pass
+
+        # A chunk that died before its checkpoint left partial output behind
+        with open(resumed_dir / "classifications.ndjson", "a") as f:
+            f.write('{"partial": true}\n')
+
+        resumed = run(history, str(resumed_dir))
+        assert resumed["completed"] == full["completed"]
+        assert resumed["stats"] == full["stats"]
+        for name in ("classifications.ndjson", "entries.ndjson"):
+            assert (resumed_dir / name).read_text() == (Path(tmp) / "full" / name).read_text()
+
+
+def test_copies_across_chunk_boundaries_are_flagged():
+    charge = {"rawMerchantName": "SUNOCO 0004813209", "merchantCategoryCode": "5541", "amount": 45.0,
+              "userEmail": "d@example.com", "state_match": "LOCAL", "user_team": "Delivery"}
+    records = [
+        dict(charge, id="early", occurredTime="2025-01-30T12:00:00Z"),  # more than a day before "b"
+        dict(charge, id="a", occurredTime="2025-01-31T23:50:00Z"),
+        dict(charge, id="b", occurredTime="2025-02-01T00:10:00Z"),
+        dict(charge, id="c", amount=46.0, occurredTime="2025-02-01T00:20:00Z"),
+    ]
+
+    def flags(out_dir):
+        with open(Path(out_dir) / "classifications.ndjson") as f:
+            return {row["transaction_id"]: (row.get("near_duplicate") or {}).get("duplicate_of") for row in map(json.loads, f)}
+
+    expected = {"early": None, "a": None, "b": "a", "c": None}
+    with tempfile.TemporaryDirectory() as tmp:
+        # A JSON array history is streamed and gives the same result as NDJSON
+        array_path = str(Path(tmp) / "history.json")
+        with open(array_path, "w") as f:
+            json.dump(records, f, indent=2)
+        ndjson_path = str(Path(tmp) / "history.ndjson")
+        with open(ndjson_path, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+        for path in (array_path, ndjson_path):
+            out_dir = str(Path(tmp) / Path(path).suffix[1:])
+            run(path, out_dir, start="2025-01-01", end="2025-02-28")
+            assert flags(out_dir) == expected
+
+        # Resuming at the February chunk still sees January's last transactions
+        def interrupt(status):
+            raise KeyboardInterrupt
+
+        resumed_dir = str(Path(tmp) / "resumed")
+        try:
+            run(ndjson_path, resumed_dir, progress=interrupt, start="2025-01-01", end="2025-02-28")
+        except KeyboardInterrupt:
+            pass
+        assert flags(resumed_dir) == {"early": None, "a": None}
+        assert run(ndjson_path, resumed_dir, start="2025-01-01", end="2025-02-28")["stats"]["transactions"] == 4
+        assert flags(resumed_dir) == expected
+
+
+if __name__ == "__main__":
+    test_month_chunks_cover_range()
+    test_interrupted_run_resumes_exactly()
+    test_copies_across_chunk_boundaries_are_flagged()
+    print("OK")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming Bill.com CSV export ingestion.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from billcom_csv import build_column_index, iter_chunks, iter_transactions, parse_amount, parse_date
+
+EXPORT = (
+    "﻿Transaction ID,Transaction Date,Merchant Name,Raw Merchant Name,MCC,Amount,Budget,User Email,Transaction Type\n"
+    "t1,2025-03-04,Sunoco,SUNOCO 0004813209,5541,\"$1,234.50\",Gas and Tolls,a@example.com,Purchase\n"
+    "t2,2025-03-05,\"Acme, \"\"Widgets\"\"\",,742,(5.00),,b@example.com,Refund\n"
+    "\n"
+    "t3,2025-03-06,USPS,USPS PO 123,9402,12.00,5210 - Postal Expenses,c@example.com,Purchase\n"
+)
+
+
+def write_export(tmp, text=EXPORT):
+    path = Path(tmp) / "export.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_rows_map_to_classifier_fields():
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = list(iter_transactions(write_export(tmp)))
+
+    assert [row["id"] for row in rows] == ["t1", "t2", "t3"]
+    assert rows[0]["rawMerchantName"] == "SUNOCO 0004813209"
+    assert rows[0]["amount"] == 1234.5
+    assert rows[0]["budgetName"] == "Gas and Tolls"
+    assert rows[0]["isCredit"] is False
+
+    # Quoted commas, missing raw merchant, short MCC and refunds
+    assert rows[1]["rawMerchantName"] == 'Acme, "Widgets"'
+    assert rows[1]["merchantCategoryCode"] == "0742"
+    assert rows[1]["amount"] == 5.0
+    assert rows[1]["isCredit"] is True
+
+
+def test_chunks_feed_classify_batch_items():
+    with tempfile.TemporaryDirectory() as tmp:
+        chunks = list(iter_chunks(write_export(tmp), chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[1][0]["billcom_budget"] == "5210 - Postal Expenses"
+    assert chunks[0][0]["transaction"]["userEmail"] == "a@example.com"
+
+
+def test_dates_become_iso_and_bad_rows_are_reported():
+    export = (
+        "Transaction ID,Transaction Date,Authorized Date,Merchant Name,Amount\n"
+        "t1,03/04/2025,3/3/2025 18:05,Sunoco,10\n"
+        "t2,2025-03-05T10:00:00Z,,Sunoco,11\n"
+        "t3,13/40/2025,,Sunoco,12\n"
+        "t4,last tuesday,,Sunoco,13\n"
+    )
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_export(tmp, export)
+        rows = list(iter_transactions(path, on_error=lambda line, message: errors.append((line, message))))
+        try:
+            list(iter_transactions(path))
+        except ValueError as e:
+            assert str(e).startswith("Line 4: occurredTime")
+        else:
+            raise AssertionError("unreadable date should be rejected")
+
+    assert [row["id"] for row in rows] == ["t1", "t2"]
+    assert rows[0]["occurredTime"] == "2025-03-04"
+    assert rows[0]["authorizedTime"] == "2025-03-03T18:05:00"
+    assert rows[1]["occurredTime"] == "2025-03-05T10:00:00Z"
+    assert "authorizedTime" not in rows[1]
+    assert [line for line, _ in errors] == [4, 5]
+    assert parse_date("2025-03-04") == "2025-03-04"
+
+
+def test_bare_state_and_type_headers_are_not_mapped():
+    index = build_column_index(["Amount", "State", "Type", "Merchant State", "Transaction Type"])
+    assert index == {0: "amount", 3: "merchantState", 4: "transactionType"}
+
+
+def test_parse_amount_formats():
+    assert parse_amount("$1,234.56") == 1234.56
+    assert parse_amount("(12.00)") == -12.0
+    assert parse_amount("") == 0.0
+
+
+if __name__ == "__main__":
+    test_rows_map_to_classifier_fields()
+    test_chunks_feed_classify_batch_items()
+    test_dates_become_iso_and_bad_rows_are_reported()
+    test_bare_state_and_type_headers_are_not_mapped()
+    test_parse_amount_formats()
+    print("OK")
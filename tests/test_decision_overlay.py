@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for promoting decision-overlay entries into dmn_rules.csv.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from convert_dmn_to_jdm import build_jdm
+from decision_overlay import DecisionOverlay
+from merchant_normalizer import MerchantTable
+
+from helpers import make_item
+
+CSV_PATH = str(Path(__file__).parent.parent / "config" / "dmn_rules.csv")
+
+
+def test_promotion_reproduces_overlay_decisions():
+    table = MerchantTable(aliases={"AMZN MKTP US": "AMAZON.COM"})
+    overlay = DecisionOverlay(merchant_table=table)
+    items = [
+        make_item("1", "AMZN MKTP US*1A2B3C4D5", "5942", 40, team="Admin"),
+        make_item("2", "Amazon.com*B833B1GI0", "5942", 25, team="Admin"),
+        make_item("3", "SQ *BLUE BOTTLE COFFEE", "5814", 9, team="Sales"),
+    ]
+    overlay.record(items[0]["transaction"], items[0]["employee"], "5239", "Office Expenses", source="human")
+    overlay.record(items[2]["transaction"], items[2]["employee"], "5213", "Meals", "REVIEW", source="llm")
+    # Same key as item 1 through the alias, with a different raw descriptor
+    assert overlay.lookup(items[1]["transaction"], items[1]["employee"])["gl_account"] == "5239"
+    assert overlay.entries["AMAZON.COM|5942|Admin"]["merchants"] == ["AMZN MKTP US", "AMAZON.COM"]
+
+    # Refused: no merchant (catch-all row), and an aliased key without recorded names
+    overlay.entries["||"] = {"gl_account": "9999", "hits": 50}
+    overlay.entries["SENDGRID|7372|"] = {"gl_account": "5243", "hits": 50}
+    table.aliases["TWILIO SENDGRID"] = "SENDGRID"
+
+    expected = [overlay.lookup(item["transaction"], item["employee"]) for item in items]
+    for entry in overlay.entries.values():
+        entry["hits"] = max(entry.get("hits", 0), 1)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmpdir, "dmn_rules.csv")
+        shutil.copy(CSV_PATH, csv_path)
+        rows = overlay.promote(min_hits=1, csv_path=csv_path)
+
+        assert [row["merchant_pattern"] for row in rows] == ["*AMZN*MKTP*US*", "*AMAZON.COM*", "*BLUE*BOTTLE*COFFEE*"]
+        assert not overlay.entries["||"].get("promoted")
+        assert not overlay.entries["SENDGRID|7372|"].get("promoted")
+        assert overlay.promote(min_hits=1, csv_path=csv_path) == []
+
+        jdm_path = os.path.join(tmpdir, "rules.jdm.json")
+        with open(jdm_path, "w") as f:
+            json.dump(build_jdm(csv_path), f)
+        results = classify_batch(items, jdm_path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    for entry, result in zip(expected, results):
+        assert result["gl_account"] == entry["gl_account"]
+        assert result["action"] == entry["action"]
+        assert result["notes"].startswith("Promoted overlay decision")
+
+
+if __name__ == "__main__":
+    test_promotion_reproduces_overlay_decisions()
+    print("OK")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming discrepancy sketches and incremental history reading.
+"""
+
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from discrepancy_stats import CountMinSketch, DiscrepancyStream, SpaceSaving
+from merchant_normalizer import MerchantTable
+from rule_diff import _iter_json_array, iter_history, iter_json_records
+
+from helpers import make_items
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def zipf_stream(count, keys, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return [f"k{key}" for key in rng.choices(range(keys), weights, k=count)]
+
+
+def test_sketch_error_bounds():
+    stream = zipf_stream(20000, 500)
+    truth = Counter(stream)
+
+    sketch = CountMinSketch(width=256, depth=4)
+    heavy = SpaceSaving(capacity=32)
+    for key in stream:
+        sketch.add(key)
+        heavy.add(key)
+
+    # Count-Min never undercounts; the overcount stays near e * N / width
+    overcounts = [sketch.estimate(key) - count for key, count in truth.items()]
+    assert min(overcounts) >= 0
+    assert sum(over > 2.72 * len(stream) / 256 for over in overcounts) <= len(truth) * 0.05
+
+    # Space-Saving brackets the true count with its error bound and keeps every key above N / capacity
+    for key, count, error in heavy.top(32):
+        assert count - error <= truth[key] <= count
+    tracked = {key for key, _, _ in heavy.top(32)}
+    assert {key for key, count in truth.items() if count > len(stream) / 32} <= tracked
+
+
+def test_json_arrays_are_read_incrementally():
+    records = [{"id": i, "amount": -3.5e10 + i, "note": "a,]b\"" * (i % 3)} for i in range(40)]
+    for indent in (None, 2):
+        text = json.dumps(records, indent=indent)
+        for read_size in (1, 3, 7, 64):
+            assert list(_iter_json_array(io.StringIO(text[1:]), read_size)) == records
+    for bad in ("[1 2]", "[1,", "["):
+        try:
+            list(_iter_json_array(io.StringIO(bad[1:]), 2))
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+
+    text = json.dumps(records)
+    stream = io.StringIO(text)
+    assert stream.read(1) == "["
+    assert next(_iter_json_array(stream, 64)) == records[0]
+    assert stream.tell() < len(text) / 4
+
+
+def test_stream_keys_by_canonical_merchant_without_growing_table():
+    items = make_items(12)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump([item["transaction"] for item in items], f)
+    try:
+        assert [item["transaction"]["id"] for item in iter_history(path)] == [f"t{i}" for i in range(12)]
+        assert len(list(iter_json_records(path))) == 12
+    finally:
+        os.unlink(path)
+
+    items[1]["billcom_budget"] = "5216 - Travel Expenses"
+    table = MerchantTable({"SUNOCO": 1}, {"USPS PO": "USPS"})
+    stats = DiscrepancyStream(width=64, capacity=8, merchant_table=table)
+    for item, result in zip(items, classify_batch(items, JDM_PATH)):
+        stats.observe(item, result)
+
+    summary = stats.summary()
+    assert summary["observed"] == 12
+    assert summary["discrepancies"] == sum(row["count"] for row in summary["pair"]) >= 1
+    assert {"key": "USPS", "count": 1, "max_error": 0, "discrepancy_rate": 0.5} in summary["merchant"]
+    assert stats.totals["merchant"].estimate("USPS") == 2
+    assert table.merchants == {"SUNOCO": 1} and not table.dirty
+
+
+if __name__ == "__main__":
+    test_sketch_error_bounds()
+    test_json_arrays_are_read_incrementally()
+    test_stream_keys_by_canonical_merchant_without_growing_table()
+    print("OK")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for pre-post validation of journal-entry batches.
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from entry_validation import parse_period, summarize_violations, validate_entries
+from journal_entry_template import create_batch_entries
+
+
+def make_entries(count, company="WCLI"):
+    items = [
+        {
+            "transaction": {"id": f"txn{i}", "merchantName": "Sunoco", "amount": 10 + i, "occurredTime": f"2025-10-{i + 1:02d}T10:00:00Z"},
+            "classification": {"gl_account": "5216", "gl_account_name": "Travel Expenses"},
+        }
+        for i in range(count)
+    ]
+    return create_batch_entries(items, company)
+
+
+def test_template_batch_is_valid():
+    entries = make_entries(5) + make_entries(2, "WCLC")
+    entries[5]["cheque_no"], entries[6]["cheque_no"] = "wclc-0", "wclc-1"
+    assert validate_entries(entries, parse_period("2025-10-01", "2025-10-31")) == []
+
+
+def test_all_violations_reported_together():
+    entries = make_entries(9)
+    entries[1]["accounts"][1]["account"] = "5216 - Travel Expenses - WCLC"  # other company's account
+    entries[2]["accounts"][0]["credit_in_account_currency"] = 1.0
+    entries[3]["cheque_no"] = "txn0"
+    entries[4]["cheque_no"] = ""
+    entries[5]["posting_date"] = "2025-10"
+    entries[6]["company"] = "Nowhere LLC"
+    entries[7]["posting_date"] = "2025-09-30"
+    entries[8] = {"error": "Cannot resolve account", "transaction_id": "txn8"}
+
+    violations = validate_entries(entries, ("2025-10-01", None))
+    assert [(v["index"], v["check"]) for v in violations] == [
+        (1, "unknown_account"),
+        (2, "unbalanced"),
+        (3, "duplicate_cheque_no"),
+        (4, "missing_cheque_no"),
+        (5, "bad_date"),
+        (6, "unknown_company"),
+        (7, "outside_period"),
+        (8, "build_error"),
+    ]
+    assert violations[0]["detail"].endswith("5216 - Travel Expenses - WCLC")
+    assert violations[1]["detail"] == "Debits 12.00 != credits 1.00"
+    assert violations[2]["cheque_no"] == "txn0"
+    assert summarize_violations(violations)["unbalanced"] == 1
+
+    try:
+        parse_period("2025-10-1", None)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("period bound should be rejected")
+
+
+def test_malformed_lines_are_violations():
+    entries = make_entries(5)
+    entries[0]["accounts"][0]["debit_in_account_currency"] = "12,00"
+    entries[1]["accounts"][1]["credit_in_account_currency"] = float("nan")
+    entries[2]["accounts"][1] = "5216 - Travel Expenses - WCLI"
+    entries[3]["accounts"] = {"account": "5216 - Travel Expenses - WCLI"}
+    entries[4]["accounts"][0]["debit_in_account_currency"] = [14]
+
+    violations = validate_entries(entries)
+    assert [(v["index"], v["check"]) for v in violations] == [
+        (0, "bad_amount"),
+        (1, "bad_amount"),
+        (2, "build_error"),
+        (3, "build_error"),
+        (4, "bad_amount"),
+    ]
+    assert violations[0]["detail"] == "Account line 0 debit is not a number: '12,00'"
+    assert violations[1]["detail"] == "Account line 1 credit is not a number: nan"
+    assert violations[2]["detail"] == "Account line 1 is not an object"
+    assert violations[3]["cheque_no"] == "txn3"
+
+
+if __name__ == "__main__":
+    test_template_batch_is_valid()
+    test_all_violations_reported_together()
+    test_malformed_lines_are_violations()
+    print("OK")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk ERPNext posting against a local Frappe stand-in server.
+"""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from erpnext_poster import BulkPoster, FrappeClient, summarize
+
+
+class FrappeStandIn:
+    """In-memory Journal Entry store speaking the Frappe REST endpoints the poster uses."""
+
+    def __init__(self, existing=(), fail_after_commit=0, unavailable=0, bulk_enabled=True, lookups_fail_after_post=False):
+        self.docs = {f"ACC-JV-{i}": {"name": f"ACC-JV-{i}", "cheque_no": cheque_no} for i, cheque_no in enumerate(existing)}
+        self.fail_after_commit = fail_after_commit  # store the docs, then answer 502
+        self.unavailable = unavailable  # answer 503 without storing
+        self.bulk_enabled = bulk_enabled
+        self.lookups_fail_after_post = lookups_fail_after_post  # GETs answer 503 once anything was posted
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stand_in.record(self, "GET")
+                if stand_in.lookups_fail_after_post and any(kind.startswith("POST") for kind in stand_in.requests):
+                    return self.reply(503, {"exception": "Service Unavailable"})
+                query = parse_qs(urlsplit(self.path).query)
+                (_, _, wanted), = json.loads(query["filters"][0])
+                with stand_in.lock:
+                    rows = [doc for doc in stand_in.docs.values() if doc["cheque_no"] in wanted]
+                self.reply(200, {"data": [{"name": d["name"], "cheque_no": d["cheque_no"]} for d in rows]})
+
+            def do_POST(self):
+                path = unquote(urlsplit(self.path).path)
+                stand_in.record(self, "POST " + path)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if path == "/api/method/frappe.client.insert_many":
+                    if not stand_in.bulk_enabled:
+                        return self.reply(404, {"exc_type": "DoesNotExistError"})
+                    docs = body["docs"]
+                elif path == "/api/resource/Journal Entry":
+                    docs = [body]
+                else:
+                    return self.reply(404, {})
+
+                with stand_in.lock:
+                    if stand_in.unavailable:
+                        stand_in.unavailable -= 1
+                        return self.reply(503, {"exception": "Service Unavailable"})
+                    if any(doc["accounts"][1]["account"].startswith("9999") for doc in docs):
+                        return self.reply(417, {"exc_type": "ValidationError", "exception": "Account 9999 does not exist"})
+                    names = []
+                    for doc in docs:
+                        name = f"ACC-JV-{len(stand_in.docs)}"
+                        stand_in.docs[name] = dict(doc, name=name)
+                        names.append(name)
+                    if stand_in.fail_after_commit:
+                        stand_in.fail_after_commit -= 1
+                        return self.reply(502, {"exception": "Bad Gateway"})
+
+                if len(docs) == 1 and path != "/api/method/frappe.client.insert_many":
+                    self.reply(200, {"data": {"name": names[0]}})
+                else:
+                    # Like Frappe, which collects the names in a set: no particular order
+                    self.reply(200, {"message": names[::-1]})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def record(self, handler, kind):
+        with self.lock:
+            self.requests.append(kind)
+            self.connections.add(handler.client_address)
+
+    def cheque_nos(self):
+        return sorted(doc["cheque_no"] for doc in self.docs.values())
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_entries(count, bad=()):
+    return [
+        {
+            "doctype": "Journal Entry",
+            "cheque_no": f"txn{i}",
+            "accounts": [
+                {"account": "2151 - Divvy Credit Card - WCLI", "credit_in_account_currency": 10.0},
+                {"account": ("9999 - Missing" if i in bad else "5216 - Travel Expenses - WCLI"), "debit_in_account_currency": 10.0},
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def post(server, entries, **options):
+    client = FrappeClient(server.url, "key", "secret", pool_size=options.get("concurrency", 4))
+    try:
+        return BulkPoster(client, backoff=0, **options).post(entries)
+    finally:
+        client.close()
+
+
+def test_bulk_posting_skips_existing_and_reuses_connections():
+    server = FrappeStandIn(existing=["txn1"])
+    try:
+        entries = make_entries(25)
+        entries.append(entries[3])
+        entries.append({"error": "Unknown company: XYZ", "transaction_id": "txn-bad"})
+
+        outcomes = post(server, entries, mode="bulk", bulk_size=10, concurrency=2)
+    finally:
+        server.close()
+
+    assert [o["cheque_no"] for o in outcomes[:25]] == [f"txn{i}" for i in range(25)]
+    assert summarize(outcomes) == {"created": 24, "exists": 1, "duplicate": 1, "invalid": 1}
+    assert outcomes[1]["name"] == "ACC-JV-0"
+    assert all(server.docs[o["name"]]["cheque_no"] == o["cheque_no"] for o in outcomes[:25])
+    assert server.cheque_nos() == sorted(f"txn{i}" for i in range(25))
+    assert server.requests.count("POST /api/method/frappe.client.insert_many") == 3
+    # Keep-alive pool: never more connections than the concurrency limit
+    assert len(server.connections) <= 2
+
+
+def test_retry_after_lost_response_does_not_duplicate():
+    server = FrappeStandIn(fail_after_commit=1, unavailable=1)
+    try:
+        outcomes = post(server, make_entries(6), mode="bulk", bulk_size=3, concurrency=1)
+    finally:
+        server.close()
+
+    assert summarize(outcomes) == {"created": 6}
+    assert server.cheque_nos() == sorted(f"txn{i}" for i in range(6))
+
+
+def test_failed_existence_check_stops_retries():
+    server = FrappeStandIn(fail_after_commit=1, lookups_fail_after_post=True)
+    try:
+        outcomes = post(server, make_entries(3), mode="bulk", concurrency=1)
+    finally:
+        server.close()
+
+    assert summarize(outcomes) == {"failed": 3}
+    assert all("Existence check failed" in o["error"] for o in outcomes)
+    # The entries landed once and were not posted again
+    assert server.requests.count("POST /api/method/frappe.client.insert_many") == 1
+    assert server.cheque_nos() == ["txn0", "txn1", "txn2"]
+
+
+def test_bad_entry_fails_alone_and_single_mode_fallback():
+    server = FrappeStandIn(bulk_enabled=False)
+    try:
+        outcomes = post(server, make_entries(5, bad={2}), mode="bulk", concurrency=3)
+    finally:
+        server.close()
+
+    assert [o["status"] for o in outcomes] == ["created", "created", "failed", "created", "created"]
+    assert "9999" in outcomes[2]["error"]
+    # One rejected insert_many, then one rejected single insert (not retried)
+    assert outcomes[2]["attempts"] == 2
+    assert server.cheque_nos() == ["txn0", "txn1", "txn3", "txn4"]
+
+
+if __name__ == "__main__":
+    test_bulk_posting_skips_existing_and_reuses_connections()
+    test_retry_after_lost_response_does_not_duplicate()
+    test_failed_existence_check_stops_retries()
+    test_bad_entry_fails_alone_and_single_mode_fallback()
+    print("OK")
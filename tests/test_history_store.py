@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the partitioned Parquet history store (requires pyarrow).
+"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from history_store import HistoryStore, row_to_transaction
+
+from helpers import make_items
+
+
+def make_transactions(count, month="2025-03"):
+    transactions = []
+    for item in make_items(count, occurredTime=f"{month}-04T10:00:00Z", authorizedTime=f"{month}-03T18:00:00Z"):
+        txn = dict(item["transaction"], budgetName=item["billcom_budget"], user_team=item["employee"]["team"])
+        transactions.append(txn)
+    return transactions
+
+
+def rows(store, table, **filters):
+    return [row for chunk in store.scan(table, **filters) for row in chunk]
+
+
+def test_round_trip_and_reimport():
+    root = tempfile.mkdtemp()
+    try:
+        store = HistoryStore(root)
+        march = make_transactions(6)
+        assert store.write_transactions(march, "WCLI", chunk_size=4) == 6
+        assert store.write_transactions(make_transactions(2, "2025-04"), "WCLI") == 2
+        assert store.partitions("transactions") == [("WCLI", "2025-03"), ("WCLI", "2025-04")]
+
+        stored = sorted(rows(store, "transactions", month="2025-03"), key=lambda row: int(row["transaction_id"][1:]))
+        restored = row_to_transaction(stored[0])
+        assert restored["id"] == "t0"
+        assert restored["rawMerchantName"] == march[0]["rawMerchantName"]
+        assert restored["amount"] == march[0]["amount"]
+        assert restored["occurredTime"] == "2025-03-04T10:00:00Z"
+        assert restored["authorizedTime"] == "2025-03-03T18:00:00Z"
+        assert str(stored[0]["posting_date"]) == "2025-03-04"
+        assert stored[1]["billcom_budget"] == march[1]["budgetName"]
+        assert stored[1]["user_team"] == march[1]["user_team"]
+
+        # Re-importing overlapping data replaces rows instead of duplicating them
+        march[0]["amount"] = 1.0
+        store.write_transactions(march[:3], "WCLI")
+        stored = rows(store, "transactions", company="WCLI", start="2025-03-01", end="2025-03-31")
+        assert sorted(row["transaction_id"] for row in stored) == [f"t{i}" for i in range(6)]
+        assert next(row for row in stored if row["transaction_id"] == "t0")["amount"] == 1.0
+        assert len(rows(store, "transactions", mcc=["5541"])) == 2  # t0 and t6
+
+        # Times are kept to the microsecond in UTC; the posting date is the UTC date
+        late = dict(march[1], id="late", uuid="late", occurredTime="2025-03-31T22:30:00.250-05:00", authorizedTime=None)
+        store.write_transactions([late], "WCLI")
+        stored = rows(store, "transactions", month="2025-04")
+        restored = row_to_transaction(next(row for row in stored if row["transaction_id"] == "late"))
+        assert restored["occurredTime"] == restored["authorizedTime"] == "2025-04-01T03:30:00.250000Z"
+        assert not any(row["transaction_id"] == "late" for row in rows(store, "transactions", month="2025-03"))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_classify_and_build_entries_in_chunks():
+    root = tempfile.mkdtemp()
+    try:
+        store = HistoryStore(root)
+        store.write_transactions(make_transactions(12), "WCLI")
+
+        stats = store.classify(company="WCLI", chunk_size=5)
+        assert stats == {"partitions": 1, "classified": 12}
+        classified = {row["transaction_id"]: row for row in rows(store, "classifications")}
+        assert len(classified) == 12
+        assert classified["t2"]["gl_account"] == "5216"
+        assert classified["t2"]["gl_account_name"] == "Travel Expenses"
+
+        # Re-classifying part of the month keeps the other rows
+        store.classify(company="WCLI", mcc=["4112"])
+        assert len(rows(store, "classifications")) == 12
+
+        chunks = list(store.read_classified("WCLI", "2025-03", ["AUTO_POST"], batch_size=2))
+        assert all(len(chunk) <= 2 for chunk in chunks)
+        auto_post = [row for chunk in chunks for row in chunk]
+        assert auto_post and all(row["action"] == "AUTO_POST" for row in auto_post)
+        assert all(row["raw_merchant_name"] for row in auto_post)
+
+        entries = [entry for chunk in store.build_entries(company="WCLI", chunk_size=2) for entry in chunk]
+        assert len(entries) == len(auto_post)
+        stored = {row["transaction_id"]: row for row in rows(store, "entries")}
+        assert stored["t2"]["expense_account"] == "5216 - Travel Expenses - WCLI"
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    test_round_trip_and_reimport()
+    test_classify_and_build_entries_in_chunks()
+    print("OK")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched LLM-fallback queue using the deterministic stub backend.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from llm_fallback import FallbackQueue, StubBackend
+
+from helpers import make_item
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+# Gas with no team -> REVIEW rule; unknown MCC/merchant -> no match
+ITEMS = [
+    make_item("1", "SUNOCO 0004813209", "5541", 50, "Maintenance - Trucks"),
+    make_item("2", "SUNOCO 0004886822", "5541", 59.99, "Maintenance - Trucks"),
+    make_item("3", "SUNOCO 0374411700", "5541", 45, "Maintenance - Trucks"),
+    make_item("4", "ACME WIDGETS 4411", "0001", 12, "5239 - Office Expenses", "Admin"),
+    make_item("5", "ACME WIDGETS 9812", "0001", 18, "5239 - Office Expenses", "Admin"),
+    make_item("6", "ACME WIDGETS 9812", "0001", 18, "5239 - Office Expenses", "Production"),
+    make_item("7", "REVOLUTION LAUNDRY", "7211", 250, "Coin Wash Fees", "Production"),
+]
+
+
+def test_fallback_deduplicates_and_fans_out():
+    results = classify_batch(ITEMS, JDM_PATH)
+    queue = FallbackQueue()
+    queued = queue.add_batch(ITEMS, results)
+
+    # Six fallbacks, but only three distinct (merchant, MCC, team) cases
+    assert queued == 6
+    assert len(queue.cases) == 3
+
+    backend = StubBackend()
+    stats = queue.resolve(backend)
+
+    assert backend.calls == 1
+    assert stats["unanswered"] == 0
+    for result in results[3:6]:
+        assert result["gl_account"] == "5239"
+        assert result["matched_by"] == "llm"
+        assert result["action"] == "REVIEW"
+    assert results[0]["gl_account"] == "Routine Maintenance on Trucks"
+
+    # Rule-matched results are untouched
+    assert results[6]["gl_account"] == "Coin Wash Fees"
+    assert "matched_by" not in results[6]
+
+
+def test_prompts_respect_size_bounds():
+    items = [make_item(str(i), f"VENDOR{chr(65 + i % 26)}{chr(65 + i // 26)} SHOP", "0001", 10, "") for i in range(60)]
+    queue = FallbackQueue(max_cases_per_prompt=25, max_prompt_chars=3000)
+    queue.add_batch(items, classify_batch(items, JDM_PATH))
+
+    prompts = queue.build_prompts()
+    assert sum(len(case_ids) for _, case_ids in prompts) == 60
+    for prompt, case_ids in prompts:
+        assert len(case_ids) <= 25
+        assert len(prompt) <= 3000
+
+
+class ReplyBackend:
+    """Backend returning canned replies, one per prompt."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def complete(self, prompt):
+        return json.dumps(self.replies.pop(0))
+
+
+def queue_for(items):
+    queue = FallbackQueue(max_cases_per_prompt=10)
+    results = classify_batch(items, JDM_PATH)
+    queue.add_batch(items, results)
+    return queue, results
+
+
+def test_malformed_answers_leave_cases_unresolved():
+    # Not an array: every case of the prompt stays unresolved
+    for reply in ({"case": 1, "gl_account": "5239"}, "5239", None):
+        queue, results = queue_for(ITEMS)
+        stats = queue.resolve(ReplyBackend(reply))
+        assert stats["unanswered"] == 3
+        assert all("Backend reply is not a JSON array" in result["fallback_error"] for result in results[:6])
+        assert all(result.get("matched_by") != "llm" for result in results)
+
+    # String case IDs are accepted; bad entries are counted and reported per case
+    queue, results = queue_for(ITEMS)
+    stats = queue.resolve(ReplyBackend([
+        "junk", 7, ["case", 1],
+        {"case": "2", "gl_account": "5239", "confidence": "MEDIUM"},
+        {"case": 1, "gl_account": 5239},
+        {"case": 3, "gl_account": "5239", "confidence": "SURE"},
+        {"case": True, "gl_account": "5239"},
+        {"case": 99, "gl_account": "5239"},
+    ]))
+    assert stats["invalid_answers"] == 7
+    assert stats["unanswered"] == 2
+    assert [result["gl_account"] for result in results[3:5]] == ["5239", "5239"]
+    assert "fallback_error" not in results[3]
+    assert "invalid gl_account" in results[0]["fallback_error"]
+    assert "invalid confidence" in results[5]["fallback_error"]
+
+
+if __name__ == "__main__":
+    test_fallback_deduplicates_and_fans_out()
+    test_prompts_respect_size_bounds()
+    test_malformed_answers_leave_cases_unresolved()
+    print("OK")
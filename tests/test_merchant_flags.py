@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for precomputed merchant pattern flags in the generated JDM.
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from convert_dmn_to_jdm import build_jdm, get_decision_rules, get_merchant_patterns
+from merchant_flags import MerchantFlagMatcher
+from rule_model import parse_rules
+
+CSV_PATH = str(Path(__file__).parent.parent / "config" / "dmn_rules.csv")
+
+
+def test_matcher_flags_only_matching_patterns():
+    matcher = MerchantFlagMatcher({
+        "m1": 'contains(upper(merchant), "USPS")',
+        "m2": 'startsWith(upper(merchant), "SQ *")',
+        "m3": 'contains(upper(merchant), "ENTERPRISE") and contains(upper(merchant), "DRU")',
+        "m4": 'upper(merchant) == "UBER"',
+        "m5": 'endsWith(upper(merchant), "UBER")',
+    })
+    assert matcher.flags("usps po 123") == {"m1": True}
+    assert matcher.flags("SQ *USPS KIOSK") == {"m1": True, "m2": True}
+    assert matcher.flags("ENTERPRISE RENT-A-CAR DRU") == {"m3": True}
+    assert matcher.flags("Uber") == {"m4": True, "m5": True}
+    assert matcher.flags("") == {}
+
+
+def test_flag_and_expression_jdms_parse_to_the_same_rules():
+    flagged = build_jdm(CSV_PATH)
+    inline = build_jdm(CSV_PATH, merchant_flags=False)
+
+    patterns = get_merchant_patterns(flagged)
+    assert patterns and get_merchant_patterns(inline) == {}
+    assert all(
+        not row["merchant_expr"] or row["merchant_expr"].startswith("merchant_flags.")
+        for row in get_decision_rules(flagged)
+    )
+    assert [rule.signature() for rule in parse_rules(flagged)] == [rule.signature() for rule in parse_rules(inline)]
+
+
+if __name__ == "__main__":
+    test_matcher_flags_only_matching_patterns()
+    test_flag_and_expression_jdms_parse_to_the_same_rules()
+    print("OK")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for filling state_match from merchant locations.
+"""
+
+import copy
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from merchant_location import fill_state_match, load_place_index
+from multi_company import process_company
+
+
+def test_locate_sources():
+    index = load_place_index()
+
+    def state(txn):
+        return index.locate(txn).state
+
+    assert state({"merchantLocation": {"city": "PHILADELPHIA", "state": "PA", "country": "US"}}) == "PA"
+    assert state({"merchantState": "Massachusetts"}) == "MA"
+    assert state({"merchantState": "MT"}) == "MT"
+    # City alone: resolved only when one place dominates the name
+    assert state({"merchantCity": "Lynn"}) == "MA"
+    assert state({"merchantCity": "St. Louis"}) == "MO"
+    assert state({"merchantCity": "Springfield"}) is None
+    # Descriptor: trailing city must exist in the trailing state
+    assert state({"rawMerchantName": "SUNOCO 0363 KING OF PRUSS PA 19406"}) == "PA"
+    assert state({"rawMerchantName": "WAWA 8115 PHILADELPHIA PA"}) == "PA"
+    assert state({"rawMerchantName": "LOWES #1234 IN"}) is None
+    assert state({"rawMerchantName": "AMAZON MKTP"}) is None
+    # Foreign countries are out of state; Canada is not California
+    place = index.locate({"merchantLocation": {"city": "TORONTO", "state": "ON", "country": "CA"}})
+    assert (place.state, place.country) == (None, "CA")
+
+
+def test_fill_state_match_per_company():
+    items = [
+        {"transaction": {"uuid": "a", "mcc": "5542", "rawMerchantName": "SUNOCO 0363 KING OF PRUSS PA", "amount": 40}, "employee": {"team": "Delivery"}},
+        {"transaction": {"uuid": "b", "mcc": "5542", "rawMerchantName": "SHELL", "merchantLocation": {"city": "LYNN", "state": "MA"}, "amount": 40}, "employee": {"team": "Delivery"}},
+        {"transaction": {"uuid": "c", "mcc": "5542", "rawMerchantName": "SHELL", "amount": 40}, "employee": {"team": "Delivery"}},
+        {"transaction": {"uuid": "d", "mcc": "5542", "rawMerchantName": "SHELL", "merchantState": "NJ", "state_match": "LOCAL", "amount": 40}, "employee": {"team": "Delivery"}},
+    ]
+
+    wcli, wclc = copy.deepcopy(items), copy.deepcopy(items)
+    assert fill_state_match(wcli, "WCLI") == {"LOCAL": 1, "OUT_OF_STATE": 1, "unresolved": 1, "supplied": 1}
+    assert [i["transaction"]["state_match"] for i in wcli] == ["LOCAL", "OUT_OF_STATE", "", "LOCAL"]
+    fill_state_match(wclc, "WCLC", overwrite=True)
+    assert [i["transaction"]["state_match"] for i in wclc] == ["OUT_OF_STATE", "LOCAL", "", "OUT_OF_STATE"]
+
+    # Local delivery fuel auto-posts; out-of-state and unknown go to review
+    out = process_company("WCLI", copy.deepcopy(items[:3]))
+    assert [r["action"] for r in out["classifications"]] == ["AUTO_POST", "REVIEW", "REVIEW"]
+    assert len(out["entries"]) == 1
+
+
+if __name__ == "__main__":
+    test_locate_sources()
+    test_fill_state_match_per_company()
+    print("OK")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for canonical merchant names and the persistent merchant ID table.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from merchant_normalizer import MerchantTable, normalize_merchant
+
+from helpers import make_items
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def test_normalize_strips_references():
+    assert normalize_merchant("SUNOCO 0004813209") == "SUNOCO"
+    assert normalize_merchant("JETBLUE 2792196311296") == "JETBLUE"
+    assert normalize_merchant("Amazon.com*B833B1GI0") == "AMAZON.COM"
+    assert normalize_merchant("GOOGLE*CLOUD ZPC8VJ") == "GOOGLE CLOUD"
+    assert normalize_merchant("GITHUB INC") == "GITHUB"
+    assert normalize_merchant("") == ""
+
+
+def test_brand_names_with_digits_are_kept():
+    assert normalize_merchant("1PASSWORD INC") == "1PASSWORD"
+    assert normalize_merchant("AUTODESK3D INC") == "AUTODESK3D"
+    assert normalize_merchant("7ELEVEN 12345") == "7ELEVEN"
+    assert normalize_merchant("PADDLE.NET* N8N CLOUD1") == "N8N"
+    assert normalize_merchant("#1234 STARBUCKS") == "STARBUCKS"
+    # Everything looks like a reference: keep the first word
+    assert normalize_merchant("12345 67890") == "12345"
+    assert len({normalize_merchant(raw) for raw in ("1PASSWORD INC", "AUTODESK3D INC", "GITHUB INC")}) == 3
+
+
+def test_ids_are_assigned_once_and_survive_save_and_load():
+    table = MerchantTable({"SUNOCO": 1, "JETBLUE": 3}, {"AMZN MKTP US": "AMAZON.COM"})
+
+    # Lookups never assign
+    assert table.lookup("USPS PO 123") == (None, "USPS PO")
+    assert not table.dirty
+
+    # Next ID is above the highest one, even with a gap
+    assert table.assign("AMZN MKTP US*1A2B3C4D5") == (4, "AMAZON.COM")
+    assert table.assign("Amazon.com*B833B1GI0") == (4, "AMAZON.COM")
+    assert table.assign("USPS PO 123") == (5, "USPS PO")
+    assert table.assign("SUNOCO 0004813209") == (1, "SUNOCO")
+    assert table.dirty
+
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        table.save(path)
+        loaded = MerchantTable.load(path)
+    finally:
+        os.unlink(path)
+
+    assert loaded.merchants == table.merchants
+    assert loaded.aliases == table.aliases
+    assert loaded.lookup("USPS PO 456") == (5, "USPS PO")
+    assert loaded.name(4) == "AMAZON.COM"
+    assert loaded.assign("CHIPOTLE 1234") == (6, "CHIPOTLE")
+
+
+def test_batch_annotation_does_not_grow_table():
+    table = MerchantTable({"SUNOCO": 7})
+    results = classify_batch(make_items(2), JDM_PATH, table)
+
+    assert (results[0]["merchant_id"], results[0]["merchant_canonical"]) == (7, "SUNOCO")
+    assert (results[1]["merchant_id"], results[1]["merchant_canonical"]) == (None, "USPS PO")
+    assert table.merchants == {"SUNOCO": 7}
+    assert not table.dirty
+
+
+if __name__ == "__main__":
+    test_normalize_strips_references()
+    test_brand_names_with_digits_are_kept()
+    test_ids_are_assigned_once_and_survive_save_and_load()
+    test_batch_annotation_does_not_grow_table()
+    print("OK")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the merchant n-gram similarity index.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from llm_fallback import FallbackQueue, StubBackend
+from merchant_similarity import MerchantIndex, build_index, merchant_ngrams
+
+from helpers import make_item, make_items
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def test_query_ranks_known_merchants():
+    assert merchant_ngrams("") == frozenset()
+    assert " RE" in merchant_ngrams("Revolution Laundry")
+
+    index = MerchantIndex()
+    assert index.add("REVOLUTION LAUNDRY", "Coin Wash Fees", "Coin Wash Fees", "rule-1")
+    assert index.add("AMTRAK", "5216", "Travel Expenses", "rule-2")
+    assert not index.add("Revolution Laundry", "Coin Wash Fees", None, "overlay:human")  # same pair
+    index.add_history(
+        [{"transaction": {"rawMerchantName": "HOME DEPOT 4411"}}, {"transaction": {"rawMerchantName": "HOME DEPOT 0988"}}],
+        [{"gl_account": "Building Maintenance", "action": "AUTO_POST"}, {"gl_account": "Building Maintenance", "action": "AUTO_POST"}],
+    )
+    assert len(index) == 3
+
+    best = index.query("REVOLUTON LAUNDRY 12")
+    assert best[0]["merchant"] == "REVOLUTION LAUNDRY"
+    assert best[0]["source"] == "rule-1"
+    assert 0.75 < best[0]["score"] < 1
+    assert index.query("REVOLUTION LAUNDRY")[0]["score"] == 1.0
+    assert index.query("HOMEDEPOT.COM")[0]["source"] == "history"
+    assert index.query("ZZZ QQQ") == []
+    assert len(index.query("AMTRAK MOBLE", top_k=5, min_score=0)) <= 3
+
+
+def test_batch_suggestions_and_local_settlement():
+    items = [
+        make_item("1", "REVOLUTON LAUNDRY", "0001", 250),
+        make_item("2", "REVOLUTON LAUNDRY", "0001", 180),
+        make_item("3", "REVOLUTION LAUNDRY", "7211", 250, "Coin Wash Fees", "Production"),
+        make_item("4", "ZZZ QQQ WIDGETS", "0001", 12, "5239 - Office Expenses", "Admin"),
+    ]
+    index = build_index(JDM_PATH)
+    results = classify_batch(items, JDM_PATH, similarity_index=index)
+
+    assert not results[0]["gl_account"]
+    assert results[0]["suggestions"][0]["gl_account"] == "Coin Wash Fees"
+    assert "suggestions" not in results[2]  # matched by a rule
+    assert results[3]["suggestions"] == []
+
+    queue = FallbackQueue()
+    assert queue.add_batch(items, results) == 3
+    assert queue.settle_similar(index, min_score=0.75) == 1
+
+    backend = StubBackend()
+    stats = queue.resolve(backend)
+    assert stats["settled_similar"] == 1
+    assert stats["cases"] == 1
+    for result in results[:2]:
+        assert result["gl_account"] == "Coin Wash Fees"
+        assert result["matched_by"] == "similar"
+        assert result["action"] == "REVIEW"
+    assert results[3]["matched_by"] == "llm"
+
+
+def test_build_index_reads_history_file():
+    items = make_items(12)
+    fd, path = tempfile.mkstemp(suffix=".ndjson")
+    with os.fdopen(fd, "w") as f:
+        for item in items:
+            f.write(json.dumps(dict(item["transaction"], budgetName=item["billcom_budget"], user_team=item["employee"]["team"])) + "\n")
+    try:
+        index = build_index(JDM_PATH, history=path)
+    finally:
+        os.unlink(path)
+
+    known = build_index(JDM_PATH)
+    expected = {(entry.merchant, entry.gl_account) for entry in known.entries}
+    results = classify_batch(items, JDM_PATH)
+    added = [entry for entry in index.entries if entry.source == "history"]
+    assert added and len(index) == len(known) + len(added)
+    for entry in added:
+        assert (entry.merchant, entry.gl_account) not in expected
+        assert any(result["gl_account"] == entry.gl_account for result in results)
+
+
+if __name__ == "__main__":
+    test_query_ranks_known_merchants()
+    test_batch_suggestions_and_local_settlement()
+    test_build_index_reads_history_file()
+    print("OK")
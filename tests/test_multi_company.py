@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent multi-company processing.
+"""
+
+import copy
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from journal_entry_template import load_account_registry
+from multi_company import group_by_company, process_companies
+
+from helpers import make_items, write_rules
+
+POSTAL_ROW = ",9402,,,,,,,,5210,Postal Expenses,AUTO_POST,Postal services (MCC)"
+
+
+def test_companies_keep_their_own_rules_registry_and_duplicates():
+    wcli = make_items(6)
+    # t0 again under a new ID five minutes later
+    wcli.append(copy.deepcopy(wcli[0]))
+    wcli[-1]["transaction"].update(id="t0b", uuid="t0b", occurredTime="2025-03-04T10:05:00Z")
+    wclc = make_items(6)
+    before = copy.deepcopy([wcli, wclc])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # WCLC's pack posts postage to an account its chart does not have
+        pack = write_rules(os.path.join(tmp, "dmn_rules.WCLC.csv"),
+                           replace={POSTAL_ROW: POSTAL_ROW.replace("5210,Postal Expenses", "5299,Courier Expenses")})
+        out = process_companies({"WCLI": wcli, "WCLC": wclc}, rules_paths={"WCLC": pack})
+
+    assert set(out) == {"WCLI", "WCLC"}
+    assert out["WCLC"]["rules_path"] == pack
+    assert out["WCLI"]["rules_path"].endswith("classification_rules.jdm.json")
+
+    def by_id(company):
+        return {r["transaction_id"]: r for r in out[company]["classifications"]}
+
+    assert by_id("WCLI")["t1"]["gl_account"] == "5210"
+    assert by_id("WCLC")["t1"]["gl_account"] == "5299"
+
+    # Entries use each company's accounts; only WCLC's pack produced an unknown one
+    for company in ("WCLI", "WCLC"):
+        accounts = {line["account"] for entry in out[company]["entries"] for line in entry["accounts"]}
+        assert all(account.endswith(f" - {company}") for account in accounts)
+        assert accounts - load_account_registry(company) == set(out[company]["unknown_accounts"])
+    assert out["WCLI"]["unknown_accounts"] == []
+    assert out["WCLC"]["unknown_accounts"] == ["5299 - Courier Expenses - WCLC"]
+
+    # The copy is flagged and held for review; the same charge in the other company is not
+    flag = by_id("WCLI")["t0b"]["near_duplicate"]
+    assert flag == {"duplicate_of": "t0", "seconds_apart": 300, "source": "batch"}
+    assert by_id("WCLI")["t0b"]["action"] == "REVIEW"
+    assert [e["cheque_no"] for e in out["WCLI"]["entries"]].count("t0") == 1
+    assert not any(r.get("near_duplicate") for r in out["WCLC"]["classifications"])
+
+    # state_match was filled on copies, not on the caller's items
+    assert [wcli, wclc] == before
+
+
+def test_group_by_company_rejects_unknown_companies():
+    items = make_items(3)
+    for item, company in zip(items, ("WCLI", "WCLC", "WCLI")):
+        item["company"] = company
+    grouped = group_by_company(items)
+    assert [[item["transaction"]["id"] for item in grouped[c]] for c in ("WCLI", "WCLC")] == [["t0", "t2"], ["t1"]]
+
+    items[1]["company"] = "ACME"
+    try:
+        group_by_company(items)
+    except ValueError as e:
+        assert "ACME" in str(e)
+    else:
+        raise AssertionError("accepted an unknown company")
+
+
+if __name__ == "__main__":
+    test_companies_keep_their_own_rules_registry_and_duplicates()
+    test_group_by_company_rejects_unknown_companies()
+    print("OK")
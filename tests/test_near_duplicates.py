@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for near-duplicate transaction detection.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from backfill import Backfill, FileSource, iter_date_chunks
+from multi_company import process_companies, process_company
+from near_duplicates import DuplicateIndex, find_near_duplicates, load_index, transaction_time
+from shard_queue import ShardQueue, run_worker
+
+from helpers import make_items
+
+
+def txn(uuid, merchant, amount, user, time, **extra):
+    return {"uuid": uuid, "id": uuid, "rawMerchantName": merchant, "amount": amount, "userEmail": user, "authorizedTime": time, **extra}
+
+
+def test_transaction_time_formats():
+    expected = 1741082400.0  # 2025-03-04T10:00:00 UTC
+    for value in ("2025-03-04T10:00:00Z", "2025-03-04T10:00:00+00:00", "2025-03-04T10:00:00", "2025-03-04T05:00:00-05:00"):
+        assert transaction_time({"authorizedTime": value}) == expected
+    assert transaction_time({"occurredTime": "2025-03-04T10:00:00.000Z"}) == expected
+    assert transaction_time({"authorizedTime": "03/04/2025"}) is None
+    assert transaction_time({"authorizedTime": 1741082400}) is None
+    assert transaction_time({}) is None
+
+
+def test_batch_and_history_windows():
+    g, m = "g@washcyclelaundry.com", "martintracey74@gmail.com"
+    batch = [
+        txn("1", "AMTRAK MOBILE 0412", 146, g, "2025-03-04T10:00:00Z"),
+        txn("2", "AMTRAK MOBILE 7731", 146, g, "2025-03-04T10:05:00Z"),  # same charge, new ID
+        txn("5", "REVOLUTION LAUNDRY", 250, m, "2025-03-05T09:00:00Z"),
+        txn("6", "REVOLUTION LAUNDRY", 250, m, "2025-03-08T09:00:00Z"),  # three days later: a new purchase
+        txn("7", "REVOLUTION LAUNDRY", 250, g, "2025-03-05T09:01:00Z"),  # other user
+        txn("8", "REVOLUTION LAUNDRY", 250, m, "2025-03-05T09:02:00Z", isCredit=True),  # refund
+        txn("9", "REVOLUTION LAUNDRY", 250, m, None),  # no time
+        txn("10", "REVOLUTION LAUNDRY", 250, m, "2025-03-04T23:00:00Z"),  # earlier copy of 5
+    ]
+    flags = find_near_duplicates([{"transaction": t} for t in batch])
+    assert flags[1] == {"duplicate_of": "1", "seconds_apart": 300, "source": "batch"}
+    assert flags[2] == {"duplicate_of": "10", "seconds_apart": 36000, "source": "batch"}
+    assert [i for i, flag in enumerate(flags) if flag] == [1, 2]
+
+    history = DuplicateIndex(window_hours=24)
+    history.add([txn("h1", "SUNOCO 0004813209", 60, g, "2025-02-28T18:00:00Z"), batch[0]])
+    later = [
+        txn("s1", "SUNOCO 0009999999", 60, g, "2025-03-01T08:00:00Z"),
+        batch[0],  # already in history under its own ID: not a duplicate of itself
+    ]
+    flags = find_near_duplicates(later, history)
+    assert flags == [{"duplicate_of": "h1", "seconds_apart": 50400, "source": "history"}, None]
+
+
+def test_flagged_items_go_to_review():
+    items = [
+        {"transaction": txn(f"t{i}", "SUNOCO 1234", 45, "d@example.com", f"2025-03-04T10:{i:02d}:00Z",
+                            merchantCategoryCode="5542", state_match="LOCAL", occurredTime="2025-03-05T00:00:00Z"),
+         "employee": {"team": "Delivery"}}
+        for i in range(2)
+    ]
+    out = process_company("WCLI", items)
+    assert [r["action"] for r in out["classifications"]] == ["AUTO_POST", "REVIEW"]
+    assert out["classifications"][1]["near_duplicate"]["duplicate_of"] == "t0"
+    assert [e["cheque_no"] for e in out["entries"]] == ["t0"]
+
+    out = process_company("WCLI", items, dedupe=False)
+    assert len(out["entries"]) == 2
+
+
+def test_history_index_reaches_every_pipeline():
+    items = make_items(6)
+    # Earlier copies of t0 and t3 under other IDs, an hour before
+    earlier = [dict(items[i]["transaction"], id=f"old{i}", uuid=f"old{i}", occurredTime="2025-03-04T09:00:00Z") for i in (0, 3)]
+    expected = [f"old{i}" if i in (0, 3) else None for i in range(6)]
+
+    def flagged(classifications):
+        return [(r.get("near_duplicate") or {}).get("duplicate_of") for r in classifications]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history_path = os.path.join(tmp, "posted.ndjson")
+        with open(history_path, "w") as f:
+            f.writelines(json.dumps(txn) + "\n" for txn in earlier)
+        index = load_index(history_path)
+        assert len(index) == 2
+
+        assert flagged(process_company("WCLI", items)["classifications"]) == [None] * 6
+        assert flagged(process_company("WCLI", items, history=index)["classifications"]) == expected
+        assert flagged(process_companies({"WCLI": items}, max_workers=1, history=index)["WCLI"]["classifications"]) == expected
+
+        source_path = os.path.join(tmp, "source.ndjson")
+        with open(source_path, "w") as f:
+            f.writelines(json.dumps(dict(item["transaction"], budgetName=item["billcom_budget"])) + "\n" for item in items)
+        chunks = list(iter_date_chunks("2025-03-01", "2025-03-31"))
+        out_dir = os.path.join(tmp, "backfill")
+        Backfill("WCLI", "2025-03-01", "2025-03-31", out_dir, FileSource(source_path, chunks), source_path,
+                 history=index, history_name=history_path).run()
+        with open(os.path.join(out_dir, "classifications.ndjson")) as f:
+            assert flagged(json.loads(line) for line in f) == expected
+
+        queue_dir = os.path.join(tmp, "queue")
+        queue = ShardQueue.create(queue_dir, items, shards=3, company="WCLI", duplicate_history=history_path)
+        run_worker(queue_dir, "w1", poll_seconds=0.01)
+        assert flagged(queue.merge()["WCLI"]["classifications"]) == expected
+
+
+if __name__ == "__main__":
+    test_transaction_time_formats()
+    test_batch_and_history_windows()
+    test_flagged_items_go_to_review()
+    test_history_index_reaches_every_pipeline()
+    print("OK")
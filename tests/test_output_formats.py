@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for field projection and the streaming output formats.
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import pytest
+
+from output_formats import (
+    ENTRY_COLUMNS, RESULT_COLUMNS, CsvWriter, NdjsonWriter, ParquetWriter, get_path, parse_fields, project, write_output,
+)
+
+ENTRY = {
+    "cheque_no": "abc",
+    "accounts": [
+        {"account": "2151 - Divvy Credit Card - WCLI", "credit_in_account_currency": 5.0},
+        {"account": "5216 - Travel Expenses - WCLI", "debit_in_account_currency": 5.0},
+    ],
+    "discrepancy": None,
+}
+
+
+def test_dotted_projection():
+    fields = parse_fields("cheque_no, accounts.1.account,accounts.5.account,discrepancy.reason")
+    assert project(ENTRY, fields) == {
+        "cheque_no": "abc",
+        "accounts.1.account": "5216 - Travel Expenses - WCLI",
+        "accounts.5.account": None,
+        "discrepancy.reason": None,
+    }
+    assert get_path(ENTRY, "accounts.-1.debit_in_account_currency") == 5.0
+    assert project(ENTRY, None) is ENTRY
+
+
+def test_ndjson_and_csv_stream_one_row_per_record():
+    stream = io.StringIO()
+    writer = NdjsonWriter(stream, ["cheque_no"])
+    writer.write(ENTRY)
+    writer.write(ENTRY)
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == [{"cheque_no": "abc"}] * 2
+
+    stream = io.StringIO()
+    writer = CsvWriter(stream)
+    writer.write(ENTRY)
+    writer.close()
+    header, row = stream.getvalue().splitlines()
+    assert header.split(",")[:3] == ["cheque_no", "accounts", "discrepancy"]
+    assert set(ENTRY_COLUMNS) <= set(header.split(","))
+    assert row.startswith('abc,"[{""account""')
+
+    # With fields, rows stream before close()
+    stream = io.StringIO()
+    writer = CsvWriter(stream, ["cheque_no", "discrepancy.reason"])
+    writer.write(ENTRY)
+    assert stream.getvalue().splitlines() == ["cheque_no,discrepancy.reason", "abc,"]
+
+
+def test_csv_streams_with_default_columns():
+    stream = io.StringIO()
+    writer = CsvWriter(stream, sample_size=1)
+    writer.write({"transaction_id": "1", "gl_account": "5216"})
+    # Header written after the sample; later rows stream, optional result keys included
+    writer.write({"transaction_id": "2", "gl_account": "5216", "erpnext_account": "5216 - Travel Expenses - WCLI"})
+    assert len(stream.getvalue().splitlines()) == 3
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert list(rows[0])[:2] == ["transaction_id", "gl_account"] and set(RESULT_COLUMNS) <= set(rows[0])
+    assert rows[0]["erpnext_account"] == ""
+    assert rows[1]["erpnext_account"] == "5216 - Travel Expenses - WCLI"
+
+    # Unknown keys after the header are an error, never dropped
+    try:
+        writer.write({"transaction_id": "3", "surprise": 1})
+    except ValueError as e:
+        assert "surprise" in str(e)
+    else:
+        raise AssertionError("unknown field should be rejected")
+
+
+def test_parquet_batches_keep_types():
+    pq = pytest.importorskip("pyarrow.parquet")
+    records = [
+        {"transaction_id": str(i), "amount": amount, "has_discrepancy": flag, "count": count}
+        for i, (amount, flag, count) in enumerate([(146, True, 1), (250, None, 2), (59.99, "", 3.5), (12.5, False, 4)])
+    ]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for fields in (["transaction_id", "amount", "has_discrepancy", "count"], None):
+            path = os.path.join(tmpdir, "out.parquet")
+            writer = ParquetWriter(path, fields, batch_size=2)
+            for record in records:
+                writer.write(record)
+            writer.close()
+            table = pq.read_table(path)
+            assert table.column("amount").to_pylist() == [146.0, 250.0, 59.99, 12.5]
+            assert table.column("has_discrepancy").to_pylist() == [True, None, None, False]
+            assert table.column("count").to_pylist() == [1.0, 2.0, 3.5, 4.0]
+
+        # A value that does not fit its column is an error, not a cast
+        writer = ParquetWriter(os.path.join(tmpdir, "bad.parquet"), ["has_discrepancy"], batch_size=1)
+        writer.write({"has_discrepancy": True})
+        try:
+            writer.write({"has_discrepancy": "no"})
+        except ValueError as e:
+            assert "has_discrepancy" in str(e)
+        else:
+            raise AssertionError("string should not be stored in a bool column")
+        writer.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_json_output_streams_same_text():
+    records = [ENTRY, {"cheque_no": "def", "accounts": []}]
+    for output, fields in ((records, None), ([], None), (records, ["cheque_no"]), (ENTRY, None)):
+        expected = json.dumps(
+            [project(r, fields) for r in output] if isinstance(output, list) else project(output, fields), indent=2
+        )
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            written = write_output(iter(output) if isinstance(output, list) else output, "json", fields, path)
+            with open(path) as f:
+                assert f.read() == expected + "\n"
+        finally:
+            os.unlink(path)
+        assert written == (len(output) if isinstance(output, list) else 1)
+
+
+if __name__ == "__main__":
+    test_dotted_projection()
+    test_ndjson_and_csv_stream_one_row_per_record()
+    test_csv_streams_with_default_columns()
+    test_parquet_batches_keep_types()
+    test_json_output_streams_same_text()
+    print("OK")
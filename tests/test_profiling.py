@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the --timings stage summary and the --profile output files.
+"""
+
+import io
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import classify_transaction
+from profiling import STAGES, StackSampler
+
+from helpers import make_items
+
+SUMMARY_KEYS = {"stage", "calls", "total_ms", "per_call_us", "per_item_us", "percent"}
+
+
+def run_classify(*args, count=8):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    argv, sys.argv = sys.argv, ["classify_transaction.py", "--batch", json.dumps(make_items(count)), *args]
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            classify_transaction.main()
+    finally:
+        sys.argv = argv
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def test_timings_summary_shape():
+    STAGES.reset()
+    stdout, stderr = run_classify("--timings")
+
+    # Results stay parseable on stdout; the table goes to stderr
+    assert len(json.loads(stdout)) == 8
+    lines = stderr.strip().splitlines()
+    assert lines[0].split() == ["stage", "calls", "total", "ms", "us/call", "us/item", "%"]
+    assert lines[-1].startswith("items: 8 ")
+    stages = {line.split()[0]: line.split() for line in lines[1:-1]}
+    assert {"parse_input", "build_input", "evaluate", "assemble", "serialize"} <= set(stages)
+    assert stages["evaluate"][1] == "8"
+    assert all(row[-1].endswith("%") for row in stages.values())
+
+    rows = STAGES.summary()
+    assert all(set(row) == SUMMARY_KEYS for row in rows)
+    assert abs(sum(row["percent"] for row in rows) - 100) < 0.01
+    assert next(row for row in rows if row["stage"] == "evaluate")["calls"] == 8
+
+
+def test_profile_writes_dump_and_collapsed_stacks():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "classify.prof")
+        STAGES.reset()
+        # Enough items that the 1 ms sampler always fires
+        _, stderr = run_classify("--profile", path, count=200)
+
+        assert pstats.Stats(path).total_calls > 0
+        if not StackSampler.available():
+            assert f"Profile written to: {path}\n" in stderr
+            assert not os.path.exists(path + ".collapsed")
+            return
+
+        assert f"Profile written to: {path}, {path}.collapsed" in stderr
+        with open(path + ".collapsed") as f:
+            lines = f.read().splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+            assert all(stack.split(";"))
+        assert any(";" in line.rsplit(" ", 1)[0] for line in lines)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    test_timings_summary_shape()
+    test_profile_writes_dump_and_collapsed_stacks()
+    print("OK")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for shadow-diffing two rule-set versions over a history.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from rule_diff import diff_rule_sets, iter_history
+
+from helpers import RULE_EDITS, RULES_CSV, make_items, write_rules
+
+
+def test_shadow_diff_matches_full_reclassification():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        new_path = write_rules(os.path.join(tmpdir, "new.csv"), **RULE_EDITS)
+        history = os.path.join(tmpdir, "history.ndjson")
+        with open(history, "w") as f:
+            for item in make_items(30):
+                f.write(json.dumps(item) + "\n")
+
+        items = list(iter_history(history))
+        report = diff_rule_sets(str(RULES_CSV), new_path, iter_history(history), workers=2, chunk_size=7)
+        old_results = classify_batch(items, str(RULES_CSV))
+        new_results = classify_batch(items, new_path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    expected = {
+        item["transaction"]["id"]: (old["gl_account"], new["gl_account"])
+        for item, old, new in zip(items, old_results, new_results)
+        if (old["gl_account"], old["action"]) != (new["gl_account"], new["action"])
+    }
+    assert report["total"] == 30
+    assert report["changed"] == len(expected) == 15  # postal, CHIPOTLE and UNKNOWN VENDOR rows
+    assert {c["transaction_id"]: (c["old_account"], c["new_account"]) for c in report["changes"]} == expected
+
+    transitions = {(t["old_account"], t["new_account"]): t for t in report["transitions"]}
+    assert transitions[("5210", "5239")]["count"] == 5
+    assert transitions[(None, "5239")]["count"] == 5
+    assert sum(t["count"] for t in report["transitions"]) == 15
+    for change in report["changes"]:
+        assert change["new_rule"] and (change["old_rule"] or change["old_account"] is None)
+
+
+if __name__ == "__main__":
+    test_shadow_diff_matches_full_reclassification()
+    print("OK")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the rule-change impact index and selective re-classification.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from rule_impact import ImpactIndex, reclassify_affected
+from rule_model import load_rules
+
+from helpers import RULE_EDITS, RULES_CSV, make_items, write_rules
+
+
+def outcome(result):
+    return result.get("gl_account"), result.get("action")
+
+
+def test_selective_plan_equals_full_rerun():
+    items = make_items(36)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        index_path = os.path.join(tmpdir, "impact.json")
+        ImpactIndex.build(load_rules(str(RULES_CSV)), items).save(index_path)
+        index = ImpactIndex.load(index_path)
+
+        new_path = write_rules(os.path.join(tmpdir, "new.csv"), **RULE_EDITS)
+        old_results = classify_batch(items, str(RULES_CSV))
+        full = classify_batch(items, new_path)
+        selective = reclassify_affected(index, new_path, items)
+
+        # Merging the selective results over the old ones gives the full re-run
+        merged = {item["transaction"]["id"]: outcome(result) for item, result in zip(items, old_results)}
+        for result in selective["results"]:
+            merged[result["transaction_id"]] = outcome(result)
+        assert merged == {item["transaction"]["id"]: outcome(result) for item, result in zip(items, full)}
+
+        changed = sum(outcome(old) != outcome(new) for old, new in zip(old_results, full))
+        assert changed <= selective["transactions_reclassified"] < len(items)
+        assert selective["rules_added"] == 3 and selective["rules_removed"] == 1
+
+        # The committed index is current: re-planning against the same rules affects nothing
+        assert index.plan(load_rules(new_path))["affected"] == []
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    test_selective_plan_equals_full_rerun()
+    print("OK")
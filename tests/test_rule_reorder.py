@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for hit-frequency rule reordering and the rule conflict graph.
+"""
+
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from rule_model import Rule, first_match, load_rules
+from rule_reorder import conflict_graph, reorder, rules_examined, rules_overlap, verify_order
+from rule_tree import fuzz_inputs
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def rule(index, exact=(), patterns=(), amount_min=None, amount_max=None):
+    return Rule(f"rule-{index + 1}", index, tuple(exact), tuple(patterns), amount_min, amount_max)
+
+
+def test_overlap_is_only_ruled_out_when_provable():
+    gas = rule(0, exact=[("mcc", "5541")])
+    assert not rules_overlap(gas, rule(1, exact=[("mcc", "5542")]))
+    assert rules_overlap(gas, rule(1, patterns=[("merchant", "contains", "SUNOCO")]))
+
+    assert not rules_overlap(rule(0, amount_max=99.99), rule(1, amount_min=100.0))
+    assert rules_overlap(rule(0, amount_max=100.0), rule(1, amount_min=100.0))
+
+    assert not rules_overlap(rule(0, patterns=[("merchant", "startswith", "SQ *")]), rule(1, patterns=[("merchant", "startswith", "TST*")]))
+    assert rules_overlap(rule(0, patterns=[("merchant", "startswith", "SQ")]), rule(1, patterns=[("merchant", "startswith", "SQ *")]))
+    assert not rules_overlap(rule(0, patterns=[("merchant", "equals", "USPS")]), rule(1, patterns=[("merchant", "contains", "FEDEX")]))
+    assert rules_overlap(rule(0, patterns=[("merchant", "contains", "GOOGLE")]), rule(1, patterns=[("merchant", "contains", "CLOUD")]))
+
+    assert not rules_overlap(rule(0, exact=[("user_team", "Admin")]), rule(1, patterns=[("user_team", "contains", "DELIVERY")]))
+
+
+def test_hot_rule_moves_past_disjoint_rules_only():
+    rules = [
+        rule(0, patterns=[("merchant", "contains", "STAPLES")]),
+        rule(1, exact=[("mcc", "5411")]),
+        rule(2, exact=[("mcc", "5812")]),
+        rule(3, exact=[("mcc", "7211")]),
+    ]
+    hits = {"rule-4": 50, "rule-2": 5}
+    graph = conflict_graph(rules)
+    order = reorder(rules, hits, graph)
+    verify_order(rules, order, graph)
+
+    # rule-1 can match a 7211 transaction, so it stays in front
+    assert order == [0, 3, 1, 2]
+    assert rules_examined(rules, order, hits, 0) < rules_examined(rules, [0, 1, 2, 3], hits, 0)
+
+    try:
+        verify_order(rules, [3, 0, 1, 2], graph)
+        assert False, "swapping a conflicting pair must be rejected"
+    except ValueError:
+        pass
+
+
+def test_reordered_table_matches_original_on_fuzzed_inputs():
+    rules = load_rules(JDM_PATH)
+    inputs = fuzz_inputs(rules, 3000, seed=5)
+    hits = Counter(first_match(rules, data).rule_id for data in inputs if first_match(rules, data))
+
+    graph = conflict_graph(rules)
+    order = reorder(rules, hits, graph)
+    verify_order(rules, order, graph)
+    reordered = [rules[i] for i in order]
+
+    for data in inputs:
+        assert first_match(rules, data) == first_match(reordered, data), data
+
+
+if __name__ == "__main__":
+    test_overlap_is_only_ruled_out_when_provable()
+    test_hot_rule_moves_past_disjoint_rules_only()
+    test_reordered_table_matches_original_on_fuzzed_inputs()
+    print("OK")
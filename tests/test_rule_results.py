@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the prebuilt per-rule result records in the generated JDM.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import NO_MATCH, RuleResult, classify_batch, classify_transaction, load_decision, load_rule_results
+from convert_dmn_to_jdm import build_jdm, get_decision_rules, get_rule_results
+from journal_entry_template import create_journal_entry_from_classification
+
+CSV_PATH = str(Path(__file__).parent.parent / "config" / "dmn_rules.csv")
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+ITEMS = [
+    {"transaction": {"uuid": "1", "rawMerchantName": "AMTRAK MOBILE", "merchantCategoryCode": "4112", "amount": 146},
+     "employee": {"team": "Admin"}, "billcom_budget": "5216 - Travel Expenses"},
+    {"transaction": {"uuid": "2", "rawMerchantName": "REVOLUTION LAUNDRY", "merchantCategoryCode": "7211", "amount": 250},
+     "employee": {"team": "Production"}, "billcom_budget": "5239 - Office Expenses"},
+    {"transaction": {"uuid": "3", "rawMerchantName": "SUNOCO 0004813209", "merchantCategoryCode": "5541", "amount": 59.99},
+     "employee": {}, "billcom_budget": "Maintenance - Trucks"},
+    {"transaction": {"uuid": "4", "rawMerchantName": "ACME WIDGETS", "merchantCategoryCode": "0001", "amount": 12},
+     "employee": {"team": "Admin"}, "billcom_budget": ""},
+]
+
+
+def test_records_match_rule_outputs():
+    jdm = build_jdm(CSV_PATH)
+    records = get_rule_results(jdm)
+    rules = get_decision_rules(jdm)
+    assert list(records) == [rule["_id"] for rule in rules]
+
+    for rule in rules:
+        record = records[rule["_id"]]
+        assert rule["rule_id"] == f'"{rule["_id"]}"'
+        assert record["gl_account"] == (rule["gl_account"].strip('"') or None)
+        assert record["action"] == rule["action"].strip('"')
+        assert record["notes"] == (rule["notes"].strip('"') or None)
+        assert record["matched_by"] == ("mcc" if "mcc" in rule["notes"].lower() else None)
+
+    # ERPNext accounts are resolved from the current account tables at load time, not stored
+    assert all("erpnext_accounts" not in record for record in records.values())
+    table = load_rule_results(JDM_PATH)
+    travel = next(result for result in table.values() if result.gl_account == "5216")
+    assert travel.erpnext_accounts == {"WCLI": "5216 - Travel Expenses - WCLI", "WCLC": "5216 - Travel Expenses - WCLC"}
+    assert all(not result.erpnext_accounts for result in table.values() if result.gl_account == "SKIP")
+
+    # zen reports the winning rule, which keys the prebuilt table
+    decision = load_decision(JDM_PATH)
+    output = decision.evaluate({"mcc": "4112", "merchant": "AMTRAK MOBILE", "amount": 146, "user_team": "Admin", "state_match": ""})["result"]
+    assert table[output["rule_id"]].gl_account == output["gl_account"]
+    assert NO_MATCH == RuleResult.from_outputs({})
+
+
+def test_prebuilt_and_raw_outputs_classify_the_same():
+    jdm = build_jdm(CSV_PATH)
+    content = jdm["nodes"][2]["content"]
+    del content["ruleResults"]
+    content["outputs"] = [column for column in content["outputs"] if column["id"] != "rule_id"]
+    for rule in content["rules"]:
+        del rule["rule_id"]
+
+    fd, raw_path = tempfile.mkstemp(suffix=".jdm.json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(jdm, f)
+        assert load_rule_results(raw_path) == {}
+
+        assert classify_batch(ITEMS, raw_path) == classify_batch(ITEMS, JDM_PATH)
+        for item in ITEMS:
+            raw = classify_transaction(item["transaction"], item["employee"], item["billcom_budget"], raw_path)
+            prebuilt = classify_transaction(item["transaction"], item["employee"], item["billcom_budget"], JDM_PATH)
+            raw.pop("performance")
+            prebuilt.pop("performance")
+            assert raw == prebuilt
+    finally:
+        os.unlink(raw_path)
+
+    results = classify_batch(ITEMS, JDM_PATH, company="WCLC")
+    assert results[0]["erpnext_account"] == "5216 - Travel Expenses - WCLC"
+    assert results[1]["has_discrepancy"] is True
+    assert results[3]["has_discrepancy"] is False
+    assert "erpnext_account" not in results[3]
+
+    # The journal entry only trusts the account for the company it was resolved for
+    transaction = dict(ITEMS[0]["transaction"], id="1", occurredTime="2025-03-04T10:00:00Z")
+    entry = create_journal_entry_from_classification(transaction, dict(results[0], erpnext_account="5216 - Stale - WCLC"), "WCLC")
+    assert entry["accounts"][1]["account"] == "5216 - Stale - WCLC"
+    entry = create_journal_entry_from_classification(transaction, results[0], "WCLI")
+    assert entry["accounts"][1]["account"] == "5216 - Travel Expenses - WCLI"
+
+
+if __name__ == "__main__":
+    test_records_match_rule_outputs()
+    test_prebuilt_and_raw_outputs_classify_the_same()
+    print("OK")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled decision-DAG evaluator, checked against zen on a
+fuzzed corpus.
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from rule_model import first_match, load_rules
+from rule_tree import TokenAutomaton, compare_with_zen, compile_rules, fuzz_inputs
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def test_token_automaton_finds_overlapping_tokens():
+    automaton = TokenAutomaton(["HE", "SHE", "HERS", "USPS"])
+    found = automaton.find("USHERS")
+    assert {automaton.tokens[i] for i in found} == {"HE", "SHE", "HERS"}
+    assert automaton.find("") == frozenset()
+
+
+def test_compiled_rules_agree_with_zen_on_fuzzed_inputs():
+    compiled = compile_rules(JDM_PATH)
+    inputs = fuzz_inputs(compiled.rules, 1500, seed=7)
+
+    report = compare_with_zen(JDM_PATH, inputs)
+    assert report["mismatches"] == 0, report["examples"]
+    assert report["matched"] > 0
+
+
+def test_compiled_rules_agree_with_linear_scan():
+    rules = load_rules(JDM_PATH)
+    compiled = compile_rules(JDM_PATH)
+    for input_data in fuzz_inputs(rules, 3000, seed=11):
+        expected = first_match(rules, input_data)
+        actual = compiled.first_match(input_data)
+        assert (expected and expected.rule_id) == (actual and actual.rule_id), input_data
+
+    stats = compiled.stats()
+    assert stats["max_depth"] <= 5
+
+
+if __name__ == "__main__":
+    test_token_automaton_finds_overlapping_tokens()
+    test_compiled_rules_agree_with_zen_on_fuzzed_inputs()
+    test_compiled_rules_agree_with_linear_scan()
+    print("OK")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the file-based shard queue: leases, reclaiming lost workers'
+shards, and deterministic merging.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from multi_company import process_companies
+from shard_queue import ShardQueue, run_local_workers, run_worker
+
+from helpers import make_items
+
+
+def make_company_items(count):
+    items = make_items(count)
+    for i, item in enumerate(items):
+        item["company"] = "WCLC" if i % 3 == 0 else "WCLI"
+    return items
+
+
+def unsharded(items):
+    batches = {}
+    for item in items:
+        batches.setdefault(item["company"], []).append(item)
+    return json.loads(json.dumps(process_companies(batches, max_workers=1)))
+
+
+def test_local_workers_merge_to_unsharded_result():
+    items = make_company_items(120)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = ShardQueue.create(tmp, items, shards=7)
+        reports = run_local_workers(tmp, processes=2, poll_seconds=0.05)
+        merged = queue.merge()
+        status = queue.status()
+
+    assert sorted(shard for report in reports for shard in report["shards"]) == list(range(7))
+    assert sum(report["items"] for report in reports) == 120
+    assert status["done"] == 7 and not status["leased"]
+    assert merged == unsharded(items)
+
+
+def test_expired_lease_of_lost_worker_is_reclaimed():
+    items = make_company_items(40)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = ShardQueue.create(tmp, items, shards=3, lease_seconds=5)
+
+        # A worker claims a shard and dies without renewing it
+        lost = queue.claim("lost-worker")
+        assert lost is not None
+        other = queue.claim("other")
+        assert other.shard != lost.shard
+        other.release()
+
+        try:
+            queue.merge()
+            assert False, "merge must refuse incomplete queues"
+        except ValueError:
+            pass
+
+        stale = time.time() - 60
+        os.utime(queue.lease_path(lost.shard), (stale, stale))
+        report = run_worker(tmp, "rescuer", poll_seconds=0.05)
+
+        assert lost.shard in report["shards"]
+        assert not lost.held()
+        assert queue.merge() == unsharded(items)
+
+
+if __name__ == "__main__":
+    test_local_workers_merge_to_unsharded_result()
+    test_expired_lease_of_lost_worker_is_reclaimed()
+    print("OK")
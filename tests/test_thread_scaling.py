@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for threaded classify_batch() sharing one compiled decision.
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import classify_transaction
+from classify_transaction import classify_batch
+from thread_scaling import measure_scaling
+
+from helpers import make_items
+
+def test_threaded_results_match_serial_in_order():
+    items = make_items(1300)
+    serial = classify_batch(items)
+    threaded = classify_batch(items, workers=4)
+
+    assert threaded == serial
+    assert [result["transaction_id"] for result in threaded] == [f"t{i}" for i in range(1300)]
+
+
+def test_scaling_report_checks_every_worker_count():
+    original = classify_transaction.THREAD_CHUNK_SIZE
+    classify_transaction.THREAD_CHUNK_SIZE = 50
+    try:
+        report = measure_scaling(make_items(300), worker_counts=(3,), repeat=1)
+    finally:
+        classify_transaction.THREAD_CHUNK_SIZE = original
+
+    assert [run["workers"] for run in report["runs"]] == [1, 3]
+    assert all(run["identical"] for run in report["runs"])
+    assert report["runs"][0]["speedup"] == 1.0
+
+
+if __name__ == "__main__":
+    test_threaded_results_match_serial_in_order()
+    test_scaling_report_checks_every_worker_count()
+    print("OK")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for sampled zen tracing (matched rule IDs and per-node timings).
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch, classify_transaction
+from trace_sampler import TraceSampler, parse_duration_us
+
+JDM_PATH = str(Path(__file__).parent.parent / "config" / "classification_rules.jdm.json")
+
+
+def make_item(merchant, mcc, team="Admin"):
+    return {
+        "transaction": {"rawMerchantName": merchant, "merchantCategoryCode": mcc, "amount": 10},
+        "employee": {"team": team},
+        "billcom_budget": "",
+    }
+
+
+ITEMS = [
+    make_item("USPS PO 123", "9402"),
+    make_item("USPS PO 123", ""),
+    make_item("AMTRAK MOBILE", "4112"),
+    make_item("ZZZ UNKNOWN", ""),
+]
+
+
+def test_traced_results_carry_rule_and_attribution():
+    tracer = TraceSampler(rate=1.0)
+    results = classify_batch(ITEMS, JDM_PATH, tracer=tracer)
+
+    # Sampled rows attribute matched_by to the fired rule's conditions; the rest is unchanged
+    attribution = ["mcc", "merchant", "mcc", "none"]
+    assert [r["matched_by"] for r in results] == attribution
+    untraced = classify_batch(ITEMS, JDM_PATH)
+    assert [{k: v for k, v in r.items() if k not in ("rule_id", "matched_by", "trace_timings")} for r in results] == untraced
+    for item, expected in zip(ITEMS, attribution):
+        args = (item["transaction"], item["employee"], item["billcom_budget"], JDM_PATH)
+        traced = classify_transaction(*args, tracer=TraceSampler(rate=1.0))
+        plain = classify_transaction(*args)
+        assert traced["matched_by"] == expected
+        assert traced["gl_account"] == plain["gl_account"] and traced["action"] == plain["action"]
+
+    assert [s["matched_by"] for s in tracer.samples] == attribution
+    assert results[0]["rule_id"].startswith("rule-")
+    assert results[3]["rule_id"] is None
+    assert "Classify Transaction" in results[0]["trace_timings"]
+
+    stats = tracer.stats()
+    assert stats["sampled"] == stats["seen"] == 4
+    assert sum(stats["rule_hits"].values()) == 4
+
+
+def test_sampling_rate_and_rolling_buffer():
+    untraced = classify_batch(ITEMS, JDM_PATH, tracer=TraceSampler(rate=0.0))
+    assert not any("rule_id" in r for r in untraced)
+
+    tracer = TraceSampler(rate=1.0, capacity=3)
+    classify_batch(ITEMS * 2, JDM_PATH, tracer=tracer)
+    assert tracer.sampled == 8
+    assert len(tracer.samples) == 3
+
+
+def test_parse_duration_units():
+    assert parse_duration_us("418.8µs") == 418.8
+    assert parse_duration_us("1.5ms") == 1500.0
+    assert parse_duration_us("") is None
+
+
+if __name__ == "__main__":
+    test_traced_results_carry_rule_and_attribution()
+    test_sampling_rate_and_rolling_buffer()
+    test_parse_duration_units()
+    print("OK")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact TransactionRecord used by batch classification and
+journal entries.
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts directory to path for imports
+scripts_dir = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+from classify_transaction import classify_batch
+from journal_entry_template import create_batch_entries
+from merchant_normalizer import raw_merchant
+from transaction_record import TransactionRecord, decode_record
+
+ITEMS = [
+    {
+        "transaction": {
+            "id": "txn1", "uuid": "u-1", "mcc": "5541", "merchantName": "Sunoco", "amount": "45.10",
+            "occurredTime": "2025-03-04T10:00:00Z", "authorizedTime": "2025-03-03T09:00:00Z",
+            "userEmail": "a@example.com", "cardId": "card", "customFields": [{"name": "Job"}],
+        },
+        "employee": {"department": "Delivery"},
+        "billcom_budget": "Gas and Tolls",
+    },
+    {
+        "transaction": {
+            "id": "txn2", "merchantCategoryCode": "9402", "rawMerchantName": "USPS PO 123",
+            "merchantName": "USPS", "amount": 12.0, "isCredit": True, "occurredTime": "2025-03-05T10:00:00Z",
+        },
+        "employee": {"team": "Admin"},
+        "billcom_budget": "5210 - Postal Expenses",
+    },
+]
+
+
+def test_fallbacks_resolved_once():
+    first = TransactionRecord.from_item(ITEMS[0])
+    assert (first.transaction_id, first.cheque_no, first.mcc, first.merchant) == ("u-1", "txn1", "5541", "SUNOCO")
+    assert (first.amount, first.user_team, first.budget) == (45.1, "Delivery", "Gas and Tolls")
+    assert (first.posting_date, first.transaction_date) == ("2025-03-04", "2025-03-03")
+    assert not hasattr(first, "__dict__")
+
+    second = decode_record('{"id": "t3", "rawMerchantName": "amazon mktp", "budgetName": "Office", "user_team": "Ops"}')
+    assert (second.transaction_id, second.merchant, second.merchant_name) == ("t3", "AMAZON MKTP", "amazon mktp")
+    assert (second.user_team, second.budget, second.transaction_date) == ("Ops", "Office", "")
+
+    # Dict-style readers see the same resolved values
+    assert raw_merchant(second.get("transaction")) == "amazon mktp"
+    assert second.get("employee") == {"team": "Ops"}
+    assert second.get("cardId", "n/a") == "n/a"
+
+
+def test_records_classify_and_post_like_dicts():
+    records = [TransactionRecord.from_item(item) for item in ITEMS]
+    assert classify_batch(records) == classify_batch(ITEMS)
+
+    classification = {"gl_account": "5210", "gl_account_name": "Postal Expenses"}
+    from_dicts = create_batch_entries([{"transaction": item["transaction"], "classification": classification} for item in ITEMS], "WCLI")
+    from_records = create_batch_entries([{"transaction": record, "classification": classification} for record in records], "WCLI")
+    assert from_records == from_dicts
+
+
+if __name__ == "__main__":
+    test_fallbacks_resolved_once()
+    test_records_classify_and_post_like_dicts()
+    print("OK")